@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = []
+# ///
+"""
+Aggregate keystroke telemetry logs (JSON lines from src/js/telemetry.js).
+
+Each line is one keystroke as recorded with #telemetry (or #debug) and saved with
+cjlTelemetry.download():
+  {"t", "mode", "code", "char", "input", "index", "key", "expected", "ok",
+   "completed", "latency_ms", "compute_ms", "coalesced"}
+latency_ms runs from the input event to the end of the animation frame that applied
+its indicators.
+
+Files (plain or .gz; directories are searched for *.jsonl and *.jsonl.gz) are read
+line by line in a process pool, one file per task, and every worker keeps only
+fixed-size aggregates, so memory does not grow with the log volume:
+  - latency per mode in log-spaced buckets (each within 2.5% of the true value),
+    from which the percentiles are read
+  - attempts and errors per expected key
+  - count, total, maximum latency and errors per quest character
+  - the --top slowest single keystrokes (a heap), to find render stalls
+The per-file aggregates are merged at the end.
+
+  python3 analyze_keystrokes.py logs/ --json .cache/keystrokes.json
+"""
+
+import argparse
+import concurrent.futures
+import gzip
+import heapq
+import json
+import math
+import os
+import sys
+import time
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_TOP = 20
+DEFAULT_MIN_SAMPLES = 5
+# Frames at 60 Hz: a keystroke slower than three of them is a visible stall
+STALL_MS = 50.0
+PERCENTILES = (50, 90, 95, 99)
+BUCKET_BASE = 1.05
+LOG_SUFFIXES = (".jsonl", ".jsonl.gz", ".ndjson", ".ndjson.gz")
+
+Summary = Dict[str, object]
+
+
+def bucket_of(ms: float) -> int:
+    """Histogram bucket for a latency; 0 holds everything at or under 0.1 ms."""
+    if ms <= 0.1:
+        return 0
+    return int(math.log(ms / 0.1, BUCKET_BASE)) + 1
+
+
+def bucket_value(bucket: int) -> float:
+    """Midpoint (geometric) of a bucket in ms."""
+    if bucket <= 0:
+        return 0.1
+    return 0.1 * BUCKET_BASE ** (bucket - 0.5)
+
+
+def percentile(histogram: Dict[int, int], q: float) -> Optional[float]:
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = max(1, math.ceil(total * q / 100.0))
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= rank:
+            return round(bucket_value(bucket), 2)
+    return None
+
+
+def new_summary() -> Summary:
+    return {
+        "files": 0,
+        "lines": 0,
+        "records": 0,
+        "skipped": 0,
+        "modes": {},  # mode -> {"count", "total_ms", "max_ms", "stalls", "hist": {bucket: n}}
+        "keys": {},  # expected key -> [attempts, errors]
+        "chars": {},  # char -> [count, total_ms, max_ms, errors]
+        "slowest": [],  # heap of [latency_ms, source, line, record]
+    }
+
+
+def open_log(path: str) -> IO[str]:
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def add_record(summary: Summary, record: Dict[str, object], source: str, line_no: int, top: int) -> bool:
+    try:
+        latency = float(record["latency_ms"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    if latency < 0 or math.isnan(latency):
+        return False
+    mode = str(record.get("mode") or "?")
+    stats = summary["modes"].get(mode)
+    if stats is None:
+        stats = summary["modes"][mode] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "stalls": 0, "hist": {}}
+    stats["count"] += 1
+    stats["total_ms"] += latency
+    stats["max_ms"] = max(stats["max_ms"], latency)
+    if latency > STALL_MS:
+        stats["stalls"] += 1
+    bucket = bucket_of(latency)
+    stats["hist"][bucket] = stats["hist"].get(bucket, 0) + 1
+
+    key = str(record.get("key") or "")
+    expected = str(record.get("expected") or "")
+    wrong = bool(key) and not record.get("ok", key == expected)
+    if expected and key:  # deletions leave no key to score
+        counts = summary["keys"].setdefault(expected, [0, 0])
+        counts[0] += 1
+        counts[1] += int(wrong)
+
+    char = str(record.get("char") or record.get("code") or "")
+    if char:
+        entry = summary["chars"].setdefault(char, [0, 0.0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += latency
+        entry[2] = max(entry[2], latency)
+        entry[3] += int(wrong)
+
+    if top > 0:
+        item = [latency, source, line_no, record]
+        if len(summary["slowest"]) < top:
+            heapq.heappush(summary["slowest"], item)
+        elif latency > summary["slowest"][0][0]:
+            heapq.heapreplace(summary["slowest"], item)
+    return True
+
+
+def iter_records(stream: IO[str]) -> Iterator[Tuple[int, Optional[Dict[str, object]]]]:
+    """(line number, record or None when unparsable) for each non-blank line."""
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None
+            continue
+        yield line_no, record if isinstance(record, dict) else None
+
+
+def summarize_file(job: Tuple[str, int]) -> Summary:
+    """Worker: aggregates for one log file."""
+    path, top = job
+    summary = new_summary()
+    summary["files"] = 1
+    try:
+        with open_log(path) as stream:
+            for line_no, record in iter_records(stream):
+                summary["lines"] += 1
+                if record is not None and add_record(summary, record, path, line_no, top):
+                    summary["records"] += 1
+                else:
+                    summary["skipped"] += 1
+    except (OSError, EOFError) as e:  # EOFError: truncated .gz
+        summary["errors"] = {path: str(e)}
+    return summary
+
+
+def merge(into: Summary, other: Summary, top: int) -> Summary:
+    for field in ("files", "lines", "records", "skipped"):
+        into[field] += other[field]
+    if other.get("errors"):
+        into.setdefault("errors", {}).update(other["errors"])
+    for mode, stats in other["modes"].items():
+        mine = into["modes"].get(mode)
+        if mine is None:
+            into["modes"][mode] = stats
+            continue
+        mine["count"] += stats["count"]
+        mine["total_ms"] += stats["total_ms"]
+        mine["max_ms"] = max(mine["max_ms"], stats["max_ms"])
+        mine["stalls"] += stats["stalls"]
+        for bucket, n in stats["hist"].items():
+            mine["hist"][bucket] = mine["hist"].get(bucket, 0) + n
+    for key, (attempts, errors) in other["keys"].items():
+        counts = into["keys"].setdefault(key, [0, 0])
+        counts[0] += attempts
+        counts[1] += errors
+    for char, (count, total, peak, errors) in other["chars"].items():
+        entry = into["chars"].setdefault(char, [0, 0.0, 0.0, 0])
+        entry[0] += count
+        entry[1] += total
+        entry[2] = max(entry[2], peak)
+        entry[3] += errors
+    into["slowest"] = heapq.nlargest(top, into["slowest"] + other["slowest"], key=lambda item: item[0])
+    return into
+
+
+def find_logs(paths: List[str]) -> List[str]:
+    files: List[str] = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for dirpath, _dirnames, filenames in os.walk(path):
+            for name in filenames:
+                if name.lower().endswith(LOG_SUFFIXES):
+                    files.append(os.path.join(dirpath, name))
+    # Largest first so one big file does not start last and hold up the pool
+    return sorted(files, key=lambda p: -os.path.getsize(p) if os.path.exists(p) else 0)
+
+
+def analyze(
+    files: List[str],
+    top: int = DEFAULT_TOP,
+    workers: Optional[int] = None,
+) -> Summary:
+    total = new_summary()
+    jobs = [(path, top) for path in files]
+    if workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            merge(total, summarize_file(job), top)
+        return total
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+        # Merge as files finish; only one summary per worker is in flight
+        for summary in ex.map(summarize_file, jobs):
+            merge(total, summary, top)
+    return total
+
+
+def build_report(summary: Summary, top: int = DEFAULT_TOP, min_samples: int = DEFAULT_MIN_SAMPLES) -> Dict[str, object]:
+    modes = {}
+    for mode, stats in sorted(summary["modes"].items()):
+        count = stats["count"]
+        modes[mode] = {
+            "count": count,
+            "mean_ms": round(stats["total_ms"] / count, 2) if count else None,
+            "max_ms": round(stats["max_ms"], 2),
+            "stalls": stats["stalls"],
+            **{f"p{q}_ms": percentile(stats["hist"], q) for q in PERCENTILES},
+        }
+    keys = {
+        key: {
+            "attempts": attempts,
+            "errors": errors,
+            "error_rate": round(errors / attempts, 4) if attempts else None,
+        }
+        for key, (attempts, errors) in sorted(summary["keys"].items())
+    }
+    chars = [
+        {
+            "char": char,
+            "count": count,
+            "mean_ms": round(total / count, 2),
+            "max_ms": round(peak, 2),
+            "errors": errors,
+            "error_rate": round(errors / count, 4),
+        }
+        for char, (count, total, peak, errors) in summary["chars"].items()
+        if count >= min_samples
+    ]
+    slowest_chars = sorted(chars, key=lambda c: (-c["mean_ms"], c["char"]))[:top]
+    hardest_chars = sorted(chars, key=lambda c: (-c["error_rate"], -c["count"], c["char"]))[:top]
+    slowest_keystrokes = [
+        {"latency_ms": latency, "file": source, "line": line_no, "record": record}
+        for latency, source, line_no, record in sorted(summary["slowest"], key=lambda item: -item[0])
+    ]
+    return {
+        "files": summary["files"],
+        "lines": summary["lines"],
+        "records": summary["records"],
+        "skipped": summary["skipped"],
+        "errors": summary.get("errors", {}),
+        "stall_ms": STALL_MS,
+        "modes": modes,
+        "keys": keys,
+        "slowest_chars": slowest_chars,
+        "hardest_chars": hardest_chars,
+        "slowest_keystrokes": slowest_keystrokes,
+    }
+
+
+def print_report(report: Dict[str, object], seconds: float) -> None:
+    print(
+        f"{report['records']:,} keystrokes from {report['files']} file(s) "
+        f"({report['skipped']:,} lines skipped) in {seconds:.2f}s"
+    )
+    for path, err in sorted(report["errors"].items()):
+        print(f"Failed: {path}: {err}", file=sys.stderr)
+    print("\nLatency by mode (ms):")
+    print(f"  {'mode':<8}{'count':>10}{'mean':>8}" + "".join(f"{'p' + str(q):>8}" for q in PERCENTILES)
+          + f"{'max':>9}{'stalls':>8}")
+    for mode, m in report["modes"].items():
+        cells = "".join(f"{m[f'p{q}_ms']:>8}" for q in PERCENTILES)
+        print(f"  {mode:<8}{m['count']:>10,}{m['mean_ms']:>8}{cells}{m['max_ms']:>9}{m['stalls']:>8}")
+
+    keys = sorted(report["keys"].items(), key=lambda kv: -(kv[1]["error_rate"] or 0))
+    if keys:
+        print("\nError rate by expected key:")
+        for key, k in keys:
+            print(f"  {key}  {k['error_rate']:.1%}  ({k['errors']}/{k['attempts']})")
+    if report["slowest_chars"]:
+        print("\nSlowest characters (mean ms):")
+        for c in report["slowest_chars"]:
+            print(f"  {c['char']}  mean {c['mean_ms']}  max {c['max_ms']}  ({c['count']} keystrokes)")
+    if report["hardest_chars"]:
+        print("\nHardest characters (error rate):")
+        for c in report["hardest_chars"]:
+            print(f"  {c['char']}  {c['error_rate']:.1%}  ({c['errors']}/{c['count']})")
+    if report["slowest_keystrokes"]:
+        print("\nSlowest keystrokes:")
+        for s in report["slowest_keystrokes"]:
+            rec = s["record"]
+            print(
+                f"  {s['latency_ms']} ms  {rec.get('mode')} {rec.get('char', '')} "
+                f"{rec.get('input', '')!r}  {s['file']}:{s['line']}"
+            )
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="log files or directories of *.jsonl(.gz)")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="rows in the slowest/hardest lists")
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=DEFAULT_MIN_SAMPLES,
+        help="keystrokes a character needs to be ranked",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPUs)")
+    parser.add_argument("--json", help="also write the report here")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    files = find_logs(args.paths)
+    if not files:
+        print("No log files found", file=sys.stderr)
+        return 1
+    started = time.perf_counter()
+    summary = analyze(files, max(0, args.top), args.workers)
+    report = build_report(summary, max(0, args.top), args.min_samples)
+    print_report(report, time.perf_counter() - started)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        tmp_path = args.json + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, args.json)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
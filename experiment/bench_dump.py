@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = ["wikitextparser"]
+# ///
+"""
+Benchmark the streaming dump reader (wiki_dump.py) on a synthetic pages-articles dump.
+
+Writes a dump of --size-mb uncompressed XML: filler pages of wiki-like text and, last,
+the 輔助字形 page regenerated from auxiliary_forms.json, so finding it means scanning
+the whole file. Then times iter_pages over it while sampling, every --sample-mb of
+XML read (after decompression), the throughput of that segment and the process's
+current RSS.
+
+A streaming reader shows a steady per-segment rate and RSS that stays flat after the
+first samples; the summary reports both (slowest segment vs median, RSS growth from
+the first sample to the last). The table found at the end is run through
+build_from_wikitext to check the page survived the round trip.
+"""
+
+import argparse
+import bz2
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import IO, Dict, List, Optional
+from xml.sax.saxutils import escape
+
+import wiki_dump
+from export_auxiliary_forms_json import TITLE, build_from_wikitext
+from stand_in_wiki import table_wikitext
+
+WORKDIR = os.path.dirname(__file__)
+JSON_PATH = os.path.join(WORKDIR, "auxiliary_forms.json")
+DEFAULT_OUTPUT = os.path.join(WORKDIR, ".cache", "bench", "dump.json")
+DEFAULT_SIZE_MB = 256
+DEFAULT_SAMPLE_MB = 16
+COMPRESSIONS = ("none", "gz", "bz2")
+
+DUMP_HEAD = (
+    '<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10" xml:lang="zh">\n'
+    "  <siteinfo><sitename>Wikibooks</sitename><dbname>zhwikibooks</dbname></siteinfo>\n"
+)
+PAGE_TEMPLATE = (
+    "  <page>\n    <title>{title}</title>\n    <ns>0</ns>\n    <id>{id}</id>\n"
+    "    <revision>\n      <id>{revid}</id>\n      <timestamp>2024-01-01T00:00:00Z</timestamp>\n"
+    '      <text bytes="{size}" xml:space="preserve">{text}</text>\n'
+    "      <sha1>{sha1}</sha1>\n    </revision>\n  </page>\n"
+)
+FILLER_LINE = (
+    "倉頡輸入法以字形為基礎，'''字首'''與'''字身'''分別取碼。"
+    "[[File:cjrm-a0.svg|22px]] 見 [[倉頡輸入法/字根]] 與 {{注音|ㄘㄤ}}。\n"
+)
+
+
+def current_rss_kib() -> Optional[int]:
+    """Resident set size now (not the peak), from /proc on Linux."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def open_for_write(path: str, compression: str) -> IO[bytes]:
+    if compression == "gz":
+        return gzip.open(path, "wb", compresslevel=1)
+    if compression == "bz2":
+        return bz2.open(path, "wb", compresslevel=1)
+    return open(path, "wb")
+
+
+def page_xml(title: str, page_id: int, text: str) -> bytes:
+    return PAGE_TEMPLATE.format(
+        title=escape(title),
+        id=page_id,
+        revid=page_id * 10,
+        size=len(text.encode("utf-8")),
+        text=escape(text),
+        sha1="0" * 31,
+    ).encode("utf-8")
+
+
+def write_synthetic_dump(path: str, size_mb: int, target_text: str, compression: str = "none") -> int:
+    """Write filler pages up to size_mb, then the target page; returns the page count."""
+    limit = size_mb * 1024 * 1024
+    written = 0
+    pages = 0
+    with open_for_write(path, compression) as out:
+        out.write(DUMP_HEAD.encode("utf-8"))
+        while written < limit:
+            pages += 1
+            # 2-40 KiB of text per page, like ordinary articles
+            body = FILLER_LINE * (20 + (pages * 37) % 380)
+            chunk = page_xml(f"Filler/{pages}", pages, body)
+            out.write(chunk)
+            written += len(chunk)
+        pages += 1
+        out.write(page_xml(TITLE, pages, target_text))
+        out.write(b"</mediawiki>\n")
+    return pages
+
+
+class SamplingReader:
+    """File wrapper that records (seconds, MiB read, RSS KiB) every sample_bytes."""
+
+    def __init__(self, raw: IO[bytes], sample_bytes: int) -> None:
+        self.raw = raw
+        self.sample_bytes = sample_bytes
+        self.read_bytes = 0
+        self.next_sample = sample_bytes
+        self.started = time.perf_counter()
+        self.samples: List[Dict[str, float]] = []
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.read_bytes += len(data)
+        if self.read_bytes >= self.next_sample:
+            self.next_sample += self.sample_bytes
+            self.samples.append({
+                "seconds": round(time.perf_counter() - self.started, 4),
+                "mib": round(self.read_bytes / (1024 * 1024), 2),
+                "rss_kib": current_rss_kib() or 0,
+            })
+        return data
+
+
+def summarize(samples: List[Dict[str, float]], seconds: float, read_bytes: int) -> Dict[str, object]:
+    rates: List[float] = []
+    for prev, cur in zip(samples, samples[1:]):
+        dt = cur["seconds"] - prev["seconds"]
+        if dt > 0:
+            rates.append((cur["mib"] - prev["mib"]) / dt)
+    rss = [s["rss_kib"] for s in samples if s["rss_kib"]]
+    median = statistics.median(rates) if rates else 0.0
+    return {
+        "seconds": round(seconds, 3),
+        "mib_read": round(read_bytes / (1024 * 1024), 1),
+        "mib_per_s": round(read_bytes / (1024 * 1024) / seconds, 1) if seconds > 0 else None,
+        "segment_mib_per_s": {
+            "min": round(min(rates), 1) if rates else None,
+            "median": round(median, 1),
+            "max": round(max(rates), 1) if rates else None,
+        },
+        "slowest_vs_median": round(min(rates) / median, 3) if rates and median else None,
+        "rss_kib": {
+            "first": rss[0] if rss else None,
+            "last": rss[-1] if rss else None,
+            "max": max(rss) if rss else None,
+        },
+        "rss_growth_kib": rss[-1] - rss[0] if rss else None,
+    }
+
+
+def bench(path: str, sample_mb: int) -> Dict[str, object]:
+    started = time.perf_counter()
+    # Sampled after decompression, so rates are in XML bytes for every compression
+    with wiki_dump.open_dump(path) as raw:
+        reader = SamplingReader(raw, sample_mb * 1024 * 1024)
+        pages = list(wiki_dump.iter_pages(reader, [TITLE]))
+    seconds = time.perf_counter() - started
+    result = summarize(reader.samples, seconds, reader.read_bytes)
+    result["samples"] = reader.samples
+    if pages:
+        output = build_from_wikitext(str(pages[0]["wikitext"]))
+        result["letters"] = len(output)
+    else:
+        result["letters"] = 0
+    return result
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", default=JSON_PATH, help="export the target page is rebuilt from")
+    parser.add_argument("--size-mb", type=int, default=DEFAULT_SIZE_MB, help="uncompressed dump size")
+    parser.add_argument("--sample-mb", type=int, default=DEFAULT_SAMPLE_MB, help="XML read between samples")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="none")
+    parser.add_argument("--dump", help="reuse (or keep) the synthetic dump at this path")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="where to write the results")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    try:
+        with open(args.json, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Failed to load JSON: {e}", file=sys.stderr)
+        return 1
+
+    suffix = {"none": ".xml", "gz": ".xml.gz", "bz2": ".xml.bz2"}[args.compression]
+    tmp_dir = None
+    path = args.dump
+    if not path:
+        tmp_dir = tempfile.TemporaryDirectory(prefix="bench-dump-")
+        path = os.path.join(tmp_dir.name, "pages-articles" + suffix)
+    try:
+        if not os.path.exists(path):
+            t0 = time.perf_counter()
+            pages = write_synthetic_dump(path, args.size_mb, table_wikitext(data), args.compression)
+            print(
+                f"Wrote {path}: {pages} pages, {os.path.getsize(path):,} bytes "
+                f"in {time.perf_counter() - t0:.1f}s"
+            )
+        result = bench(path, max(1, args.sample_mb))
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    segment = result["segment_mib_per_s"]
+    rss = result["rss_kib"]
+    print(
+        f"Read {result['mib_read']} MiB of XML ({args.compression}) in {result['seconds']}s: "
+        f"{result['mib_per_s']} MiB/s; per {args.sample_mb} MiB segment "
+        f"min {segment['min']} / median {segment['median']} / max {segment['max']} MiB/s"
+    )
+    print(
+        f"RSS: first sample {rss['first']} KiB, last {rss['last']} KiB, "
+        f"max {rss['max']} KiB (growth {result['rss_growth_kib']} KiB)"
+    )
+    print(f"Target page: {result['letters']} letters")
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"size_mb": args.size_mb, "compression": args.compression, **result}, f, indent=2)
+    return 0 if result["letters"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
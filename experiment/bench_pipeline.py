@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = [
+#   "aiohttp",
+#   "requests",
+#   "wikitextparser",
+# ]
+# ///
+"""
+Benchmark the export and download pipelines on real and synthetically scaled data.
+
+Export side: build_output_structure, extract_files_with_labels and group_zili_by_fuzhu
+over the 輔助字形 table, and extract_filenames_from_json + unique_preserving_order
+over its export. "real" uses the cached page wikitext when there is one (else the
+table regenerated from auxiliary_forms.json); "xN" repeats every letter's rows N
+times with renamed files, so rows and links both grow N-fold.
+
+Download side: run_pipeline (the loop behind download_auxiliary_svgs.py main()) and
+its --async counterpart against a local stand-in wiki with injected per-request
+latency, first into an empty directory ("cold") and then again with everything up
+to date ("noop").
+
+Results go to a JSON file. --compare BASELINE prints per-benchmark ratios and exits
+non-zero when any benchmark is slower than the baseline by more than --threshold.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import download_auxiliary_svgs as downloader
+import export_auxiliary_forms_json as exporter
+from stand_in_wiki import StandInWiki, synthetic_svg, table_matrix
+
+WORKDIR = os.path.dirname(__file__)
+JSON_PATH = os.path.join(WORKDIR, "auxiliary_forms.json")
+DEFAULT_OUTPUT = os.path.join(WORKDIR, ".cache", "bench", "latest.json")
+DEFAULT_SCALES = [1, 10, 100, 1000]
+DEFAULT_DOWNLOAD_SCALES = [1, 10]
+DEFAULT_LATENCY = 0.02
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.10
+ENGINES = ("threaded", "async")
+
+Result = Dict[str, object]
+
+
+def timed(fn: Callable[[], object], repeat: int) -> Tuple[float, float]:
+    """Return (min, median) wall seconds over `repeat` runs."""
+    runs: List[float] = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return min(runs), statistics.median(runs)
+
+
+def make_result(scale: str, seconds: Tuple[float, float], items: int, unit: str) -> Result:
+    best, median = seconds
+    return {
+        "scale": scale,
+        "seconds": round(best, 6),
+        "median": round(median, 6),
+        "items": items,
+        "unit": unit,
+        "per_second": round(items / best, 1) if best > 0 else None,
+    }
+
+
+def real_matrix(data: Dict[str, object]) -> Tuple[List[List[str]], str]:
+    """Table cells from the cached page if present, else regenerated from the export."""
+    cached = exporter.load_cache(exporter.DEFAULT_CACHE_DIR, exporter.TITLE)
+    if cached is not None:
+        table = exporter.extract_table(str(cached["wikitext"]), exporter.TARGET_TABLE_CAPTION)
+        if table is not None:
+            return table.data(span=True), "cached wikitext"
+    return table_matrix(data, 1), "regenerated from export"
+
+
+def bench_export(mat: List[List[str]], scale: str, repeat: int) -> Dict[str, Result]:
+    header, rows = mat[0], mat[1:]
+    _key_col, fuzhu_col, zili_col, _shuo_col = exporter.locate_columns(header)
+    zili_cells = [r[zili_col] for r in rows if zili_col is not None and zili_col < len(r)]
+    # Inputs for group_zili_by_fuzhu, prepared outside the timed region
+    pairs = [
+        (
+            [f for f, _ in exporter.extract_files_with_labels(r[fuzhu_col])],
+            exporter.extract_files_with_labels(r[zili_col]),
+        )
+        for r in rows
+        if fuzhu_col is not None and zili_col is not None
+    ]
+    links = sum(len(z) for _, z in pairs)
+    output = exporter.build_output_structure(mat)
+
+    def extract_names() -> List[str]:
+        return downloader.unique_preserving_order(downloader.extract_filenames_from_json(output))
+
+    results = {
+        "build_output_structure": make_result(
+            scale, timed(lambda: exporter.build_output_structure(mat), repeat), len(rows), "rows"
+        ),
+        "extract_files_with_labels": make_result(
+            scale,
+            timed(lambda: [exporter.extract_files_with_labels(c) for c in zili_cells], repeat),
+            links,
+            "links",
+        ),
+        "group_zili_by_fuzhu": make_result(
+            scale,
+            timed(lambda: [exporter.group_zili_by_fuzhu(f, z) for f, z in pairs], repeat),
+            len(pairs),
+            "rows",
+        ),
+        "extract_filenames_from_json": make_result(
+            scale, timed(extract_names, repeat), len(extract_names()), "names"
+        ),
+    }
+    return {f"{name}@{scale}": result for name, result in results.items()}
+
+
+def run_download(engine: str, names: List[str], api_url: str, output_dir: str) -> Tuple[int, int]:
+    """One download_auxiliary_svgs run; returns (downloaded, up to date)."""
+    policy = downloader.RetryPolicy(max_attempts=2, base_delay=0.05)
+    # Batch lookups report progress on stderr; keep the benchmark output readable
+    with contextlib.redirect_stderr(io.StringIO()):
+        if engine == "async":
+            import asyncio
+
+            results, _missing, up_to_date = asyncio.run(
+                downloader.run_pipeline_async(names, api_url=api_url, output_dir=output_dir, policy=policy)
+            )
+        else:
+            results, _missing, up_to_date = downloader.run_pipeline(
+                names, api_url=api_url, output_dir=output_dir, policy=policy
+            )
+    return sum(1 for _, ok, _ in results if ok), len(up_to_date)
+
+
+def bench_download(
+    data: Dict[str, object],
+    scale: int,
+    latency: float,
+    engines: List[str],
+) -> Dict[str, Result]:
+    output = exporter.build_output_structure(table_matrix(data, scale))
+    names = downloader.unique_preserving_order(downloader.extract_filenames_from_json(output))
+    wiki = StandInWiki(files={n: synthetic_svg(n) for n in names}, latency=latency).start()
+    label = f"x{scale}"
+    results: Dict[str, Result] = {}
+    try:
+        for engine in engines:
+            workdir = tempfile.mkdtemp(prefix="bench-download-")
+            output_dir = os.path.join(workdir, "svgs")
+            os.makedirs(output_dir)
+            try:
+                for phase in ("cold", "noop"):
+                    counts: List[Tuple[int, int]] = []
+                    seconds = timed(
+                        lambda: counts.append(run_download(engine, names, wiki.api_url, output_dir)), 1
+                    )
+                    downloaded, up_to_date = counts[0]
+                    if (phase == "cold" and downloaded != len(names)) or (
+                        phase == "noop" and up_to_date != len(names)
+                    ):
+                        print(
+                            f"Warning: download.{engine}.{phase}@{label}: {downloaded} downloaded, "
+                            f"{up_to_date} up to date of {len(names)}",
+                            file=sys.stderr,
+                        )
+                    result = make_result(label, seconds, len(names), "files")
+                    result["latency"] = latency
+                    results[f"download.{engine}.{phase}@{label}"] = result
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        wiki.stop()
+    return results
+
+
+def compare(current: Dict[str, Result], baseline: Dict[str, Result], threshold: float) -> List[str]:
+    """Print a comparison table; return the names that regressed beyond threshold."""
+    regressions: List[str] = []
+    print(f"{'benchmark':<44} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name in sorted(current):
+        base = baseline.get(name)
+        if not base or not base.get("seconds"):
+            print(f"{name:<44} {'-':>10} {current[name]['seconds']:>10.4f} {'new':>7}")
+            continue
+        ratio = float(current[name]["seconds"]) / float(base["seconds"])
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<44} {base['seconds']:>10.4f} {current[name]['seconds']:>10.4f} {ratio:>6.2f}x{flag}")
+    for name in sorted(set(baseline) - set(current)):
+        print(f"{name:<44} {baseline[name].get('seconds', 0):>10.4f} {'-':>10} {'gone':>7}")
+    return regressions
+
+
+def parse_scales(text: str) -> List[int]:
+    return [int(s) for s in text.split(",") if s.strip()]
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", default=JSON_PATH, help="export the synthetic tables are built from")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write results")
+    parser.add_argument(
+        "--scales",
+        default=",".join(map(str, DEFAULT_SCALES)),
+        help="synthetic row/link multipliers for the export benchmarks",
+    )
+    parser.add_argument(
+        "--download-scales",
+        default=",".join(map(str, DEFAULT_DOWNLOAD_SCALES)),
+        help="multipliers for the download benchmarks (empty to skip)",
+    )
+    parser.add_argument(
+        "--engines",
+        default=",".join(ENGINES),
+        help="download engines to measure: threaded, async",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=DEFAULT_LATENCY,
+        help="seconds the stand-in wiki adds to every request",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs per export benchmark")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="relative slowdown counted as a regression (default 0.10)",
+    )
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    try:
+        with open(args.json, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        baseline: Optional[Dict[str, Result]] = None
+        if args.compare:
+            with open(args.compare, "r", encoding="utf-8") as f:
+                baseline = json.load(f).get("results") or {}
+    except Exception as e:
+        print(f"Failed to load JSON: {e}", file=sys.stderr)
+        return 1
+
+    results: Dict[str, Result] = {}
+    mat, source = real_matrix(data)
+    print(f"real: {len(mat) - 1} rows ({source})")
+    results.update(bench_export(mat, "real", args.repeat))
+    for scale in parse_scales(args.scales):
+        mat = table_matrix(data, scale)
+        print(f"x{scale}: {len(mat) - 1} rows")
+        results.update(bench_export(mat, f"x{scale}", args.repeat))
+
+    engines = [e for e in args.engines.split(",") if e in ENGINES]
+    for scale in parse_scales(args.download_scales):
+        print(f"download x{scale} (latency {args.latency:g}s, engines: {', '.join(engines)})")
+        results.update(bench_download(data, scale, args.latency, engines))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+            "latency": args.latency,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+    if baseline is None:
+        for name, r in results.items():
+            print(f"{name:<44} {r['seconds']:>10.4f}s  {r['per_second']} {r['unit']}/s")
+        print(f"Wrote {args.output}")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    print(f"Wrote {args.output}")
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = []
+# ///
+"""
+Index code-table characters under the Cangjie letter of the auxiliary forms they use.
+
+The wiki lists only a few example characters (zili) per auxiliary form, so aux mode
+runs out of questions quickly. This stage widens each letter's pool with characters
+from a code table (any layout build_char_dict.py reads): every table character whose
+code contains the letter joins the pool, in table order (so frequency-ranked tables
+put common characters first), up to --max-per-letter. The wiki's own examples and the
+bare radical (a one-letter code) are left out.
+
+The pool is per letter, not per form. A code says which letters a character uses
+but not which variant of the radical it was drawn with, and there is no
+decomposition data here to tell. A character is also listed under every letter of
+its code, so it has no single correct key. The page therefore does not ask these
+characters in aux mode, and publish_assets.py does not publish the index; aux
+questions stay limited to the wiki's zili examples.
+
+Output goes to auxiliary_index/<LETTER>.json, one compact file per letter:
+  {"version": 2, "source": "<sha1>", "count": N, "chars": ["昍", ...]}
+"source" is a digest of the letter's examples, the table and the settings; letters
+whose digest is unchanged are not rebuilt. Letters are built in a process pool.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from build_char_dict import DEFAULT_TABLE, read_table
+from export_auxiliary_forms_json import load_output
+
+WORKDIR = os.path.dirname(__file__)
+JSON_PATH = os.path.join(WORKDIR, "auxiliary_forms.json")
+DEFAULT_INDEX_DIR = os.path.join(WORKDIR, "auxiliary_index")
+INDEX_VERSION = 2
+DEFAULT_MAX_PER_LETTER = 200
+# Per-letter files this script writes; nothing else in --index-dir is pruned
+INDEX_NAME_RE = re.compile(r"^[A-Z]\.json$")
+
+# char -> primary code; set per worker process by _init_worker
+_codes: Dict[str, str] = {}
+
+
+def primary_codes(table: List[Tuple[str, str, Optional[float]]]) -> Dict[str, str]:
+    """char -> first listed code, keeping table order."""
+    codes: Dict[str, str] = {}
+    for char, code, _ in table:
+        if len(char) == 1 and char not in codes and code.isalpha():
+            codes[char] = code
+    return codes
+
+
+def example_labels(bucket: Dict[str, object]) -> List[str]:
+    """The wiki's example characters for a letter, across all its forms."""
+    labels: List[str] = []
+    for row in bucket.get("rows") or []:
+        for group in row.get("fuzhu_zixing") or []:
+            labels.extend(z.get("label") or "" for z in group.get("zili") or [])
+    return labels
+
+
+def source_digest(bucket: Dict[str, object], table_sha1: str, max_per_letter: int) -> str:
+    payload = json.dumps(
+        [INDEX_VERSION, table_sha1, max_per_letter, example_labels(bucket)], ensure_ascii=False
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def build_letter_index(
+    letter: str,
+    bucket: Dict[str, object],
+    codes: Dict[str, str],
+    max_per_letter: int = DEFAULT_MAX_PER_LETTER,
+) -> Dict[str, object]:
+    key = letter.lower()
+    examples = set(example_labels(bucket))
+    chars: List[str] = []
+    for char, code in codes.items():
+        if char in examples or len(code) < 2 or key not in code:
+            continue
+        chars.append(char)
+        if len(chars) >= max_per_letter:
+            break
+    return {"version": INDEX_VERSION, "count": len(chars), "chars": chars}
+
+
+def _init_worker(codes: Dict[str, str]) -> None:
+    global _codes
+    _codes = codes
+
+
+def _build_in_worker(letter: str, bucket: Dict[str, object], max_per_letter: int) -> Dict[str, object]:
+    return build_letter_index(letter, bucket, _codes, max_per_letter)
+
+
+def load_source(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("source")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def build_index(
+    data: Dict[str, Dict[str, object]],
+    table_path: str,
+    index_dir: str,
+    max_per_letter: int = DEFAULT_MAX_PER_LETTER,
+    workers: int = 1,
+    force: bool = False,
+) -> Dict[str, List[str]]:
+    """Rebuild the letters whose source changed; returns {"built", "skipped", "removed"}."""
+    with open(table_path, "rb") as f:
+        table_sha1 = hashlib.sha1(f.read()).hexdigest()
+    os.makedirs(index_dir, exist_ok=True)
+
+    summary: Dict[str, List[str]] = {"built": [], "skipped": [], "removed": []}
+    pending: Dict[str, str] = {}
+    for letter, bucket in data.items():
+        digest = source_digest(bucket, table_sha1, max_per_letter)
+        if not force and load_source(os.path.join(index_dir, f"{letter}.json")) == digest:
+            summary["skipped"].append(letter)
+        else:
+            pending[letter] = digest
+
+    if pending:
+        codes = primary_codes(read_table(table_path))
+        letters = list(pending)
+        buckets = [data[letter] for letter in letters]
+        if workers <= 1 or len(letters) == 1:
+            results = [
+                build_letter_index(letter, b, codes, max_per_letter) for letter, b in zip(letters, buckets)
+            ]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(letters)),
+                initializer=_init_worker,
+                initargs=(codes,),
+            ) as pool:
+                results = list(pool.map(_build_in_worker, letters, buckets, [max_per_letter] * len(buckets)))
+        for letter, index in zip(letters, results):
+            index = {"version": index["version"], "source": pending[letter], **index}
+            payload = json.dumps(index, ensure_ascii=False, separators=(",", ":"))
+            path = os.path.join(index_dir, f"{letter}.json")
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            summary["built"].append(letter)
+
+    for name in sorted(os.listdir(index_dir)):
+        if INDEX_NAME_RE.match(name) and name[:-5] not in data:
+            os.remove(os.path.join(index_dir, name))
+            summary["removed"].append(name)
+    return summary
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", default=JSON_PATH, help="auxiliary_forms.json to index")
+    parser.add_argument("--table", default=DEFAULT_TABLE, help="Cangjie code table to draw characters from")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR, help="where the per-letter index goes")
+    parser.add_argument(
+        "--max-per-letter",
+        type=int,
+        default=DEFAULT_MAX_PER_LETTER,
+        help="cap on characters indexed under one letter",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="worker processes (default: CPU count)",
+    )
+    parser.add_argument("--force", action="store_true", help="rebuild every letter")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    data = load_output(args.json)
+    if data is None:
+        print(f"Failed to load {args.json}", file=sys.stderr)
+        return 1
+    try:
+        summary = build_index(
+            data, args.table, args.index_dir, args.max_per_letter, args.workers, args.force
+        )
+    except OSError as e:
+        print(f"Index build failed: {e}", file=sys.stderr)
+        return 1
+    print(
+        f"Index in {args.index_dir}: {len(summary['built'])} letter(s) rebuilt, "
+        f"{len(summary['skipped'])} unchanged, {len(summary['removed'])} stale file(s) removed"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = []
+# ///
+"""
+Build the char-mode practice set (characters.json) from a Cangjie code table.
+
+Reads any of the common table layouts, one entry per line:
+  .cin tables      "code<ws>char" between %chardef begin / %chardef end
+  Rime dict.yaml   "char<tab>code[<tab>weight]" after the "..." header terminator
+  plain lists      "char code", "code char" or "一m" (characters.txt, the old inline list)
+
+Each character keeps the first code the table lists for it (the primary code in cj5
+tables). Characters are ranked by --freq (a "char [count]" list, most frequent first
+when counts are absent), then by the table's own weights, then by table order;
+--limit keeps the top N after the category filters (--blocks, --max-length, --no-x,
+--charset).
+
+characters.json is compact and fetched lazily by the page instead of being inlined
+into keyExercise.html:
+  {"version": 1, "count": N,
+   "chars": "日時是...",            every character once, sorted by code
+   "codes": "AAgdiAmyo...",         the codes concatenated, first letter upper-cased
+   "prefixes": {"a": [0, 812], "ab": [0, 40], ...}}
+Sorting by code makes every 1- and 2-letter code prefix a contiguous [start, end)
+range of entries, which "prefixes" records.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+WORKDIR = os.path.dirname(__file__)
+DEFAULT_TABLE = os.path.join(WORKDIR, "characters.txt")
+DEFAULT_OUTPUT = os.path.join(WORKDIR, "characters.json")
+FORMAT_VERSION = 1
+PREFIX_LENGTHS = (1, 2)
+
+# Keys the trainer accepts (INVALID_KEY_REGEX in src/js/constants.js); z is not a
+# Cangjie radical key, so codes using it are dropped
+CODE_RE = re.compile(r"^[a-y]{1,5}$")
+INLINE_ENTRY_RE = re.compile(r"^(\D)([a-z]+)$")
+
+# Unicode blocks accepted by --blocks
+BLOCKS: Dict[str, List[Tuple[int, int]]] = {
+    "basic": [(0x4E00, 0x9FFF)],
+    "ext-a": [(0x3400, 0x4DBF)],
+    "ext-b+": [(0x20000, 0x3FFFF)],
+    "compat": [(0xF900, 0xFAFF), (0x2F800, 0x2FA1F)],
+}
+
+Entry = Tuple[str, str, Optional[float]]
+
+
+def iter_table_entries(lines: Iterable[str]) -> Iterator[Entry]:
+    """Yield (char, code, weight) for every entry line, skipping headers and comments."""
+    in_chardef = False
+    for raw in lines:
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        lowered = line.lower()
+        if lowered.startswith("%chardef"):
+            in_chardef = lowered.endswith("begin")
+            continue
+        if line.startswith("%"):
+            continue
+        tokens = line.split()
+        weight: Optional[float] = None
+        if len(tokens) == 1:
+            m = INLINE_ENTRY_RE.match(line)
+            if not m:
+                continue
+            char, code = m.group(1), m.group(2)
+        elif in_chardef or re.fullmatch(r"[a-z]+", tokens[0]):
+            code, char = tokens[0], tokens[1]
+        else:
+            char, code = tokens[0], tokens[1]
+            if len(tokens) > 2:
+                try:
+                    weight = float(tokens[2].rstrip("%"))
+                except ValueError:
+                    weight = None
+        yield char, code.lower(), weight
+
+
+def read_table(path: str) -> List[Entry]:
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    # Rime tables put metadata (which may contain "name: value" lines) before "..."
+    if "..." in lines:
+        lines = lines[lines.index("...") + 1:]
+    return list(iter_table_entries(lines))
+
+
+def read_frequencies(path: str) -> Dict[str, float]:
+    """char -> score (higher is more frequent); line order when no counts are given."""
+    scores: Dict[str, float] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.split() for line in f if line.strip() and not line.startswith("#")]
+    for rank, tokens in enumerate(lines):
+        char = tokens[0]
+        if len(char) != 1 or char in scores:
+            continue
+        try:
+            scores[char] = float(tokens[1]) if len(tokens) > 1 else -rank
+        except ValueError:
+            scores[char] = -rank
+    return scores
+
+
+def in_blocks(char: str, blocks: List[str]) -> bool:
+    cp = ord(char)
+    return any(lo <= cp <= hi for name in blocks for lo, hi in BLOCKS[name])
+
+
+def select_entries(
+    entries: List[Entry],
+    frequencies: Optional[Dict[str, float]] = None,
+    blocks: Optional[List[str]] = None,
+    max_length: int = 5,
+    allow_x: bool = True,
+    charset: Optional[Set[str]] = None,
+    limit: Optional[int] = None,
+) -> List[Tuple[str, str]]:
+    """Deduplicate, filter and rank entries; returns (char, code) sorted by code."""
+    primary: Dict[str, Tuple[str, Optional[float], int]] = {}
+    for order, (char, code, weight) in enumerate(entries):
+        if len(char) != 1 or char in primary or not CODE_RE.match(code):
+            continue
+        primary[char] = (code, weight, order)
+
+    kept: List[Tuple[Tuple[float, float, int], str, str]] = []
+    for char, (code, weight, order) in primary.items():
+        if len(code) > max_length or (not allow_x and "x" in code):
+            continue
+        if blocks and not in_blocks(char, blocks):
+            continue
+        if charset is not None and char not in charset:
+            continue
+        freq = frequencies.get(char) if frequencies else None
+        rank = (
+            -freq if freq is not None else float("inf"),
+            -weight if weight is not None else float("inf"),
+            order,
+        )
+        kept.append((rank, char, code))
+    kept.sort()
+    if limit is not None:
+        kept = kept[:limit]
+    return sorted(((char, code) for _, char, code in kept), key=lambda e: (e[1], e[0]))
+
+
+def pack_codes(codes: List[str]) -> str:
+    """Concatenate codes, upper-casing each first letter to mark where a code starts."""
+    return "".join(code[0].upper() + code[1:] for code in codes)
+
+
+def build_prefix_index(codes: List[str]) -> Dict[str, List[int]]:
+    """Prefix -> [start, end) over code-sorted entries, for each length in PREFIX_LENGTHS."""
+    index: Dict[str, List[int]] = {}
+    for i, code in enumerate(codes):
+        for n in PREFIX_LENGTHS:
+            if len(code) < n:
+                continue
+            span = index.setdefault(code[:n], [i, i])
+            span[1] = i + 1
+    return dict(sorted(index.items()))
+
+
+def build_dict(selected: List[Tuple[str, str]]) -> Dict[str, object]:
+    codes = [code for _, code in selected]
+    return {
+        "version": FORMAT_VERSION,
+        "count": len(selected),
+        "chars": "".join(char for char, _ in selected),
+        "codes": pack_codes(codes),
+        "prefixes": build_prefix_index(codes),
+    }
+
+
+def write_if_changed(path: str, payload: bytes) -> bool:
+    try:
+        with open(path, "rb") as f:
+            if f.read() == payload:
+                return False
+    except OSError:
+        pass
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return True
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("table", nargs="?", default=DEFAULT_TABLE, help="Cangjie code table to read")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="characters.json to write")
+    parser.add_argument("--freq", metavar="PATH", help="character frequency list used for ranking")
+    parser.add_argument("--limit", type=int, help="keep only the N highest-ranked characters")
+    parser.add_argument(
+        "--blocks",
+        help=f"comma-separated Unicode blocks to keep ({', '.join(BLOCKS)})",
+    )
+    parser.add_argument("--max-length", type=int, default=5, help="drop codes longer than this")
+    parser.add_argument("--no-x", action="store_true", help="drop codes using the x (難) key")
+    parser.add_argument("--charset", metavar="PATH", help="keep only characters that appear in this file")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    blocks = [b.strip() for b in args.blocks.split(",") if b.strip()] if args.blocks else None
+    unknown = [b for b in blocks or [] if b not in BLOCKS]
+    if unknown:
+        print(f"Unknown block(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    try:
+        entries = read_table(args.table)
+        frequencies = read_frequencies(args.freq) if args.freq else None
+        charset = None
+        if args.charset:
+            with open(args.charset, "r", encoding="utf-8") as f:
+                charset = set(f.read())
+    except OSError as e:
+        print(f"Failed to read input: {e}", file=sys.stderr)
+        return 1
+
+    selected = select_entries(
+        entries,
+        frequencies=frequencies,
+        blocks=blocks,
+        max_length=args.max_length,
+        allow_x=not args.no_x,
+        charset=charset,
+        limit=args.limit,
+    )
+    if not selected:
+        print(f"No usable entries in {args.table}", file=sys.stderr)
+        return 1
+    payload = json.dumps(build_dict(selected), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    changed = write_if_changed(args.output, payload)
+    print(
+        f"{'Wrote' if changed else 'Unchanged'} {args.output}: {len(selected)} characters "
+        f"from {len(entries)} table entries, {len(payload):,} bytes "
+        f"({len(gzip.compress(payload, mtime=0)):,} gzipped)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = []
+# ///
+"""
+Pack the auxiliary-form SVGs into <symbol> sprite sheets, one per Cangjie letter.
+
+Driven by experiment/auxiliary_forms.json: every cjrm-*/cjem-* file a letter's rows
+reference (fuzhu forms, zili examples and inline shuo_ming images) goes into
+sprites/<LETTER>.svg, and everything goes into sprites/all.svg. sprites/sprites.json
+maps each original filename to its sprite sheet and fragment id so the page can
+render <svg><use href="sprites/A.svg#cjem-a0-1"/></svg> and make one request per
+letter instead of one per image.
+
+Each sheet records the SHA-1 of its members; a sheet is rebuilt only when that changes.
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+from optimize_svgs import DEFAULT_OUTPUT_DIR as OPTIMIZED_DIR
+from optimize_svgs import SOURCE_DIR, SVG_NS, optimize_svg
+from svg_store import load_aliases
+from wiki_common import FILE_NAMESPACE_PATTERN
+
+WORKDIR = os.path.dirname(__file__)
+JSON_PATH = os.path.join(WORKDIR, "auxiliary_forms.json")
+DEFAULT_SPRITE_DIR = os.path.join(WORKDIR, "sprites")
+MAP_NAME = "sprites.json"
+COMBINED_NAME = "all.svg"
+# Sheet names this script writes: <LETTER>.svg and all.svg
+SHEET_NAME_RE = re.compile(r"^(?:[A-Z]|all)\.svg$")
+
+SPRITE_MEMBER_RE = re.compile(r"^cj[re]m-.+\.svg$", re.IGNORECASE)
+INLINE_FILE_RE = re.compile(
+    r"\[\[\s*" + FILE_NAMESPACE_PATTERN + r"\s*:\s*([^|\]]+?\.svg)\s*(?:\|[^\]]*)?\]\]",
+    re.IGNORECASE,
+)
+ID_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def fragment_id(filename: str) -> str:
+    stem = filename[:-4] if filename.lower().endswith(".svg") else filename
+    return ID_UNSAFE_RE.sub("_", stem)
+
+
+def letter_members(data: Dict[str, object]) -> Dict[str, List[str]]:
+    """Letter -> sprite member filenames in first-seen order."""
+    members: Dict[str, List[str]] = {}
+    for letter, bucket in data.items():
+        if not isinstance(bucket, dict):
+            continue
+        names: List[str] = []
+        for row in bucket.get("rows") or []:
+            for group in row.get("fuzhu_zixing") or []:
+                names.append(group.get("file") or "")
+                names.extend(z.get("file") or "" for z in group.get("zili") or [])
+            names.extend(m.group(1).strip() for m in INLINE_FILE_RE.finditer(row.get("shuo_ming") or ""))
+        seen = set()
+        members[letter] = []
+        for name in names:
+            if SPRITE_MEMBER_RE.match(name) and name.lower() not in seen:
+                seen.add(name.lower())
+                members[letter].append(name)
+    return members
+
+
+def load_member(svg_dir: str, name: str, aliases: Dict[str, str]) -> Optional[bytes]:
+    try:
+        with open(os.path.join(svg_dir, aliases.get(name, name)), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def to_symbol(name: str, source: bytes) -> Tuple[ET.Element, str]:
+    """Turn one SVG document into a <symbol> element; returns (symbol, viewBox).
+
+    Files are normalized through optimize_svg first so per-file <style> classes (every
+    Illustrator export reuses .st0/.st1 with different meanings) are inlined and cannot
+    leak into sibling symbols.
+    """
+    root = ET.fromstring(optimize_svg(source))
+    view_box = root.get("viewBox") or "0 0 {} {}".format(
+        root.get("width", "0").replace("px", ""), root.get("height", "0").replace("px", "")
+    )
+    symbol = ET.Element(f"{{{SVG_NS}}}symbol", {"id": fragment_id(name), "viewBox": view_box})
+    symbol.extend(list(root))
+    return symbol, view_box
+
+
+def render_sheet(symbols: List[ET.Element]) -> bytes:
+    sheet = ET.Element(f"{{{SVG_NS}}}svg")
+    sheet.extend(symbols)
+    markup = ET.tostring(sheet, encoding="unicode", short_empty_elements=True)
+    return markup.replace(" />", "/>").encode("utf-8")
+
+
+def members_digest(entries: List[Tuple[str, bytes]]) -> str:
+    h = hashlib.sha1()
+    for name, data in entries:
+        h.update(name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(hashlib.sha1(data).digest())
+    return h.hexdigest()
+
+
+def load_map(path: str) -> Dict[str, object]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_atomic(path: str, payload: bytes) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def build_sprites(
+    data: Dict[str, object],
+    svg_dir: str,
+    sprite_dir: str = DEFAULT_SPRITE_DIR,
+    force: bool = False,
+) -> Dict[str, object]:
+    """Write changed sheets and the mapping file; returns a summary."""
+    os.makedirs(sprite_dir, exist_ok=True)
+    map_path = os.path.join(sprite_dir, MAP_NAME)
+    previous = {} if force else load_map(map_path)
+    previous_bundles = previous.get("bundles") or {}
+    previous_view_boxes: Dict[str, str] = {
+        name: entry["viewBox"]
+        for letter in (previous.get("letters") or {}).values()
+        for name, entry in (letter.get("files") or {}).items()
+    }
+
+    members = letter_members(data)
+    # The alias map sits beside the source directory; 輔助字形.min mirrors its names
+    aliases = load_aliases(SOURCE_DIR)
+    contents: Dict[str, bytes] = {}
+    missing: List[str] = []
+    for names in members.values():
+        for name in names:
+            if name not in contents:
+                source = load_member(svg_dir, name, aliases)
+                if source is None:
+                    missing.append(name)
+                else:
+                    contents[name] = source
+
+    plan: Dict[str, List[str]] = {f"{letter}.svg": names for letter, names in members.items()}
+    plan[COMBINED_NAME] = list(dict.fromkeys(n for names in members.values() for n in names))
+
+    symbol_cache: Dict[str, Tuple[ET.Element, str]] = {}
+    bundles: Dict[str, Dict[str, object]] = {}
+    view_boxes: Dict[str, str] = {}
+    rebuilt: List[str] = []
+    for sheet_name, names in plan.items():
+        present = [(n, contents[n]) for n in names if n in contents]
+        digest = members_digest(present)
+        sheet_path = os.path.join(sprite_dir, sheet_name)
+        cached = previous_bundles.get(sheet_name) or {}
+        fresh = cached.get("members_sha1") != digest or not os.path.exists(sheet_path)
+        symbols: List[ET.Element] = []
+        for name, source in present:
+            if not fresh and name in previous_view_boxes:
+                view_boxes[name] = previous_view_boxes[name]
+                continue
+            if name not in symbol_cache:
+                symbol_cache[name] = to_symbol(name, source)
+            view_boxes[name] = symbol_cache[name][1]
+            if fresh:
+                # Copy so the same symbol can sit in a letter sheet and the combined one
+                symbols.append(copy.deepcopy(symbol_cache[name][0]))
+        if fresh:
+            write_atomic(sheet_path, render_sheet(symbols))
+            rebuilt.append(sheet_name)
+        bundles[sheet_name] = {"members_sha1": digest, "members": len(present)}
+
+    letters: Dict[str, Dict[str, object]] = {}
+    for letter, names in members.items():
+        letters[letter] = {
+            "sprite": f"{letter}.svg",
+            "files": {
+                n: {"id": fragment_id(n), "viewBox": view_boxes[n]}
+                for n in names
+                if n in view_boxes
+            },
+        }
+    mapping = {"combined": COMBINED_NAME, "letters": letters, "bundles": bundles}
+    payload = json.dumps(mapping, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    write_atomic(map_path, payload.encode("utf-8"))
+
+    # Drop sheets for letters that disappeared from the table; other SVGs in the
+    # directory are left alone
+    for name in os.listdir(sprite_dir):
+        if SHEET_NAME_RE.match(name) and name not in plan:
+            os.remove(os.path.join(sprite_dir, name))
+
+    return {"sheets": len(plan), "rebuilt": rebuilt, "missing": missing}
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", default=JSON_PATH, help="auxiliary_forms.json to read")
+    parser.add_argument(
+        "--svg-dir",
+        default=None,
+        help=f"member SVGs (default: {OPTIMIZED_DIR} if present, else {SOURCE_DIR})",
+    )
+    parser.add_argument("--output-dir", default=DEFAULT_SPRITE_DIR)
+    parser.add_argument("--force", action="store_true", help="rebuild every sheet")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    try:
+        with open(args.json, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Failed to load JSON: {e}", file=sys.stderr)
+        return 1
+    svg_dir = args.svg_dir or (OPTIMIZED_DIR if os.path.isdir(OPTIMIZED_DIR) else SOURCE_DIR)
+
+    summary = build_sprites(data, svg_dir, args.output_dir, force=args.force)
+    print(
+        f"{summary['sheets']} sprite sheets in {args.output_dir}; "
+        f"rebuilt {len(summary['rebuilt'])}: {', '.join(summary['rebuilt']) or '-'}"
+    )
+    if summary["missing"]:
+        preview = ", ".join(summary["missing"][:5])
+        suffix = "..." if len(summary["missing"]) > 5 else ""
+        print(f"Warning: {len(summary['missing'])} SVGs not found: {preview}{suffix}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = [
+#   "aiohttp",
+#   "requests",
+#   "wikitextparser",
+# ]
+# ///
+"""
+One entry point for the auxiliary-forms scripts.
+
+  export    export_auxiliary_forms_json.py: the 輔助字形 table to JSON (and shards)
+  export-pages
+            export_wiki_pages.py: tables from several wiki pages, batched per request
+  download  download_auxiliary_svgs.py: fetch every SVG an export references
+  sync      export then download in one process: the export structure goes to the
+            downloader in memory and both stages share one HTTP connection pool;
+            only the SVGs of rows the export's change feed lists are checked
+  verify    check the SVG directory against an export and the download manifest,
+            without touching the network
+  gc        svg_store.py: report missing, unreferenced and duplicate SVGs; optionally
+            prune orphans and collapse duplicates behind an alias map
+  watch     watch_wiki.py: stay running, poll the page revision and the files'
+            sha1s, and sync only what changed; serves GET /status
+
+Subcommand modules are imported only when their command runs, and they import
+requests/wikitextparser/aiohttp lazily, so --help and verify start quickly.
+"""
+
+import argparse
+import os
+import sys
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from stage_profile import NULL_RECORDER, Recorder, add_profile_arguments, profiling
+
+if TYPE_CHECKING:
+    from requests.adapters import HTTPAdapter
+
+
+def cmd_export(args: argparse.Namespace, recorder: Recorder) -> int:
+    import export_auxiliary_forms_json as exporter
+
+    return exporter.run(args, recorder)
+
+
+def cmd_export_pages(args: argparse.Namespace, recorder: Recorder) -> int:
+    import export_wiki_pages as pages
+
+    return pages.run(args, recorder)
+
+
+def cmd_download(args: argparse.Namespace, recorder: Recorder) -> int:
+    import download_auxiliary_svgs as downloader
+
+    return downloader.run(args, recorder)
+
+
+def cmd_sync(
+    args: argparse.Namespace,
+    recorder: Recorder = NULL_RECORDER,
+    pool: Optional["HTTPAdapter"] = None,
+) -> int:
+    """Export, download and write shards. `pool` lets a long-running caller (see
+    watch_wiki.py) keep one connection pool across syncs; args are left unchanged."""
+    import download_auxiliary_svgs as downloader
+    import export_auxiliary_forms_json as exporter
+    from wiki_common import new_pool, new_session
+
+    # Shards record intrinsic SVG sizes, so they are written once the files are here
+    shard_dir = args.shard_dir
+    export_args = argparse.Namespace(**{**vars(args), "shard_dir": None})
+    download_args = argparse.Namespace(**{**vars(args), "output_dir": args.svg_dir})
+    own_pool = pool is None
+    if own_pool:
+        pool = new_pool(max(args.workers, args.api_workers) + 1)
+    try:
+        # The export runs on this thread; download workers mount their own Sessions
+        rc, output = exporter.export_page(export_args, recorder, new_session(pool=pool))
+        if rc != 0:
+            return rc
+        if output is None:
+            print(f"No export structure available from {args.output}", file=sys.stderr)
+            return 1
+        export_sha1 = exporter.file_sha1(args.output)
+        names = None
+        if args.changes and os.path.isfile(args.changes):
+            names = downloader.load_change_feed(
+                args.changes, export_sha1, downloader.load_synced_export(args.svg_dir)
+            )
+        rc = downloader.sync_files(
+            output, download_args, recorder, pool, names=names, export_sha1=export_sha1
+        )
+    finally:
+        if own_pool:
+            pool.close()
+    if rc == 0 and shard_dir:
+        with recorder.stage("write", target="shards") as extra:
+            written = exporter.write_shards(output, shard_dir, args.svg_dir)
+            extra["files"] = written
+        print(f"Wrote {written} shard file(s) to {shard_dir}")
+    return rc
+
+
+def cmd_gc(args: argparse.Namespace, recorder: Recorder) -> int:
+    import svg_store
+
+    return svg_store.run(args, recorder)
+
+
+def cmd_watch(args: argparse.Namespace, recorder: Recorder) -> int:
+    import watch_wiki
+
+    return watch_wiki.run(args, recorder)
+
+
+def verify_files(
+    names: List[str],
+    output_dir: str,
+    manifest_entries: Dict[str, Dict[str, object]],
+    aliases: Optional[Dict[str, str]] = None,
+) -> Dict[str, List[str]]:
+    """Classify each referenced file as missing, mismatched (size or sha1 differs from
+    the manifest) or unrecorded (present but absent from the manifest). An alias
+    (see svg_store.py) is checked through its canonical file."""
+    from download_auxiliary_svgs import file_digest
+
+    aliases = aliases or {}
+    problems: Dict[str, List[str]] = {"missing": [], "mismatched": [], "unrecorded": []}
+    for name in names:
+        path = os.path.join(output_dir, name)
+        if not os.path.isfile(path) and name in aliases:
+            path = os.path.join(output_dir, aliases[name])
+        if not os.path.isfile(path):
+            problems["missing"].append(name)
+            continue
+        entry = manifest_entries.get(name)
+        if entry is None:
+            problems["unrecorded"].append(name)
+            continue
+        if os.path.getsize(path) != entry.get("size"):
+            problems["mismatched"].append(name)
+            continue
+        sha1, _ = file_digest(path)
+        if sha1 != entry.get("sha1"):
+            problems["mismatched"].append(name)
+    return problems
+
+
+def cmd_verify(args: argparse.Namespace, recorder: Recorder = NULL_RECORDER) -> int:
+    import json
+
+    from download_auxiliary_svgs import (
+        Manifest,
+        extract_filenames_from_json,
+        manifest_path_for,
+        unique_preserving_order,
+    )
+    from svg_store import list_store, load_aliases
+
+    try:
+        with recorder.stage("load_json"):
+            with open(args.json, "r", encoding="utf-8") as f:
+                data = json.load(f)
+    except Exception as e:
+        print(f"Failed to load JSON: {e}", file=sys.stderr)
+        return 1
+    names = unique_preserving_order(extract_filenames_from_json(data))
+    manifest = Manifest.load(manifest_path_for(args.output_dir))
+    aliases = load_aliases(args.output_dir)
+    with recorder.stage("verify") as extra:
+        problems = verify_files(names, args.output_dir, manifest.entries, aliases)
+        known = set(names) | set(aliases.values())
+        problems["unreferenced"] = [n for n in list_store(args.output_dir) if n not in known]
+        extra.update(files=len(names), **{k: len(v) for k, v in problems.items()})
+
+    print(f"Checked {len(names)} files in {args.output_dir}")
+    failed = False
+    for kind, found in problems.items():
+        if not found:
+            continue
+        # Files the manifest does not know about, and orphans (see gc), are only
+        # worth a note
+        failed = failed or kind not in ("unrecorded", "unreferenced")
+        preview = ", ".join(found[:5])
+        suffix = "..." if len(found) > 5 else ""
+        print(f"  {kind}: {len(found)} ({preview}{suffix})", file=sys.stderr)
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    # Argument definitions live with each script; importing them is cheap because
+    # the heavy dependencies are only loaded by the code that uses them
+    import download_auxiliary_svgs as downloader
+    import export_auxiliary_forms_json as exporter
+    import export_wiki_pages as pages
+    import svg_store
+    import watch_wiki
+
+    export = commands.add_parser("export", help="export the 輔助字形 table to JSON")
+    exporter.add_arguments(export)
+    export.set_defaults(handler=cmd_export)
+
+    export_pages = commands.add_parser(
+        "export-pages", help="export tables from several wiki pages, 50 titles per request"
+    )
+    pages.add_arguments(export_pages)
+    export_pages.set_defaults(handler=cmd_export_pages)
+
+    download = commands.add_parser("download", help="download the SVGs an export references")
+    downloader.add_arguments(download)
+    download.set_defaults(handler=cmd_download)
+
+    sync = commands.add_parser(
+        "sync",
+        help="export and download in one process with a shared connection pool",
+        description=(
+            "Export, then download into --svg-dir, then write shards. The shared pool "
+            "covers the threaded engine; --async opens its own aiohttp session."
+        ),
+    )
+    exporter.add_arguments(sync)
+    downloader.add_transfer_arguments(sync)
+    sync.set_defaults(handler=cmd_sync)
+
+    verify = commands.add_parser("verify", help="check downloaded SVGs against an export (offline)")
+    verify.add_argument("--json", default=downloader.JSON_PATH, help="auxiliary_forms.json to read")
+    verify.add_argument("--output-dir", default=downloader.OUTPUT_DIR, help="directory holding the SVGs")
+    add_profile_arguments(verify)
+    verify.set_defaults(handler=cmd_verify)
+
+    gc = commands.add_parser(
+        "gc", help="find orphaned and duplicate SVGs; optionally prune and dedup them (offline)"
+    )
+    svg_store.add_arguments(gc)
+    gc.set_defaults(handler=cmd_gc)
+
+    watch = commands.add_parser(
+        "watch", help="keep syncing as the wiki changes, with a local status endpoint"
+    )
+    exporter.add_arguments(watch)
+    downloader.add_transfer_arguments(watch)
+    watch_wiki.add_arguments(watch)
+    watch.set_defaults(handler=cmd_watch)
+
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    with profiling(args, args.command) as recorder:
+        return args.handler(args, recorder)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -2,63 +2,186 @@
 # /// script
 # requires-python = ">=3.9"
 # dependencies = [
+#   "aiohttp",
 #   "requests",
-#   "wikitextparser",
 # ]
 # ///
 """
 Download all SVGs referenced in experiment/auxiliary_forms.json using the MediaWiki API
 and save them to experiment/輔助字形.
 
-The JSON stores wikitext-style links like [[Image:cjrm-a0.svg|30px|...]]. We parse
-wikilinks with wikitextparser to extract file names, query API for direct URLs, and download.
+The JSON stores wikitext-style links like [[Image:cjrm-a0.svg|30px|...]]. We match
+file links with a regex to extract file names, query API for direct URLs, and download.
+With --changes, only the files of rows the exporter's change feed marks as added or
+changed are looked at, so a routine wiki edit costs work proportional to the edit.
+That holds only when the feed starts from the export the directory was last completely
+synced against, which is recorded in 輔助字形.synced.json. Otherwise, for example after
+two exports without a download in between, the whole table is checked.
+
+Resolution and download are pipelined: API batch lookups run concurrently and feed a
+bounded queue that download workers drain, so a file starts downloading as soon as its
+batch resolves instead of after every batch has been looked up.
+
+With --async the same pipeline runs on asyncio/aiohttp over a bounded keep-alive pool per
+host. Both modes retry transient failures (connection errors, 429 and 5xx) with jittered
+exponential backoff and honour Retry-After.
 """
 
+import argparse
+import asyncio
 import concurrent.futures
+import contextlib
+import email.utils
+import hashlib
 import json
 import os
+import queue
+import random
+import re
 import sys
-from typing import Dict, List, Optional, Set, Tuple, Union
+import threading
+import time
+import urllib.parse
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from stage_profile import NULL_RECORDER, Recorder, add_profile_arguments, profiling
+from wiki_common import API_URL
+from wiki_common import FILE_NAMESPACE_PATTERN
+from wiki_common import HEADERS as BASE_HEADERS
+from wiki_common import new_session
 
-import requests
-import wikitextparser as wtp
+if TYPE_CHECKING:
+    # requests is imported where used so --help and verify start without it
+    import requests
+    from requests.adapters import HTTPAdapter
 
-API_URL = "https://zh.wikibooks.org/w/api.php"
 WORKDIR = os.path.dirname(__file__)
 JSON_PATH = os.path.join(WORKDIR, "auxiliary_forms.json")
 OUTPUT_DIR = os.path.join(WORKDIR, "輔助字形")
+PART_SUFFIX = ".part"
+
+# [[File:name.svg|...]] links in shuo_ming; group 1 is the file name
+SVG_LINK_RE = re.compile(
+    r"\[\[\s*" + FILE_NAMESPACE_PATTERN + r"\s*:\s*([^|\]\n]+?\.svg)\s*(?:\|[^\]]*)?\]\]",
+    re.IGNORECASE,
+)
+
+BATCH_SIZE = 50  # MediaWiki limit for titles per query
+DEFAULT_API_WORKERS = 4
+DEFAULT_DOWNLOAD_WORKERS = 8
+DEFAULT_QUEUE_SIZE = 64
+
+# Statuses worth retrying; anything else (e.g. 404) fails immediately
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# API imageinfo for one file: {"url", "sha1", "size", "timestamp"}
+FileInfo = Dict[str, object]
+
+HEADERS = {**BASE_HEADERS, "Accept": "application/json"}
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+
+
+DEFAULT_RETRY = RetryPolicy()
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status: int, retry_after: Optional[float]) -> None:
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, policy: RetryPolicy, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; a server-provided Retry-After wins if longer."""
+    delay = random.uniform(0, min(policy.max_delay, policy.base_delay * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, policy.max_delay))
+    return delay
+
+
+class RateLimiter:
+    """Threaded counterpart of AsyncRateLimiter: at most `rate` request starts per
+    second across all worker threads, pushed back together by pause_until()."""
+
+    def __init__(self, rate: Optional[float]) -> None:
+        self._interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def pause_until(self, when: float) -> None:
+        with self._lock:
+            self._next_start = max(self._next_start, when)
 
-FILE_NAMESPACES = {"file", "image", "檔案", "文件", "圖像", "圖片"}
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_start - now
+            self._next_start = max(now, self._next_start) + self._interval
+        if wait > 0:
+            time.sleep(wait)
 
-HEADERS = {
-    "User-Agent": "cangjie-learner/0.1 (+https://github.com/; contact: local-script)",
-    "Accept": "application/json",
-}
 
+class HostSlots:
+    """Cap concurrent requests per host across worker threads, like aiohttp's
+    limit_per_host does for the async engine. None or 0 means no cap."""
 
-def ensure_output_dir() -> None:
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    def __init__(self, per_host: Optional[int]) -> None:
+        self._per_host = per_host if per_host and per_host > 0 else 0
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def hold(self, url: str) -> Iterator[None]:
+        if not self._per_host:
+            yield
+            return
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = threading.BoundedSemaphore(self._per_host)
+        with slot:
+            yield
 
 
 def extract_svgs_from_wikitext(text: str) -> List[str]:
     if not text:
         return []
-    result: List[str] = []
-    try:
-        parsed = wtp.parse(text)
-    except Exception:
-        return result
-    for wl in parsed.wikilinks:
-        target = (wl.target or "").strip()
-        if not target or ":" not in target:
-            continue
-        ns, name = target.split(":", 1)
-        if ns.strip().lower() not in FILE_NAMESPACES:
-            continue
-        name = name.strip()
-        if name.lower().endswith(".svg"):
-            result.append(name)
-    return result
+    return [m.group(1).strip() for m in SVG_LINK_RE.finditer(text)]
 
 
 def extract_filenames_from_json(data: Dict[str, object]) -> List[str]:
@@ -109,6 +232,62 @@ def unique_preserving_order(names: List[str]) -> List[str]:
     return result
 
 
+def load_change_feed(path: str, json_sha1: str, synced_sha1: Optional[str]) -> Optional[List[str]]:
+    """SVGs referenced by rows the exporter's change feed marks added or changed.
+
+    synced_sha1 is the export the SVG directory was last fully synced against (see
+    load_synced_export). Returns [] when that is already json_sha1, and the feed's
+    files when the feed goes from synced_sha1 to json_sha1. Returns None in every
+    other case, so callers walk the whole table: the feed is missing or unreadable,
+    it was written for another export, or several exports ran since the last
+    download and the feed only describes the latest one.
+    """
+    if synced_sha1 == json_sha1:
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            feed = json.load(f)
+    except (OSError, ValueError) as exc:
+        print(f"Ignoring change feed {path}: {exc}", file=sys.stderr)
+        return None
+    if not isinstance(feed, dict) or feed.get("to") != json_sha1:
+        print(f"Change feed {path} does not match the export; checking every file", file=sys.stderr)
+        return None
+    if synced_sha1 is None:
+        print("No record of a completed sync; checking every file", file=sys.stderr)
+        return None
+    if feed.get("from") != synced_sha1:
+        print(
+            f"Change feed {path} does not start from the last synced export; checking every file",
+            file=sys.stderr,
+        )
+        return None
+    return [name for name in feed.get("files") or [] if isinstance(name, str) and name.strip()]
+
+
+def synced_export_path_for(output_dir: str) -> str:
+    return os.path.normpath(output_dir) + ".synced.json"
+
+
+def load_synced_export(output_dir: str) -> Optional[str]:
+    """sha1 of the export the directory was last completely synced against."""
+    try:
+        with open(synced_export_path_for(output_dir), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    value = data.get("export_sha1") if isinstance(data, dict) else None
+    return value if isinstance(value, str) else None
+
+
+def save_synced_export(output_dir: str, json_sha1: str) -> None:
+    path = synced_export_path_for(output_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"export_sha1": json_sha1}, f)
+    os.replace(tmp_path, path)
+
+
 def canonical_api_title(filename: str) -> str:
     # No need to normalize; MediaWiki normalizes. Keeping as-is is fine.
     return filename
@@ -120,39 +299,106 @@ def _iter_pages(pages: Union[Dict[str, dict], List[dict]]):
     return pages or []
 
 
-def query_file_urls(batch: List[str]) -> Dict[str, Optional[str]]:
-    if not batch:
-        return {}
-    params = {
-        "action": "query",
-        "format": "json",
-        "titles": build_titles_param(batch),
-        "prop": "imageinfo",
-        "iiprop": "url",
-    }
-    try:
-        resp = requests.get(API_URL, params=params, headers=HEADERS, timeout=30)
-        resp.raise_for_status()
-    except Exception:
-        return {name: None for name in batch}
-    data = resp.json()
+def parse_imageinfo_pages(batch: List[str], data: Dict[str, object]) -> Dict[str, Optional[FileInfo]]:
     pages = data.get("query", {}).get("pages", {})
     # Map lowercased original names -> original casing
     lower_to_original: Dict[str, str] = {name.lower(): name for name in batch}
-    result: Dict[str, Optional[str]] = {name: None for name in batch}
-    resolved = 0
+    result: Dict[str, Optional[FileInfo]] = {name: None for name in batch}
     for page in _iter_pages(pages):
         title = page.get("title", "")  # e.g., File:Cjrm-a0.svg
         basename = title.split(":", 1)[-1]
         info = page.get("imageinfo")
-        url = None
+        latest: Dict[str, object] = {}
         if info and isinstance(info, list) and info:
-            url = info[0].get("url")
+            latest = info[0]
         original = lower_to_original.get(basename.lower())
-        if original is not None and url:
-            result[original] = url
-            resolved += 1
+        if original is not None and latest.get("url"):
+            result[original] = {
+                "url": latest.get("url"),
+                "sha1": latest.get("sha1"),
+                "size": latest.get("size"),
+                "timestamp": latest.get("timestamp"),
+            }
+    return result
+
+
+def imageinfo_params(batch: List[str]) -> Dict[str, str]:
+    return {
+        "action": "query",
+        "format": "json",
+        "titles": build_titles_param(batch),
+        "prop": "imageinfo",
+        "iiprop": "url|sha1|size|timestamp",
+    }
+
+
+def get_with_retries(
+    session: "requests.Session",
+    url: str,
+    policy: RetryPolicy = DEFAULT_RETRY,
+    limiter: Optional[RateLimiter] = None,
+    **kwargs: object,
+) -> "requests.Response":
+    """GET url, retrying connection errors and RETRY_STATUSES with backoff.
+
+    Every attempt waits for `limiter` when one is given; a Retry-After pauses it for
+    all threads. The caller owns the returned response (close it or use it as a
+    context manager).
+    """
+    import requests
+
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            resp = session.get(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt + 1 >= policy.max_attempts:
+                raise
+            time.sleep(backoff_delay(attempt, policy))
+            attempt += 1
+            continue
+        if resp.status_code in RETRY_STATUSES and attempt + 1 < policy.max_attempts:
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            resp.close()
+            delay = backoff_delay(attempt, policy, retry_after)
+            if limiter is not None and retry_after is not None:
+                limiter.pause_until(time.monotonic() + delay)
+            time.sleep(delay)
+            attempt += 1
+            continue
+        resp.raise_for_status()
+        return resp
+
+
+def query_file_urls(
+    batch: List[str],
+    api_url: str = API_URL,
+    session: Optional["requests.Session"] = None,
+    policy: RetryPolicy = DEFAULT_RETRY,
+    limiter: Optional[RateLimiter] = None,
+) -> Dict[str, Optional[FileInfo]]:
+    """Return name -> {"url", "sha1", "size", "timestamp"} (None if unresolved)."""
+    if not batch:
+        return {}
+    try:
+        with get_with_retries(
+            session or new_session(),
+            api_url,
+            policy,
+            limiter,
+            params=imageinfo_params(batch),
+            headers=HEADERS,
+            timeout=30,
+        ) as resp:
+            data = resp.json()
+    except Exception as exc:
+        print(f"API lookup failed for {len(batch)} names: {exc}", file=sys.stderr)
+        return {name: None for name in batch}
+    result = parse_imageinfo_pages(batch, data)
     # Debug summary per batch
+    resolved = sum(1 for info in result.values() if info)
     print(f"Resolved {resolved}/{len(batch)} via API", file=sys.stderr)
     return result
 
@@ -162,79 +408,789 @@ def build_titles_param(batch: List[str]) -> str:
     return "|".join([f"File:{canonical_api_title(name)}" for name in batch])
 
 
-def download_file(session: requests.Session, name: str, url: str) -> Tuple[str, bool, Optional[str]]:
-    out_path = os.path.join(OUTPUT_DIR, name)
-    # Skip if already exists
-    if os.path.exists(out_path) and os.path.getsize(out_path) > 0:
-        return (name, True, None)
+class Manifest:
+    """Local record of synced files: name -> {"sha1", "size", "timestamp"}.
+
+    Stored as JSON next to the output directory. Thread-safe; save() writes atomically.
+    """
+
+    def __init__(self, path: str, entries: Optional[Dict[str, Dict[str, object]]] = None) -> None:
+        self.path = path
+        self.entries: Dict[str, Dict[str, object]] = entries or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        return cls(path, entries if isinstance(entries, dict) else {})
+
+    def get(self, name: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            return self.entries.get(name)
+
+    def record(self, name: str, entry: Dict[str, object]) -> None:
+        with self._lock:
+            self.entries[name] = entry
+
+    def save(self) -> None:
+        with self._lock:
+            payload = json.dumps(self.entries, ensure_ascii=False, indent=2, sort_keys=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+
+
+def manifest_path_for(output_dir: str) -> str:
+    # Kept beside (not inside) the SVG directory so the directory only holds assets
+    return os.path.normpath(output_dir) + ".manifest.json"
+
+
+def file_digest(path: str) -> Tuple[str, int]:
+    h = hashlib.sha1()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+            size += len(chunk)
+    return h.hexdigest(), size
+
+
+def needs_download(name: str, info: FileInfo, manifest: Manifest, output_dir: str) -> bool:
+    """Decide whether name must be fetched, adopting matching local files into the manifest."""
+    out_path = os.path.join(output_dir, name)
+    remote_sha1 = info.get("sha1")
+    entry = manifest.get(name)
+    if not os.path.exists(out_path):
+        # Collapsed by svg_store.py --dedup: fine while the wiki copy still matches
+        canonical = entry.get("alias_of") if entry else None
+        return not (
+            canonical
+            and remote_sha1
+            and entry.get("sha1") == remote_sha1
+            and os.path.exists(os.path.join(output_dir, canonical))
+        )
+    if (
+        entry
+        and remote_sha1
+        and entry.get("sha1") == remote_sha1
+        and entry.get("size") == os.path.getsize(out_path)
+    ):
+        return False
+    if not remote_sha1:
+        # Nothing to compare against; fall back to "present and non-empty"
+        return os.path.getsize(out_path) == 0
+    sha1, size = file_digest(out_path)
+    if sha1 != remote_sha1:
+        return True
+    manifest.record(name, manifest_entry(info, sha1, size))
+    return False
+
+
+def manifest_entry(info: FileInfo, sha1: str, size: int) -> Dict[str, object]:
+    return {"sha1": sha1, "size": size, "timestamp": info.get("timestamp")}
+
+
+def part_offset(part_path: str) -> int:
+    try:
+        return os.path.getsize(part_path)
+    except OSError:
+        return 0
+
+
+def range_headers(offset: int) -> Dict[str, str]:
+    headers = dict(HEADERS)
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+    return headers
+
+
+def commit_part(part_path: str, out_path: str, info: FileInfo) -> Tuple[str, int]:
+    """Verify a finished .part against the API's sha1/size and rename it into place.
+
+    A mismatching .part is deleted and ValueError raised.
+    """
+    sha1, size = file_digest(part_path)
+    expected_sha1 = info.get("sha1")
+    expected_size = info.get("size")
+    if (expected_sha1 and sha1 != expected_sha1) or (
+        isinstance(expected_size, int) and size != expected_size
+    ):
+        os.remove(part_path)
+        raise ValueError(f"verification failed: got sha1 {sha1} ({size} bytes)")
+    os.replace(part_path, out_path)
+    return sha1, size
+
+
+def _fetch_to_part(
+    session: "requests.Session",
+    url: str,
+    part_path: str,
+    policy: RetryPolicy,
+    limiter: Optional[RateLimiter] = None,
+) -> bool:
+    """Fetch url into part_path, resuming via Range when a partial file exists.
+
+    Returns whether the download resumed from an existing partial file.
+    """
+    import requests
+
+    offset = part_offset(part_path)
     try:
-        with session.get(url, headers=HEADERS, timeout=60, stream=True) as r:
-            r.raise_for_status()
-            os.makedirs(os.path.dirname(out_path), exist_ok=True)
-            with open(out_path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=65536):
-                    if chunk:
-                        f.write(chunk)
+        r = get_with_retries(
+            session, url, policy, limiter, headers=range_headers(offset), timeout=60, stream=True
+        )
+    except requests.HTTPError as exc:
+        # 416: the partial file is unusable (e.g. longer than the new remote file)
+        if offset and exc.response is not None and exc.response.status_code == 416:
+            os.remove(part_path)
+            return _fetch_to_part(session, url, part_path, policy, limiter)
+        raise
+    with r:
+        resumed = offset > 0 and r.status_code == 206
+        with open(part_path, "ab") as f:
+            f.truncate(offset if resumed else 0)
+            for chunk in r.iter_content(chunk_size=65536):
+                if chunk:
+                    f.write(chunk)
+        return resumed
+
+
+def download_file(
+    session: "requests.Session",
+    name: str,
+    info: FileInfo,
+    output_dir: str = OUTPUT_DIR,
+    policy: RetryPolicy = DEFAULT_RETRY,
+    manifest: Optional[Manifest] = None,
+    limiter: Optional[RateLimiter] = None,
+) -> Tuple[str, bool, Optional[str]]:
+    """Download into <name>.part, verify the sha1 and atomically rename into place."""
+    out_path = os.path.join(output_dir, name)
+    part_path = out_path + PART_SUFFIX
+    try:
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        resumed = _fetch_to_part(session, str(info["url"]), part_path, policy, limiter)
+        try:
+            sha1, size = commit_part(part_path, out_path, info)
+        except ValueError:
+            if not resumed:
+                raise
+            # The stale prefix did not belong to this version; start over once
+            _fetch_to_part(session, str(info["url"]), part_path, policy, limiter)
+            sha1, size = commit_part(part_path, out_path, info)
+        if manifest is not None:
+            manifest.record(name, manifest_entry(info, sha1, size))
         return (name, True, None)
     except Exception as e:
         return (name, False, str(e))
 
 
+def rebase_url(url: str, media_base: Optional[str]) -> str:
+    """Swap the scheme and host of a file URL for media_base, keeping the path.
+
+    media_base may carry a path prefix, e.g. http://127.0.0.1:8765/mirror.
+    """
+    if not media_base:
+        return url
+    parts = urllib.parse.urlsplit(url)
+    base = urllib.parse.urlsplit(media_base)
+    return urllib.parse.urlunsplit(
+        (base.scheme, base.netloc, base.path.rstrip("/") + parts.path, parts.query, "")
+    )
+
+
+def rebase_file_urls(infos: Dict[str, Optional[FileInfo]], media_base: Optional[str]) -> None:
+    if not media_base:
+        return
+    for info in infos.values():
+        if info and info.get("url"):
+            info["url"] = rebase_url(str(info["url"]), media_base)
+
+
+def iter_batches(names: List[str], batch_size: int = BATCH_SIZE) -> Iterator[List[str]]:
+    for i in range(0, len(names), batch_size):
+        yield names[i:i+batch_size]
+
+
+def record_file(
+    recorder: Recorder,
+    result: Tuple[str, bool, Optional[str]],
+    info: FileInfo,
+    enqueued: float,
+    started: float,
+) -> None:
+    """Emit one per-file profile event: bytes, transfer time and time spent queued."""
+    if not recorder.enabled:
+        return
+    seconds = time.perf_counter() - started
+    size = int(info.get("size") or 0) if result[1] else 0
+    recorder.event(
+        "file",
+        file=result[0],
+        ok=result[1],
+        bytes=size,
+        seconds=round(seconds, 6),
+        bytes_per_s=round(size / seconds, 1) if seconds > 0 else None,
+        queue_wait=round(started - enqueued, 6),
+    )
+
+
+def run_pipeline(
+    names: List[str],
+    api_url: str = API_URL,
+    output_dir: str = OUTPUT_DIR,
+    batch_size: int = BATCH_SIZE,
+    api_workers: int = DEFAULT_API_WORKERS,
+    download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    max_rps: Optional[float] = None,
+    per_host: Optional[int] = None,
+    policy: RetryPolicy = DEFAULT_RETRY,
+    manifest: Optional[Manifest] = None,
+    media_base: Optional[str] = None,
+    recorder: Recorder = NULL_RECORDER,
+    pool: Optional["HTTPAdapter"] = None,
+) -> Tuple[List[Tuple[str, bool, Optional[str]]], List[str], List[str]]:
+    """Resolve names in concurrent API batches and download them as they resolve.
+
+    Pass `pool` (see wiki_common.new_pool) to run every worker on one connection pool,
+    e.g. one already warmed up by the export; otherwise each thread opens its own.
+    `max_rps` caps request starts per second across all threads and `per_host` the
+    requests in flight to one host; both are off by default.
+
+    Returns (download results, names the API had no URL for, names already up to date).
+    """
+    if manifest is None:
+        manifest = Manifest.load(manifest_path_for(output_dir))
+    # Bounded so resolvers block instead of racing ahead of slow downloads;
+    # items carry their enqueue time so queue wait can be profiled
+    work: "queue.Queue[Optional[Tuple[str, FileInfo, float]]]" = queue.Queue(maxsize=max(1, queue_size))
+    results: List[Tuple[str, bool, Optional[str]]] = []
+    missing: List[str] = []
+    up_to_date: List[str] = []
+    lock = threading.Lock()
+    limiter = RateLimiter(max_rps)
+    slots = HostSlots(per_host)
+    # requests.Session is not guaranteed thread-safe; keep one per thread, all
+    # mounted on the shared pool when there is one
+    local = threading.local()
+
+    def thread_session() -> "requests.Session":
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = new_session(pool=pool)
+        return session
+
+    def resolve(batch: List[str]) -> None:
+        started = time.perf_counter()
+        with slots.hold(api_url):
+            partial = query_file_urls(
+                batch, api_url=api_url, session=thread_session(), policy=policy, limiter=limiter
+            )
+        recorder.event(
+            "api_batch",
+            names=len(batch),
+            resolved=sum(1 for info in partial.values() if info),
+            seconds=round(time.perf_counter() - started, 6),
+        )
+        rebase_file_urls(partial, media_base)
+        for name, info in partial.items():
+            if not info:
+                with lock:
+                    missing.append(name)
+            elif needs_download(name, info, manifest, output_dir):
+                work.put((name, info, time.perf_counter()))
+            else:
+                with lock:
+                    up_to_date.append(name)
+
+    def consume() -> None:
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            started = time.perf_counter()
+            with slots.hold(str(item[1]["url"])):
+                result = download_file(
+                    thread_session(), item[0], item[1], output_dir, policy, manifest, limiter
+                )
+            record_file(recorder, result, item[1], item[2], started)
+            with lock:
+                results.append(result)
+            if not result[1]:
+                print(f"Failed: {result[0]}: {result[2]}", file=sys.stderr)
+
+    consumers = [
+        threading.Thread(target=consume, name=f"download-{i}", daemon=True)
+        for i in range(max(1, download_workers))
+    ]
+    for t in consumers:
+        t.start()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, api_workers)) as ex:
+            for fut in [ex.submit(resolve, b) for b in iter_batches(names, batch_size)]:
+                fut.result()
+    finally:
+        for _ in consumers:
+            work.put(None)
+        for t in consumers:
+            t.join()
+        manifest.save()
+    return results, missing, up_to_date
+
+
+class AsyncRateLimiter:
+    """Space out request starts to at most `rate` per second across all tasks.
+
+    A throttling response can push every task back via pause_until(), so a 429 from the
+    wiki slows the whole sync down rather than just the request that hit it.
+    """
+
+    def __init__(self, rate: Optional[float]) -> None:
+        self._interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause_until(self, when: float) -> None:
+        self._next_start = max(self._next_start, when)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_start - now
+            self._next_start = max(now, self._next_start) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+async def fetch_with_retries_async(
+    session: "aiohttp.ClientSession",
+    url: str,
+    limiter: AsyncRateLimiter,
+    policy: RetryPolicy = DEFAULT_RETRY,
+    params: Optional[Dict[str, str]] = None,
+    timeout: float = 60,
+    headers: Optional[Dict[str, str]] = None,
+    handler: Optional[Callable[["aiohttp.ClientResponse"], Awaitable[Any]]] = None,
+) -> Any:
+    """GET url and return the body (or handler(resp)), retrying like get_with_retries.
+
+    `policy.max_attempts` is the per-request budget; the limiter is shared globally.
+    """
+    import aiohttp
+
+    attempt = 0
+    while True:
+        await limiter.acquire()
+        retry_after: Optional[float] = None
+        try:
+            async with session.get(
+                url,
+                params=params,
+                headers=headers or HEADERS,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as resp:
+                if resp.status not in RETRY_STATUSES:
+                    resp.raise_for_status()
+                    if handler is not None:
+                        return await handler(resp)
+                    return await resp.read()
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                error: Exception = RetryableStatus(resp.status, retry_after)
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as exc:
+            error = exc
+        if attempt + 1 >= policy.max_attempts:
+            raise error
+        delay = backoff_delay(attempt, policy, retry_after)
+        if retry_after is not None:
+            limiter.pause_until(time.monotonic() + delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def query_file_urls_async(
+    session: "aiohttp.ClientSession",
+    batch: List[str],
+    api_url: str,
+    limiter: AsyncRateLimiter,
+    policy: RetryPolicy = DEFAULT_RETRY,
+) -> Dict[str, Optional[FileInfo]]:
+    try:
+        body = await fetch_with_retries_async(
+            session, api_url, limiter, policy, params=imageinfo_params(batch), timeout=30
+        )
+        data = json.loads(body)
+    except Exception as exc:
+        print(f"API lookup failed for {len(batch)} names: {exc}", file=sys.stderr)
+        return {name: None for name in batch}
+    result = parse_imageinfo_pages(batch, data)
+    resolved = sum(1 for info in result.values() if info)
+    print(f"Resolved {resolved}/{len(batch)} via API", file=sys.stderr)
+    return result
+
+
+async def _fetch_to_part_async(
+    session: "aiohttp.ClientSession",
+    url: str,
+    part_path: str,
+    limiter: AsyncRateLimiter,
+    policy: RetryPolicy,
+) -> bool:
+    import aiohttp
+
+    offset = part_offset(part_path)
+
+    async def write_part(resp: "aiohttp.ClientResponse") -> bool:
+        resumed = offset > 0 and resp.status == 206
+        # Truncate on every attempt so a retried stream never appends twice
+        with open(part_path, "ab") as f:
+            f.truncate(offset if resumed else 0)
+            async for chunk in resp.content.iter_chunked(65536):
+                f.write(chunk)
+        return resumed
+
+    try:
+        return await fetch_with_retries_async(
+            session, url, limiter, policy, headers=range_headers(offset), handler=write_part
+        )
+    except aiohttp.ClientResponseError as exc:
+        if offset and exc.status == 416:
+            os.remove(part_path)
+            return await _fetch_to_part_async(session, url, part_path, limiter, policy)
+        raise
+
+
+async def download_file_async(
+    session: "aiohttp.ClientSession",
+    name: str,
+    info: FileInfo,
+    output_dir: str,
+    limiter: AsyncRateLimiter,
+    policy: RetryPolicy = DEFAULT_RETRY,
+    manifest: Optional[Manifest] = None,
+) -> Tuple[str, bool, Optional[str]]:
+    out_path = os.path.join(output_dir, name)
+    part_path = out_path + PART_SUFFIX
+    url = str(info["url"])
+    try:
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        resumed = await _fetch_to_part_async(session, url, part_path, limiter, policy)
+        try:
+            sha1, size = commit_part(part_path, out_path, info)
+        except ValueError:
+            if not resumed:
+                raise
+            await _fetch_to_part_async(session, url, part_path, limiter, policy)
+            sha1, size = commit_part(part_path, out_path, info)
+        if manifest is not None:
+            manifest.record(name, manifest_entry(info, sha1, size))
+        return (name, True, None)
+    except Exception as e:
+        return (name, False, str(e) or type(e).__name__)
+
+
+async def run_pipeline_async(
+    names: List[str],
+    api_url: str = API_URL,
+    output_dir: str = OUTPUT_DIR,
+    batch_size: int = BATCH_SIZE,
+    concurrency: int = DEFAULT_DOWNLOAD_WORKERS,
+    per_host: Optional[int] = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    max_rps: Optional[float] = None,
+    policy: RetryPolicy = DEFAULT_RETRY,
+    manifest: Optional[Manifest] = None,
+    media_base: Optional[str] = None,
+    recorder: Recorder = NULL_RECORDER,
+) -> Tuple[List[Tuple[str, bool, Optional[str]]], List[str], List[str]]:
+    """asyncio counterpart of run_pipeline over a bounded keep-alive connection pool.
+
+    `concurrency` bounds the connections in total and `per_host` (off by default)
+    those to one host.
+    """
+    try:
+        import aiohttp
+    except ImportError as exc:
+        raise RuntimeError("--async requires aiohttp (pip install aiohttp)") from exc
+
+    if manifest is None:
+        manifest = Manifest.load(manifest_path_for(output_dir))
+    work: "asyncio.Queue[Optional[Tuple[str, FileInfo, float]]]" = asyncio.Queue(maxsize=max(1, queue_size))
+    results: List[Tuple[str, bool, Optional[str]]] = []
+    missing: List[str] = []
+    up_to_date: List[str] = []
+    limiter = AsyncRateLimiter(max_rps)
+    # limit_per_host=0 is aiohttp's "no per-host cap"
+    connector = aiohttp.TCPConnector(
+        limit=max(1, concurrency),
+        limit_per_host=per_host if per_host and per_host > 0 else 0,
+    )
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def resolve(batch: List[str]) -> None:
+            started = time.perf_counter()
+            partial = await query_file_urls_async(session, batch, api_url, limiter, policy)
+            recorder.event(
+                "api_batch",
+                names=len(batch),
+                resolved=sum(1 for info in partial.values() if info),
+                seconds=round(time.perf_counter() - started, 6),
+            )
+            rebase_file_urls(partial, media_base)
+            for name, info in partial.items():
+                if not info:
+                    missing.append(name)
+                elif needs_download(name, info, manifest, output_dir):
+                    await work.put((name, info, time.perf_counter()))
+                else:
+                    up_to_date.append(name)
+
+        async def consume() -> None:
+            while True:
+                item = await work.get()
+                if item is None:
+                    return
+                started = time.perf_counter()
+                result = await download_file_async(
+                    session, item[0], item[1], output_dir, limiter, policy, manifest
+                )
+                record_file(recorder, result, item[1], item[2], started)
+                results.append(result)
+                if not result[1]:
+                    print(f"Failed: {result[0]}: {result[2]}", file=sys.stderr)
+
+        consumers = [asyncio.ensure_future(consume()) for _ in range(max(1, concurrency))]
+        try:
+            await asyncio.gather(*(resolve(b) for b in iter_batches(names, batch_size)))
+        finally:
+            for _ in consumers:
+                await work.put(None)
+            await asyncio.gather(*consumers)
+            manifest.save()
+    return results, missing, up_to_date
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    return parser.parse_args(argv[1:])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--json", default=JSON_PATH, help="auxiliary_forms.json to read")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="where to save SVGs")
+    parser.add_argument(
+        "--api-url",
+        default=API_URL,
+        help="MediaWiki api.php endpoint (e.g. a wiki_cassette.py server)",
+    )
+    parser.add_argument(
+        "--changes",
+        metavar="PATH",
+        help=(
+            "change feed written by the exporter; only the SVGs of added or changed rows "
+            "are checked (the whole table when the feed is for another export)"
+        ),
+    )
+    add_transfer_arguments(parser)
+    add_profile_arguments(parser)
+
+
+def add_transfer_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options for how files are fetched, shared with cli.py sync."""
+    parser.add_argument(
+        "--media-base",
+        default=None,
+        help="serve file URLs from this origin instead of the one imageinfo returns",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--api-workers",
+        type=int,
+        default=DEFAULT_API_WORKERS,
+        help="concurrent API batch lookups",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_DOWNLOAD_WORKERS,
+        help="concurrent downloads",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help="resolved URLs buffered between lookup and download",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="use the asyncio/aiohttp transfer engine",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=None,
+        help="concurrent requests per host (default: no cap beyond --workers)",
+    )
+    parser.add_argument(
+        "--max-rps",
+        type=float,
+        default=None,
+        help="cap on request starts per second, shared by all workers",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_RETRY.max_attempts,
+        help="attempts per request before giving up",
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=DEFAULT_RETRY.base_delay,
+        help="base delay in seconds for exponential backoff",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="run optimize_svgs.py on the output directory after syncing",
+    )
+
+
 def main(argv: List[str]) -> int:
-    ensure_output_dir()
+    args = parse_args(argv)
+    with profiling(args, "download") as recorder:
+        return run(args, recorder)
+
+
+def run(args: argparse.Namespace, recorder: Recorder = NULL_RECORDER) -> int:
     # Load JSON
     try:
-        with open(JSON_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with recorder.stage("load_json"):
+            with open(args.json, "rb") as f:
+                raw = f.read()
+            data = json.loads(raw.decode("utf-8"))
     except Exception as e:
         print(f"Failed to load JSON: {e}", file=sys.stderr)
         return 1
+    json_sha1 = hashlib.sha1(raw).hexdigest()
+    names = None
+    if args.changes:
+        names = load_change_feed(args.changes, json_sha1, load_synced_export(args.output_dir))
+    return sync_files(data, args, recorder, names=names, export_sha1=json_sha1)
 
-    names_all = extract_filenames_from_json(data)
-    names_unique = unique_preserving_order(names_all)
 
-    # Query in batches of 50
-    batch_size = 50
-    url_map: Dict[str, Optional[str]] = {}
-    for i in range(0, len(names_unique), batch_size):
-        batch = names_unique[i:i+batch_size]
-        partial = query_file_urls(batch)
-        url_map.update(partial)
+def sync_files(
+    data: Dict[str, object],
+    args: argparse.Namespace,
+    recorder: Recorder = NULL_RECORDER,
+    pool: Optional["HTTPAdapter"] = None,
+    names: Optional[List[str]] = None,
+    export_sha1: Optional[str] = None,
+) -> int:
+    """Download every SVG an export structure references; the download command minus
+    reading --json. `pool` backs the threaded workers' Sessions (ignored with --async).
+
+    `names` (from a change feed) limits the sync to those files instead of every
+    file the table references. `export_sha1` is the digest of the export file `data`
+    came from; once every file resolved and downloaded it is recorded as the synced
+    export, which the next change feed has to start from.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    if names is not None and not names:
+        print("SVGs already synced with this export; nothing to check.")
+        return 0
+    with recorder.stage("extract_names", source="changes" if names is not None else "table") as extra:
+        names_all = names if names is not None else extract_filenames_from_json(data)
+        names_unique = unique_preserving_order(names_all)
+        extra.update(references=len(names_all), unique=len(names_unique))
+
+    policy = RetryPolicy(max_attempts=max(1, args.retries), base_delay=args.backoff)
+    engine = "async" if args.use_async else "threaded"
+    with recorder.stage("pipeline", engine=engine) as extra:
+        if args.use_async:
+            try:
+                results, missing, up_to_date = asyncio.run(
+                    run_pipeline_async(
+                        names_unique,
+                        api_url=args.api_url,
+                        output_dir=args.output_dir,
+                        batch_size=max(1, args.batch_size),
+                        concurrency=args.workers,
+                        per_host=args.per_host,
+                        queue_size=args.queue_size,
+                        max_rps=args.max_rps,
+                        policy=policy,
+                        media_base=args.media_base,
+                        recorder=recorder,
+                    )
+                )
+            except RuntimeError as exc:
+                print(str(exc), file=sys.stderr)
+                return 1
+        else:
+            results, missing, up_to_date = run_pipeline(
+                names_unique,
+                api_url=args.api_url,
+                output_dir=args.output_dir,
+                batch_size=max(1, args.batch_size),
+                api_workers=args.api_workers,
+                download_workers=args.workers,
+                queue_size=args.queue_size,
+                max_rps=args.max_rps,
+                per_host=args.per_host,
+                policy=policy,
+                media_base=args.media_base,
+                recorder=recorder,
+                pool=pool,
+            )
+        extra.update(downloaded=len(results), missing=len(missing), up_to_date=len(up_to_date))
 
-    missing = [n for n, u in url_map.items() if not u]
     if missing:
         preview = ", ".join(missing[:5])
         suffix = "..." if len(missing) > 5 else ""
         print(
-            f"Warning: {len(missing)} files had no URL from API (will skip): {preview}{suffix}",
+            f"Warning: {len(missing)} files had no URL from API (skipped): {preview}{suffix}",
             file=sys.stderr,
         )
 
-    # Download in parallel
-    ok = 0
-    fail = 0
-    session = requests.Session()
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as ex:
-        futures = []
-        for name, url in url_map.items():
-            if not url:
-                continue
-            futures.append(ex.submit(download_file, session, name, url))
-        for fut in concurrent.futures.as_completed(futures):
-            name, success, err = fut.result()
-            if success:
-                ok += 1
-            else:
-                fail += 1
-                print(f"Failed: {name}: {err}", file=sys.stderr)
+    ok = sum(1 for _, success, _ in results if success)
+    fail = len(results) - ok
+    if export_sha1 and not fail and not missing:
+        save_synced_export(args.output_dir, export_sha1)
 
-    print(f"Discovered {len(names_unique)} unique SVG references.")
-    print(f"Downloaded {ok} files to {OUTPUT_DIR}.")
+    if names is not None:
+        print(f"Change feed lists {len(names_unique)} SVG(s) in added or changed rows.")
+    else:
+        print(f"Discovered {len(names_unique)} unique SVG references.")
+    print(f"Up to date (sha1 match): {len(up_to_date)}")
+    print(f"Downloaded {ok} files to {args.output_dir}.")
     if missing:
         print(f"Missing (no URL): {len(missing)}")
     if fail:
         print(f"Download errors: {fail}")
 
+    import svg_store
+
+    restored = svg_store.drop_restored_aliases(args.output_dir)
+    if restored:
+        print(f"Stored {len(restored)} former alias(es) under their own names again.")
+
+    if args.optimize:
+        import optimize_svgs
+
+        with recorder.stage("optimize"):
+            report = optimize_svgs.optimize_directory(source_dir=args.output_dir)
+        optimize_svgs.print_report(report)
+
     return 0
 
 
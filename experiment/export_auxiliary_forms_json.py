@@ -39,19 +39,42 @@ Output schema (example):
 }
 """
 
+import argparse
+import copy
+import hashlib
 import json
 import os
 import re
 import sys
-from typing import Dict, List, Optional, Tuple
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
 
-import requests
-import wikitextparser as wtp
+from stage_profile import NULL_RECORDER, Recorder, add_profile_arguments, profiling
+from wiki_common import API_URL, FILE_NAMESPACE_PATTERN
+from wiki_common import HEADERS as BASE_HEADERS
+
+if TYPE_CHECKING:
+    # requests and wikitextparser are imported where used so --help and the
+    # offline paths start without them
+    import requests
+    import wikitextparser as wtp
 
-API_URL = "https://zh.wikibooks.org/w/api.php"
 TITLE = "倉頡輸入法/輔助字形"
 TARGET_TABLE_CAPTION = "輔助字形列表"
 DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), "auxiliary_forms.json")
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".cache", "wikitext")
+DEFAULT_SHARD_DIR = os.path.join(os.path.dirname(__file__), "auxiliary_forms")
+DEFAULT_SVG_DIR = os.path.join(os.path.dirname(__file__), "輔助字形")
+SHARD_INDEX_NAME = "index.json"
+# Letter shards this script writes; only these are pruned from --shard-dir
+SHARD_NAME_RE = re.compile(r"^[A-Z]\.json$")
+DEFAULT_CHANGES = os.path.join(os.path.dirname(__file__), "auxiliary_forms.changes.json")
+CHANGE_FEED_VERSION = 1
+# MediaWiki's titles= limit for clients without apihighlimits
+MAX_TITLES_PER_QUERY = 50
+
+HEADERS = {**BASE_HEADERS, "Accept": "application/json"}
 
 # Canonical Cangjie letter → radical character mapping (Cangjie 5)
 CANGJIE_KEY_TO_CHAR: Dict[str, str] = {
@@ -86,29 +109,31 @@ CANGJIE_KEY_TO_CHAR: Dict[str, str] = {
 # Match file links like [[File:xxx.svg|...]], including common Chinese aliases
 # We will keep the FULL matched wikitext (group 0) to preserve alt text/labels, sizes, etc.
 FILE_LINK_RE = re.compile(
-    r"\[\[\s*(?:File|Image|檔案|文件|圖像|圖片)\s*:\s*([^|\]\n]+?\.(?:svg|SVG))\b[^\]]*\]\]",
+    r"\[\[\s*" + FILE_NAMESPACE_PATTERN + r"\s*:\s*([^|\]\n]+?\.(?:svg|SVG))\b([^\]]*)\]\]",
+    re.IGNORECASE,
+)
+# Link parameters that are sizes rather than labels, e.g. "30px"
+SIZE_PARAM_RE = re.compile(r"\d+\s*px", re.IGNORECASE)
+# MediaWiki language-variant markers: -{...}-
+VARIANT_RE = re.compile(r"-\{\s*(.*?)\s*\}-")
+# Grouping token in cjrm-a0.svg / cjem-a0-1.svg
+GROUP_TOKEN_RE = re.compile(r"-([a-z]\d+)(?:-|\.svg$)", re.IGNORECASE)
+KEY_LABEL_RE = re.compile(r"\s*([A-Z])\s*")
+# shuo_ming rendering; mirrors what auxiliaryView.js used to do in the browser
+REF_BLOCK_RE = re.compile(r"<ref[^>]*>[\s\S]*?</ref>", re.IGNORECASE)
+REF_EMPTY_RE = re.compile(r"<ref[^>]*/>", re.IGNORECASE)
+INLINE_FILE_RE = re.compile(
+    r"\[\[\s*" + FILE_NAMESPACE_PATTERN + r"\s*:\s*([^|\]]+)\s*(?:\|([^\]]*))?\]\]",
     re.IGNORECASE,
 )
+INLINE_SIZE_RE = re.compile(r"([0-9]{1,3})\s*px", re.IGNORECASE)
+SVG_VIEWBOX_RE = re.compile(
+    r"""viewBox\s*=\s*["']\s*([-\d.eE+]+)[\s,]+([-\d.eE+]+)[\s,]+([\d.eE+]+)[\s,]+([\d.eE+]+)""",
+)
+SVG_DIMENSION_RE = re.compile(r"""\b(width|height)\s*=\s*["']\s*([\d.]+)(?:px)?\s*["']""")
 
 
-def fetch_wikitext(title: str) -> str:
-    params = {
-        "action": "query",
-        "format": "json",
-        "titles": title,
-        "prop": "revisions",
-        "rvprop": "content",
-        "rvslots": "main",
-    }
-    headers = {
-        "User-Agent": (
-            "cangjie-learner/0.1 (+https://github.com/; contact: local-script)"
-        ),
-        "Accept": "application/json",
-    }
-    resp = requests.get(API_URL, params=params, headers=headers, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
+def _first_revision(data: Dict[str, object]) -> Dict[str, object]:
     pages = data.get("query", {}).get("pages", {})
     if not pages:
         raise RuntimeError("No pages in API response")
@@ -116,34 +141,314 @@ def fetch_wikitext(title: str) -> str:
     revisions = page.get("revisions")
     if not revisions:
         raise RuntimeError("No revisions found for page")
-    slots = revisions[0].get("slots", {})
-    content = slots.get("main", {}).get("*") or slots.get("main", {}).get("content")
-    if not content:
-        content = revisions[0].get("*")
+    return revisions[0]
+
+
+def _revision_content(revision: Dict[str, object]) -> Optional[str]:
+    slots = revision.get("slots", {})
+    return slots.get("main", {}).get("*") or slots.get("main", {}).get("content") or revision.get("*")
+
+
+def _api_get(
+    api_url: str,
+    params: Dict[str, str],
+    session: Optional["requests.Session"] = None,
+) -> Dict[str, object]:
+    if session is None:
+        import requests
+
+        get = requests.get
+    else:
+        get = session.get
+    resp = get(api_url, params=params, headers=HEADERS, timeout=30)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def fetch_latest_revision_id(
+    title: str,
+    api_url: str = API_URL,
+    session: Optional["requests.Session"] = None,
+) -> Tuple[int, Optional[str]]:
+    """Cheap probe: return (revid, sha1) of the latest revision without its content."""
+    params = {
+        "action": "query",
+        "format": "json",
+        "titles": title,
+        "prop": "revisions",
+        "rvprop": "ids|sha1",
+    }
+    revision = _first_revision(_api_get(api_url, params, session))
+    return int(revision["revid"]), revision.get("sha1")
+
+
+def fetch_revision(
+    title: str,
+    api_url: str = API_URL,
+    session: Optional["requests.Session"] = None,
+) -> Tuple[int, str]:
+    """Return (revid, wikitext) of the latest revision."""
+    params = {
+        "action": "query",
+        "format": "json",
+        "titles": title,
+        "prop": "revisions",
+        "rvprop": "ids|content",
+        "rvslots": "main",
+    }
+    revision = _first_revision(_api_get(api_url, params, session))
+    content = _revision_content(revision)
     if not content:
         raise RuntimeError("Failed to extract wikitext content from response")
-    return content
+    return int(revision.get("revid") or 0), content
 
 
-def find_table_by_caption(parsed: wtp.WikiText, caption_contains: str) -> Optional[wtp.Table]:
+def fetch_revisions(
+    titles: List[str],
+    api_url: str = API_URL,
+    session: Optional["requests.Session"] = None,
+    content: bool = True,
+) -> Dict[str, Dict[str, object]]:
+    """Latest revision of many pages, MAX_TITLES_PER_QUERY titles per request.
+
+    Returns {requested title: {"revid", "sha1", "wikitext"}}, "wikitext" only when
+    content is set. Missing pages are left out. Titles the wiki normalizes (e.g.
+    underscores to spaces) are reported under the title as requested.
+    """
+    rvprop = "ids|sha1|content" if content else "ids|sha1"
+    revisions: Dict[str, Dict[str, object]] = {}
+    unique = list(dict.fromkeys(titles))
+    for i in range(0, len(unique), MAX_TITLES_PER_QUERY):
+        batch = unique[i:i + MAX_TITLES_PER_QUERY]
+        params = {
+            "action": "query",
+            "format": "json",
+            "titles": "|".join(batch),
+            "prop": "revisions",
+            "rvprop": rvprop,
+        }
+        if content:
+            params["rvslots"] = "main"
+        requested = {title: title for title in batch}
+        while True:
+            data = _api_get(api_url, params, session)
+            query = data.get("query", {})
+            for item in query.get("normalized", []):
+                requested[item["to"]] = requested.get(item["from"], item["from"])
+            for page in query.get("pages", {}).values():
+                # Pages whose content did not fit come back without revisions and
+                # are picked up again through "continue"
+                if "missing" in page or not page.get("revisions"):
+                    continue
+                revision = page["revisions"][0]
+                record: Dict[str, object] = {
+                    "revid": int(revision.get("revid") or 0),
+                    "sha1": revision.get("sha1"),
+                }
+                if content:
+                    text = _revision_content(revision)
+                    if not text:
+                        continue
+                    record["wikitext"] = text
+                revisions[requested.get(page["title"], page["title"])] = record
+            if "continue" not in data:
+                break
+            params = {**params, **data["continue"]}
+    return revisions
+
+
+def fetch_wikitext(
+    title: str,
+    api_url: str = API_URL,
+    session: Optional["requests.Session"] = None,
+) -> str:
+    return fetch_revision(title, api_url, session)[1]
+
+
+def sha1_hex(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def cache_path_for(cache_dir: str, title: str) -> str:
+    # Titles contain "/" and CJK; key the file by a digest of the title instead
+    return os.path.join(cache_dir, sha1_hex(title.encode("utf-8")) + ".json")
+
+
+def load_cache(cache_dir: str, title: str) -> Optional[Dict[str, object]]:
+    """Load the cached revision record for title, or None if missing/corrupt.
+
+    Record shape: {"title", "revid", "content_sha1", "output_sha1", "wikitext"}
+    """
+    path = cache_path_for(cache_dir, title)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(record, dict) or not isinstance(record.get("wikitext"), str):
+        return None
+    # Reject records whose wikitext no longer matches the stored hash
+    if record.get("content_sha1") != sha1_hex(record["wikitext"].encode("utf-8")):
+        return None
+    return record
+
+
+def save_cache(cache_dir: str, record: Dict[str, object]) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path_for(cache_dir, str(record["title"]))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def file_sha1(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return sha1_hex(f.read())
+    except OSError:
+        return None
+
+
+def serialize_output(output: Dict[str, Dict[str, object]]) -> bytes:
+    return json.dumps(output, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def load_output(path: str) -> Optional[Dict[str, Dict[str, object]]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_output_if_changed(out_path: str, payload: bytes) -> bool:
+    """Atomically write payload unless the file already holds the same bytes."""
+    if file_sha1(out_path) == sha1_hex(payload):
+        return False
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, out_path)
+    return True
+
+
+def table_caption_text(table: "wtp.Table") -> Optional[str]:
+    caption = getattr(table, "caption", None)
+    if caption is None:
+        return None
+    try:
+        return caption.strip_code().strip() if hasattr(caption, "strip_code") else str(caption).strip()
+    except Exception:
+        return str(caption).strip()
+
+
+def find_table_by_caption(parsed: "wtp.WikiText", caption_contains: str) -> Optional["wtp.Table"]:
     for table in parsed.tables:
-        caption = getattr(table, "caption", None)
-        caption_text = None
-        if caption is not None:
-            try:
-                caption_text = (
-                    caption.strip_code().strip()
-                    if hasattr(caption, "strip_code")
-                    else str(caption).strip()
-                )
-            except Exception:
-                caption_text = str(caption).strip()
-        haystack = (caption_text or table.string or "")
+        haystack = (table_caption_text(table) or table.string or "")
         if caption_contains in haystack:
             return table
     return None
 
 
+def find_table_span(wikitext: str, caption_contains: str) -> Optional[Tuple[int, int]]:
+    """Locate the raw {| ... |} block whose |+ caption line contains caption_contains.
+
+    A line-based nesting scanner: cheap compared to parsing the whole page, and only
+    needs to be right often enough to be a fast path (callers fall back to a full parse).
+    Returns (start, end) offsets into wikitext, end exclusive.
+    """
+    # Each open table: [start offset, caption matched]
+    stack: List[List[object]] = []
+    pos = 0
+    for line in wikitext.splitlines(keepends=True):
+        stripped = line.lstrip()
+        if stripped.startswith("{|"):
+            stack.append([pos + (len(line) - len(stripped)), False])
+        elif stripped.startswith("|+") and stack:
+            if caption_contains in stripped:
+                stack[-1][1] = True
+        elif stripped.startswith("|}") and stack:
+            start, matched = stack.pop()
+            if matched:
+                end = pos + (len(line) - len(stripped)) + 2
+                return int(start), end
+        pos += len(line)
+    return None
+
+
+def extract_table(
+    wikitext: str,
+    caption_contains: str,
+    recorder: Recorder = NULL_RECORDER,
+) -> Optional["wtp.Table"]:
+    """Parse only the target table's slice when it can be found, else the whole page."""
+    import wikitextparser as wtp
+
+    with recorder.stage("table_slice", page_chars=len(wikitext)) as extra:
+        span = find_table_span(wikitext, caption_contains)
+        extra["found"] = span is not None
+    if span is not None:
+        with recorder.stage("parse", scope="slice", chars=span[1] - span[0]):
+            table = find_table_by_caption(wtp.parse(wikitext[span[0]:span[1]]), caption_contains)
+        if table is not None:
+            return table
+    with recorder.stage("parse", scope="page", chars=len(wikitext)):
+        return find_table_by_caption(wtp.parse(wikitext), caption_contains)
+
+
+def _measure(fn: Callable[[], object], repeat: int) -> Tuple[float, int, object]:
+    """Return (best wall time in seconds, peak traced bytes, last result)."""
+    best = float("inf")
+    result: object = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def compare_parse_paths(wikitext: str, repeat: int = 5) -> Dict[str, float]:
+    """Time and memory of full-page parsing versus the sliced fast path."""
+    import wikitextparser as wtp
+
+    def full() -> List[List[str]]:
+        table = find_table_by_caption(wtp.parse(wikitext), TARGET_TABLE_CAPTION)
+        if table is None:
+            raise LookupError("target table not found by full parse")
+        return table.data(span=True)
+
+    def sliced() -> List[List[str]]:
+        span = find_table_span(wikitext, TARGET_TABLE_CAPTION)
+        if span is None:
+            raise LookupError("target table not found by span scanner")
+        table = find_table_by_caption(
+            wtp.parse(wikitext[span[0]:span[1]]), TARGET_TABLE_CAPTION
+        )
+        if table is None:
+            raise LookupError("target table not found in slice")
+        return table.data(span=True)
+
+    full_time, full_peak, full_mat = _measure(full, repeat)
+    slice_time, slice_peak, slice_mat = _measure(sliced, repeat)
+    if full_mat != slice_mat:
+        raise AssertionError("sliced table data differs from the full parse")
+    return {
+        "page_chars": len(wikitext),
+        "full_seconds": full_time,
+        "slice_seconds": slice_time,
+        "speedup": full_time / slice_time if slice_time else float("inf"),
+        "full_peak_bytes": full_peak,
+        "slice_peak_bytes": slice_peak,
+    }
+
+
 def normalize_header(text: str) -> str:
     return re.sub(r"\s+", "", text or "").strip()
 
@@ -162,6 +467,17 @@ def extract_image_links(cell_wikitext: str) -> List[str]:
     return results
 
 
+def _label_from_params(params_text: str) -> Optional[str]:
+    # params_text is everything after the filename, e.g. "|30px|明"; the last
+    # non-empty parameter that is neither a size nor key=value is the label
+    params = params_text.split("|")
+    for p in reversed(params[1:]):
+        p = p.strip()
+        if p and "=" not in p and not SIZE_PARAM_RE.fullmatch(p):
+            return p
+    return None
+
+
 def _extract_label_from_file_link(full_wikitext: str) -> Optional[str]:
     # Extract the last non-empty, non-dimension parameter as label
     try:
@@ -172,17 +488,8 @@ def _extract_label_from_file_link(full_wikitext: str) -> Optional[str]:
         after_colon = inner.split(":", 1)[-1]
     except Exception:
         after_colon = inner
-    parts = [p.strip() for p in after_colon.split("|")]
-    # Skip filename (parts[0]); evaluate remaining params
-    params = [p for p in parts[1:] if p]
-    candidates: List[str] = []
-    for p in params:
-        if re.match(r"^\d+\s*px$", p, re.IGNORECASE):
-            continue
-        if "=" in p:
-            continue
-        candidates.append(p)
-    return candidates[-1] if candidates else None
+    pipe = after_colon.find("|")
+    return _label_from_params(after_colon[pipe:]) if pipe >= 0 else None
 
 
 def sanitize_label(label: Optional[str]) -> str:
@@ -191,45 +498,48 @@ def sanitize_label(label: Optional[str]) -> str:
         return ""
     text = str(label)
     # Replace all occurrences of -{ ... }- with inner content
-    text = re.sub(r"-\{\s*(.*?)\s*\}-", r"\1", text)
+    if "-{" in text:
+        text = VARIANT_RE.sub(r"\1", text)
     return text.strip()
 
 
-def extract_files_with_labels(cell_wikitext: str) -> List[Tuple[str, Optional[str]]]:
-    """Return list of (filename, optional_label) from a cell's wikitext."""
+def _extract_group_token(filename: str) -> Optional[str]:
+    """Extract grouping token like 'a0' from filenames such as 'cjrm-a0.svg' or 'cjem-a0-1.svg'."""
+    m = GROUP_TOKEN_RE.search(filename)
+    return m.group(1).lower() if m else None
+
+
+def iter_file_tokens(cell_wikitext: str) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """Yield (filename, label, group_token) for each distinct SVG link in one scan of a cell.
+
+    Links are deduplicated case-insensitively by filename, keeping the first.
+    """
     if not cell_wikitext:
-        return []
+        return
     seen: set = set()
-    results: List[Tuple[str, Optional[str]]] = []
     for m in FILE_LINK_RE.finditer(cell_wikitext):
-        full = m.group(0)
-        filename = (m.group(1) or "").strip()
+        filename = m.group(1).strip()
         if not filename:
             continue
         key = filename.lower()
         if key in seen:
             continue
         seen.add(key)
-        label = sanitize_label(_extract_label_from_file_link(full))
-        results.append((filename, label))
-    return results
+        yield filename, sanitize_label(_label_from_params(m.group(2))), _extract_group_token(filename)
 
 
-def _extract_group_token(filename: str) -> Optional[str]:
-    """Extract grouping token like 'a0' from filenames such as 'cjrm-a0.svg' or 'cjem-a0-1.svg'."""
-    m = re.search(r"-([a-z]\d+)(?:-|\.svg$)", filename, re.IGNORECASE)
-    return m.group(1).lower() if m else None
-
+def extract_files_with_labels(cell_wikitext: str) -> List[Tuple[str, Optional[str]]]:
+    """Return list of (filename, optional_label) from a cell's wikitext."""
+    return [(filename, label) for filename, label, _ in iter_file_tokens(cell_wikitext)]
 
-def group_zili_by_fuzhu(fuzhu_files: List[str], zili_items: List[Tuple[str, Optional[str]]]) -> List[Dict[str, object]]:
-    """Group zili items by matching token with each fuzhu file, preserving order.
 
-    Returns list like [{"file": fuzhu_file, "zili": [{"file": z_file, "label": label}, ...]}, ...]
-    """
-    # Build token -> list of zili dicts
+def group_tokens_by_fuzhu(
+    fuzhu_tokens: List[Tuple[str, str, Optional[str]]],
+    zili_tokens: List[Tuple[str, str, Optional[str]]],
+) -> List[Dict[str, object]]:
+    """group_zili_by_fuzhu over pre-tokenized (filename, label, group_token) items."""
     token_to_zili: Dict[str, List[Dict[str, str]]] = {}
-    for z_file, z_label in zili_items:
-        token = _extract_group_token(z_file)
+    for z_file, z_label, token in zili_tokens:
         if not token:
             continue
         token_to_zili.setdefault(token, []).append({
@@ -237,15 +547,21 @@ def group_zili_by_fuzhu(fuzhu_files: List[str], zili_items: List[Tuple[str, Opti
             "label": (z_label or ""),
         })
 
-    grouped: List[Dict[str, object]] = []
-    for f_file in fuzhu_files:
-        token = _extract_group_token(f_file)
-        z_list = token_to_zili.get(token or "", [])
-        grouped.append({
-            "file": f_file,
-            "zili": z_list,
-        })
-    return grouped
+    return [
+        {"file": f_file, "zili": token_to_zili.get(token or "", [])}
+        for f_file, _, token in fuzhu_tokens
+    ]
+
+
+def group_zili_by_fuzhu(fuzhu_files: List[str], zili_items: List[Tuple[str, Optional[str]]]) -> List[Dict[str, object]]:
+    """Group zili items by matching token with each fuzhu file, preserving order.
+
+    Returns list like [{"file": fuzhu_file, "zili": [{"file": z_file, "label": label}, ...]}, ...]
+    """
+    return group_tokens_by_fuzhu(
+        [(f, "", _extract_group_token(f)) for f in fuzhu_files],
+        [(z, label or "", _extract_group_token(z)) for z, label in zili_items],
+    )
 
 
 def locate_columns(header_row: List[str]) -> Tuple[int, Optional[int], Optional[int], Optional[int]]:
@@ -287,7 +603,7 @@ def build_output_structure(mat: List[List[str]]) -> Dict[str, Dict[str, object]]
         label = label_raw or prev_label
         # Keep only single Latin letter A-Z for keys
         if label:
-            m = re.match(r"\s*([A-Z])\s*", label)
+            m = KEY_LABEL_RE.match(label)
             label = m.group(1) if m else label
 
         # Determine if row has any content outside the label column
@@ -298,23 +614,20 @@ def build_output_structure(mat: List[List[str]]) -> Dict[str, Dict[str, object]]
             prev_label = label
             continue
 
-        f_files_with_labels: List[Tuple[str, Optional[str]]] = (
-            extract_files_with_labels(row[aux_idx])
+        fuzhu_tokens = (
+            list(iter_file_tokens(row[aux_idx]))
             if aux_idx is not None and aux_idx < len(row)
             else []
         )
-        # Only filenames for fuzhu list
-        fuzhu_files: List[str] = [fname for fname, _ in f_files_with_labels]
-
-        zili_with_labels: List[Tuple[str, Optional[str]]] = (
-            extract_files_with_labels(row[zili_idx])
+        zili_tokens = (
+            list(iter_file_tokens(row[zili_idx]))
             if zili_idx is not None and zili_idx < len(row)
             else []
         )
         shuo_ming: str = (row[shuo_idx] if shuo_idx is not None and shuo_idx < len(row) else "").strip()
 
         # Build grouped structure
-        grouped = group_zili_by_fuzhu(fuzhu_files, zili_with_labels)
+        grouped = group_tokens_by_fuzhu(fuzhu_tokens, zili_tokens)
 
         # Initialize bucket for this key
         key = label
@@ -344,38 +657,535 @@ def build_output_structure(mat: List[List[str]]) -> Dict[str, Dict[str, object]]
     return ordered
 
 
-def main(argv: List[str]) -> int:
-    out_path = argv[1] if len(argv) > 1 else DEFAULT_OUTPUT
-
+def read_svg_size(path: str) -> Optional[Tuple[float, float]]:
+    """Intrinsic (width, height) of an SVG from its viewBox, else its width/height attributes."""
     try:
-        wikitext = fetch_wikitext(TITLE)
-    except Exception as exc:
-        print(f"Error fetching wikitext: {exc}", file=sys.stderr)
-        return 1
+        with open(path, "rb") as f:
+            head = f.read(4096).decode("utf-8", errors="replace")
+    except OSError:
+        return None
+    m = SVG_VIEWBOX_RE.search(head)
+    if m:
+        width, height = float(m.group(3)), float(m.group(4))
+    else:
+        dims = {k: float(v) for k, v in SVG_DIMENSION_RE.findall(head)}
+        if "width" not in dims or "height" not in dims:
+            return None
+        width, height = dims["width"], dims["height"]
+    if width <= 0 or height <= 0:
+        return None
+    return width, height
+
+
+def render_shuo_ming(
+    wikitext: str,
+    svg_sizes: Dict[str, List[float]],
+) -> List[object]:
+    """Pre-tokenize shuo_ming into text runs and image references.
+
+    Strings are plain text runs (rendered as text, never HTML). Images are
+    {"file", "height"?, "width"?} with pixel sizes from the NNpx parameter and the
+    SVG's aspect ratio when known.
+    """
+    text = REF_EMPTY_RE.sub("", REF_BLOCK_RE.sub("", wikitext or ""))
+    runs: List[object] = []
+    last = 0
+    for m in INLINE_FILE_RE.finditer(text):
+        if m.start() > last:
+            runs.append(text[last:m.start()])
+        filename = m.group(1).strip()
+        image: Dict[str, object] = {"file": filename}
+        size = INLINE_SIZE_RE.search(m.group(2) or "")
+        if size:
+            height = int(size.group(1))
+            image["height"] = height
+            intrinsic = svg_sizes.get(filename)
+            if intrinsic:
+                image["width"] = round(height * intrinsic[0] / intrinsic[1], 2)
+        runs.append(image)
+        last = m.end()
+    if last < len(text):
+        runs.append(text[last:])
+    return runs
+
+
+def _letter_files(bucket: Dict[str, object]) -> List[str]:
+    files: List[str] = []
+    for row in bucket.get("rows") or []:
+        for group in row.get("fuzhu_zixing") or []:
+            files.append(group["file"])
+            files.extend(z["file"] for z in group.get("zili") or [])
+        for m in INLINE_FILE_RE.finditer(row.get("shuo_ming") or ""):
+            files.append(m.group(1).strip())
+    return files
+
+
+def enrich_output(
+    output: Dict[str, Dict[str, object]],
+    svg_dir: str = DEFAULT_SVG_DIR,
+) -> Dict[str, Dict[str, object]]:
+    """Add per-letter "svg_sizes" ({file: [w, h]}) and per-row "shuo_ming_runs".
+
+    Sizes come from SVGs already present in svg_dir (through the svg_store.py alias
+    map for collapsed duplicates); files not downloaded yet are simply left out. Safe
+    to run again on enriched output.
+    """
+    from svg_store import load_aliases
+
+    aliases = load_aliases(svg_dir)
+    size_cache: Dict[str, Optional[Tuple[float, float]]] = {}
+    for bucket in output.values():
+        sizes: Dict[str, List[float]] = {}
+        for name in _letter_files(bucket):
+            if name not in size_cache:
+                size_cache[name] = read_svg_size(os.path.join(svg_dir, aliases.get(name, name)))
+            if size_cache[name] is not None:
+                sizes[name] = list(size_cache[name])
+        bucket["svg_sizes"] = sizes
+        for row in bucket.get("rows") or []:
+            row["shuo_ming_runs"] = render_shuo_ming(row.get("shuo_ming") or "", sizes)
+    return output
+
+
+def build_questions(rows: List[Dict[str, object]]) -> List[List[int]]:
+    """Flatten every askable zili into [row_index, fuzhu_index, zili_index] tuples."""
+    questions: List[List[int]] = []
+    for row_index, row in enumerate(rows):
+        for fuzhu_index, group in enumerate(row.get("fuzhu_zixing") or []):
+            for zili_index in range(len(group.get("zili") or [])):
+                questions.append([row_index, fuzhu_index, zili_index])
+    return questions
+
 
-    parsed = wtp.parse(wikitext)
-    table = find_table_by_caption(parsed, TARGET_TABLE_CAPTION)
+def build_shards(
+    output: Dict[str, Dict[str, object]],
+    svg_dir: str = DEFAULT_SVG_DIR,
+) -> Dict[str, Dict[str, object]]:
+    """Split output into per-letter shards plus an index; returns filename -> JSON value.
+
+    index.json: {"letters": {"A": {"cangjie_char", "file", "rows", "zili"}, ...}}
+    A.json: {"cangjie_char", "rows", "questions", "svg_sizes"}; rows carry
+    "shuo_ming_runs" (see enrich_output) so the page does no wikitext parsing.
+    """
+    output = enrich_output(copy.deepcopy(output), svg_dir)
+    files: Dict[str, Dict[str, object]] = {}
+    letters: Dict[str, Dict[str, object]] = {}
+    for letter, bucket in output.items():
+        rows = bucket.get("rows") or []
+        questions = build_questions(rows)
+        shard_name = f"{letter}.json"
+        files[shard_name] = {
+            "cangjie_char": bucket.get("cangjie_char"),
+            "rows": rows,
+            "questions": questions,
+            "svg_sizes": bucket.get("svg_sizes") or {},
+        }
+        letters[letter] = {
+            "cangjie_char": bucket.get("cangjie_char"),
+            "file": shard_name,
+            "rows": len(rows),
+            "zili": len(questions),
+        }
+    files[SHARD_INDEX_NAME] = {"letters": letters}
+    return files
+
+
+def write_shards(
+    output: Dict[str, Dict[str, object]],
+    shard_dir: str,
+    svg_dir: str = DEFAULT_SVG_DIR,
+) -> int:
+    """Write minified shards, removing stale letter files (and nothing else in
+    shard_dir); returns files rewritten."""
+    os.makedirs(shard_dir, exist_ok=True)
+    files = build_shards(output, svg_dir)
+    written = 0
+    for name, value in files.items():
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if write_output_if_changed(os.path.join(shard_dir, name), payload):
+            written += 1
+    for name in os.listdir(shard_dir):
+        if SHARD_NAME_RE.match(name) and name not in files:
+            os.remove(os.path.join(shard_dir, name))
+    return written
+
+
+def row_keys(rows: List[Dict[str, object]]) -> List[str]:
+    """Stable identity for each row: its fuzhu files joined by "+" ("#<index>" if none).
+
+    Fuzhu file names (cjrm-a0.svg, ...) survive edits to a row's zili and text, so a
+    row keeps its key when only its content changes. Repeated keys get a "#n" suffix.
+    """
+    keys: List[str] = []
+    seen: Dict[str, int] = {}
+    for index, row in enumerate(rows):
+        key = "+".join(g.get("file") or "" for g in row.get("fuzhu_zixing") or []) or f"#{index}"
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        keys.append(key if n == 0 else f"{key}#{n}")
+    return keys
+
+
+def _diff_row(old: Dict[str, object], new: Dict[str, object]) -> Dict[str, object]:
+    """Group and zili changes between two versions of one row; {} when identical."""
+    change: Dict[str, object] = {}
+    old_groups = {g["file"]: g for g in old.get("fuzhu_zixing") or []}
+    new_groups = {g["file"]: g for g in new.get("fuzhu_zixing") or []}
+    added = [f for f in new_groups if f not in old_groups]
+    removed = [f for f in old_groups if f not in new_groups]
+    zili_added: List[str] = []
+    zili_removed: List[str] = []
+    relabeled: List[str] = []
+    for name, group in new_groups.items():
+        old_zili = {z["file"]: z.get("label") for z in (old_groups.get(name) or {}).get("zili") or []}
+        new_zili = {z["file"]: z.get("label") for z in group.get("zili") or []}
+        zili_added += [f for f in new_zili if f not in old_zili]
+        zili_removed += [f for f in old_zili if f not in new_zili]
+        relabeled += [f for f, label in new_zili.items() if f in old_zili and old_zili[f] != label]
+    for field, files in (
+        ("groups_added", added),
+        ("groups_removed", removed),
+        ("zili_added", zili_added),
+        ("zili_removed", zili_removed),
+        ("zili_relabeled", relabeled),
+    ):
+        if files:
+            change[field] = files
+    if (old.get("shuo_ming") or "") != (new.get("shuo_ming") or ""):
+        change["shuo_ming"] = True
+    if not change and old != new:
+        change["reordered"] = True
+    return change
+
+
+def diff_outputs(
+    old: Optional[Dict[str, Dict[str, object]]],
+    new: Dict[str, Dict[str, object]],
+) -> Dict[str, object]:
+    """Structural diff between two exports, as a compact change record.
+
+    {"letters": {"A": {"rows_added": [key], "rows_removed": [key],
+                       "rows_changed": {key: {"groups_added": [...], "zili_added": [...],
+                                              "shuo_ming": true, ...}}}},
+     "files": [...], "dropped_files": [...]}
+    Only non-empty fields are kept; keys come from row_keys. "files" lists every SVG
+    referenced by an added or changed row (what a downloader must look at) and
+    "dropped_files" the ones no longer referenced anywhere. With no previous export
+    every letter counts as added.
+    """
+    old = old or {}
+    letters: Dict[str, Dict[str, object]] = {}
+    touched: List[str] = []
+    for letter in list(new) + [k for k in old if k not in new]:
+        old_rows = (old.get(letter) or {}).get("rows") or []
+        new_rows = (new.get(letter) or {}).get("rows") or []
+        old_by_key = dict(zip(row_keys(old_rows), old_rows))
+        new_by_key = dict(zip(row_keys(new_rows), new_rows))
+        entry: Dict[str, object] = {}
+        added = [k for k in new_by_key if k not in old_by_key]
+        removed = [k for k in old_by_key if k not in new_by_key]
+        changed: Dict[str, Dict[str, object]] = {}
+        for key in new_by_key:
+            if key in old_by_key:
+                change = _diff_row(old_by_key[key], new_by_key[key])
+                if change:
+                    changed[key] = change
+        if added:
+            entry["rows_added"] = added
+        if removed:
+            entry["rows_removed"] = removed
+        if changed:
+            entry["rows_changed"] = changed
+        if (old.get(letter) or {}).get("cangjie_char") != (new.get(letter) or {}).get("cangjie_char"):
+            entry["cangjie_char"] = (new.get(letter) or {}).get("cangjie_char")
+        if entry:
+            letters[letter] = entry
+        touched += _letter_files({"rows": [new_by_key[k] for k in added + list(changed)]})
+
+    still_used = {name for bucket in new.values() for name in _letter_files(bucket)}
+    dropped = {name for bucket in old.values() for name in _letter_files(bucket)} - still_used
+    return {
+        "letters": letters,
+        "files": list(dict.fromkeys(touched)),
+        "dropped_files": sorted(dropped),
+    }
+
+
+def write_change_feed(
+    path: str,
+    old: Optional[Dict[str, Dict[str, object]]],
+    new: Dict[str, Dict[str, object]],
+    from_sha1: Optional[str],
+    to_sha1: str,
+) -> Dict[str, object]:
+    """Write the diff between two exports to path; returns the record.
+
+    "from"/"to" are the sha1 of the export files the diff goes between, so a reader can
+    check the feed still describes the export it is looking at.
+    """
+    feed = {
+        "version": CHANGE_FEED_VERSION,
+        "from": from_sha1,
+        "to": to_sha1,
+        **diff_outputs(old, new),
+    }
+    payload = json.dumps(feed, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    write_output_if_changed(path, payload)
+    return feed
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    return parser.parse_args(argv[1:])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("output", nargs="?", default=DEFAULT_OUTPUT, help="output JSON path")
+    parser.add_argument(
+        "--api-url",
+        default=API_URL,
+        help="MediaWiki api.php endpoint (e.g. a wiki_cassette.py server)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="directory holding the revision-keyed wikitext cache",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="rebuild from the cached wikitext without touching the network",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="re-parse and rewrite even if the page revision is unchanged",
+    )
+    parser.add_argument(
+        "--dump",
+        metavar="PATH",
+        help="read the page from a pages-articles XML dump (.xml, .bz2, .gz) instead of the API",
+    )
+    parser.add_argument(
+        "--shard-dir",
+        nargs="?",
+        const=DEFAULT_SHARD_DIR,
+        default=None,
+        help=(
+            "also write minified per-letter shards and an index for lazy loading "
+            f"(default dir: {DEFAULT_SHARD_DIR})"
+        ),
+    )
+    parser.add_argument(
+        "--from-json",
+        metavar="PATH",
+        help="skip the wiki and regenerate derived outputs (e.g. shards) from an existing export",
+    )
+    parser.add_argument(
+        "--svg-dir",
+        default=DEFAULT_SVG_DIR,
+        help="downloaded SVGs used to record intrinsic image sizes in shards",
+    )
+    parser.add_argument(
+        "--changes",
+        default=DEFAULT_CHANGES,
+        help="where to write the diff against the previous export when the output changes",
+    )
+    parser.add_argument(
+        "--compare-parse",
+        action="store_true",
+        help="time full-page vs sliced table parsing on the cached (or fetched) page and exit",
+    )
+    add_profile_arguments(parser)
+
+
+def build_from_wikitext(
+    wikitext: str,
+    recorder: Recorder = NULL_RECORDER,
+    caption: str = TARGET_TABLE_CAPTION,
+) -> Dict[str, Dict[str, object]]:
+    table = extract_table(wikitext, caption, recorder)
     if table is None:
-        print(
-            f"Could not find table with caption containing '{TARGET_TABLE_CAPTION}'.",
-            file=sys.stderr,
+        raise LookupError(
+            f"Could not find table with caption containing '{caption}'."
         )
-        return 2
-
     # Use span=True per COUNTING_NOTES to expand rowspans
-    mat = table.data(span=True)
+    with recorder.stage("table_data") as extra:
+        mat = table.data(span=True)
+        extra["rows"] = len(mat)
+    with recorder.stage("build") as extra:
+        output = build_output_structure(mat)
+        extra["letters"] = len(output)
+    return output
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    with profiling(args, "export") as recorder:
+        return run(args, recorder)
+
+
+def run(args: argparse.Namespace, recorder: Recorder = NULL_RECORDER) -> int:
+    return export_page(args, recorder)[0]
+
+
+def export_page(
+    args: argparse.Namespace,
+    recorder: Recorder = NULL_RECORDER,
+    session: Optional["requests.Session"] = None,
+) -> Tuple[int, Optional[Dict[str, Dict[str, object]]]]:
+    """Run the export command; returns (exit code, export structure).
+
+    The structure is what the output file now holds (read back from it when nothing
+    needed rebuilding), or None on errors and --compare-parse, so a caller like
+    `cli.py sync` can hand it straight to the downloader.
+    """
+    out_path = args.output
+    cached = load_cache(args.cache_dir, TITLE)
+
+    if args.compare_parse:
+        try:
+            wikitext = str(cached["wikitext"]) if cached is not None else fetch_wikitext(TITLE, args.api_url, session)
+            report = compare_parse_paths(wikitext)
+        except Exception as exc:
+            print(f"Parse comparison failed: {exc}", file=sys.stderr)
+            return 1, None
+        print(json.dumps(report, indent=2))
+        return 0, None
+
+    if args.from_json:
+        try:
+            with open(args.from_json, "r", encoding="utf-8") as f:
+                output = json.load(f)
+        except (OSError, ValueError) as exc:
+            print(f"Failed to load {args.from_json}: {exc}", file=sys.stderr)
+            return 1, None
+        if args.shard_dir:
+            written = write_shards(output, args.shard_dir, args.svg_dir)
+            print(f"Wrote {written} shard file(s) to {args.shard_dir}")
+        return 0, output
+
+    shards_ready = not args.shard_dir or os.path.exists(
+        os.path.join(args.shard_dir, SHARD_INDEX_NAME)
+    )
+
+    if args.dump:
+        from wiki_dump import find_pages
+
+        try:
+            with recorder.stage("fetch", kind="dump") as extra:
+                page = find_pages(args.dump, [TITLE]).get(TITLE)
+                extra["chars"] = len(str(page["wikitext"])) if page else 0
+        except Exception as exc:
+            print(f"Error reading dump {args.dump}: {exc}", file=sys.stderr)
+            return 1, None
+        if page is None:
+            print(f"No page {TITLE} in {args.dump}", file=sys.stderr)
+            return 1, None
+        revid = int(page["revid"] or 0)
+        wikitext = str(page["wikitext"])
+        if (
+            cached is not None
+            and not args.force
+            and sha1_hex(wikitext.encode("utf-8")) == cached.get("content_sha1")
+            and file_sha1(out_path) == cached.get("output_sha1")
+            and shards_ready
+        ):
+            print(f"Content unchanged at revision {revid}; nothing to do.")
+            return 0, load_output(out_path)
+    elif args.offline:
+        if cached is None:
+            print(f"No cached wikitext for {TITLE} in {args.cache_dir}", file=sys.stderr)
+            return 1, None
+        revid = int(cached.get("revid") or 0)
+        wikitext = str(cached["wikitext"])
+    else:
+        latest_revid: Optional[int] = None
+        if cached is not None and not args.force:
+            try:
+                with recorder.stage("fetch", kind="probe"):
+                    latest_revid, _ = fetch_latest_revision_id(TITLE, args.api_url, session)
+            except Exception as exc:
+                print(f"Error probing revision: {exc}", file=sys.stderr)
+                return 1, None
+            if (
+                latest_revid == cached.get("revid")
+                and file_sha1(out_path) == cached.get("output_sha1")
+                and shards_ready
+            ):
+                print(f"Up to date (revision {latest_revid}); nothing to do.")
+                return 0, load_output(out_path)
+        if cached is not None and latest_revid is not None and latest_revid == cached.get("revid"):
+            # Same revision but the output was modified or removed: rebuild from cache
+            revid = latest_revid
+            wikitext = str(cached["wikitext"])
+        else:
+            try:
+                with recorder.stage("fetch", kind="content") as extra:
+                    revid, wikitext = fetch_revision(TITLE, args.api_url, session)
+                    extra["chars"] = len(wikitext)
+            except Exception as exc:
+                print(f"Error fetching wikitext: {exc}", file=sys.stderr)
+                return 1, None
+            if (
+                cached is not None
+                and not args.force
+                and sha1_hex(wikitext.encode("utf-8")) == cached.get("content_sha1")
+                and file_sha1(out_path) == cached.get("output_sha1")
+                and shards_ready
+            ):
+                # New revision id but identical text (e.g. a null edit or revert)
+                cached["revid"] = revid
+                save_cache(args.cache_dir, cached)
+                print(f"Content unchanged at revision {revid}; nothing to do.")
+                return 0, load_output(out_path)
 
     try:
-        output = build_output_structure(mat)
+        output = build_from_wikitext(wikitext, recorder)
+    except LookupError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2, None
     except Exception as exc:
         print(f"Error building output: {exc}", file=sys.stderr)
-        return 3
+        return 3, None
 
     # Write JSON with Unicode preserved
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    with recorder.stage("write", target="json") as extra:
+        payload = serialize_output(output)
+        previous_sha1 = file_sha1(out_path)
+        previous = load_output(out_path) if args.changes and previous_sha1 != sha1_hex(payload) else None
+        changed = write_output_if_changed(out_path, payload)
+        extra.update(bytes=len(payload), changed=changed)
+    if changed:
+        print(f"Wrote JSON to {out_path}")
+        if args.changes:
+            with recorder.stage("write", target="changes") as extra:
+                feed = write_change_feed(args.changes, previous, output, previous_sha1, sha1_hex(payload))
+                extra["files"] = len(feed["files"])
+            print(
+                f"Wrote change feed to {args.changes}: {len(feed['letters'])} letter(s) changed, "
+                f"{len(feed['files'])} file(s) to check, {len(feed['dropped_files'])} dropped"
+            )
+    else:
+        print(f"Output already current: {out_path}")
+    if args.shard_dir:
+        with recorder.stage("write", target="shards") as extra:
+            written = write_shards(output, args.shard_dir, args.svg_dir)
+            extra["files"] = written
+        print(f"Wrote {written} shard file(s) to {args.shard_dir}")
+
+    save_cache(
+        args.cache_dir,
+        {
+            "title": TITLE,
+            "revid": revid,
+            "content_sha1": sha1_hex(wikitext.encode("utf-8")),
+            "output_sha1": sha1_hex(payload),
+            "wikitext": wikitext,
+        },
+    )
 
-    print(f"Wrote JSON to {out_path}")
     # Also print a small sample for sanity
     sample_key = next(iter(output)) if output else None
     if sample_key:
@@ -393,7 +1203,7 @@ def main(argv: List[str]) -> int:
             )
         )
 
-    return 0
+    return 0, output
 
 
 if __name__ == "__main__":
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = [
+#   "requests",
+#   "wikitextparser",
+# ]
+# ///
+"""
+Export tables from several Cangjie wiki pages in one run, one JSON output per job.
+
+A job is (title, caption, schema, output). Titles go to the API MAX_TITLES_PER_QUERY
+(50) at a time: one ids|sha1 probe covers every cached page, and one content request
+per 50 pages covers the ones that changed, so a full refresh is a handful of requests
+instead of one per page. Wikitext is cached by revision in the same cache as
+export_auxiliary_forms_json.py, and a job whose page revision and output file are
+both unchanged is skipped. Jobs are parsed in a process pool.
+
+Schemas:
+  auxiliary_forms  the 輔助字形 structure export_auxiliary_forms_json.py writes
+  tables           {"title", "revid", "tables": [{"caption", "header", "rows", "files"}]};
+                   rows keep each cell's raw wikitext, files lists the SVGs linked
+                   from the table. An empty caption takes every table on the page.
+
+Jobs come from --jobs (a JSON list of {"title", "caption"?, "schema"?, "output"?};
+schema defaults to "tables", output to <pages dir>/<title with / as _>.json) and
+--page TITLE[#CAPTION]. Without either, the 輔助字形 table is exported to
+auxiliary_forms.json as by export_auxiliary_forms_json.py.
+
+--dump PATH reads every page from a local pages-articles XML dump instead (one
+streaming pass, see wiki_dump.py); the cache is updated as if they had been fetched.
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from export_auxiliary_forms_json import (
+    DEFAULT_CACHE_DIR,
+    DEFAULT_OUTPUT,
+    TARGET_TABLE_CAPTION,
+    TITLE,
+    build_from_wikitext,
+    extract_table,
+    fetch_revisions,
+    file_sha1,
+    iter_file_tokens,
+    load_cache,
+    save_cache,
+    serialize_output,
+    sha1_hex,
+    table_caption_text,
+    write_output_if_changed,
+)
+from stage_profile import NULL_RECORDER, Recorder, add_profile_arguments, profiling
+from wiki_common import API_URL
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_PAGES_DIR = os.path.join(os.path.dirname(__file__), "pages")
+STATE_NAME = "pages_state.json"
+SCHEMAS = ("auxiliary_forms", "tables")
+
+Job = Dict[str, str]
+
+
+def default_jobs() -> List[Job]:
+    return [{
+        "title": TITLE,
+        "caption": TARGET_TABLE_CAPTION,
+        "schema": "auxiliary_forms",
+        "output": DEFAULT_OUTPUT,
+    }]
+
+
+def make_job(title: str, caption: str = "", schema: str = "tables", output: Optional[str] = None,
+             pages_dir: str = DEFAULT_PAGES_DIR) -> Job:
+    if schema not in SCHEMAS:
+        raise ValueError(f"Unknown schema {schema!r} for {title} (expected one of {', '.join(SCHEMAS)})")
+    if not output:
+        output = os.path.join(pages_dir, title.replace("/", "_") + ".json")
+    return {"title": title, "caption": caption, "schema": schema, "output": output}
+
+
+def load_jobs(path: str, pages_dir: str = DEFAULT_PAGES_DIR) -> List[Job]:
+    """Jobs from a JSON list; relative output paths are taken relative to the file."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: expected a list of jobs")
+    base = os.path.dirname(os.path.abspath(path))
+    jobs: List[Job] = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("title"):
+            raise ValueError(f"{path}: every job needs a title")
+        output = entry.get("output")
+        if output and not os.path.isabs(output):
+            output = os.path.join(base, output)
+        jobs.append(make_job(
+            entry["title"], entry.get("caption") or "", entry.get("schema") or "tables", output, pages_dir
+        ))
+    return jobs
+
+
+def build_tables(wikitext: str, caption: str) -> List[Dict[str, object]]:
+    import wikitextparser as wtp
+
+    if caption:
+        table = extract_table(wikitext, caption)
+        candidates = [table] if table is not None else []
+    else:
+        candidates = wtp.parse(wikitext).tables
+    tables: List[Dict[str, object]] = []
+    for table in candidates:
+        mat = table.data(span=True)
+        files = list(dict.fromkeys(
+            filename for row in mat for cell in row for filename, _, _ in iter_file_tokens(cell or "")
+        ))
+        tables.append({
+            "caption": table_caption_text(table) or "",
+            "header": [(cell or "").strip() for cell in mat[0]] if mat else [],
+            "rows": [[(cell or "").strip() for cell in row] for row in mat[1:]],
+            "files": files,
+        })
+    return tables
+
+
+def build_job(job: Job, revid: int, wikitext: str) -> Tuple[bytes, str]:
+    """Parse one page for one job; returns (serialized output, short summary).
+
+    Runs in a worker process, so it takes and returns plain picklable values.
+    """
+    if job["schema"] == "auxiliary_forms":
+        output = build_from_wikitext(wikitext, caption=job["caption"] or TARGET_TABLE_CAPTION)
+        return serialize_output(output), f"{len(output)} letters"
+    tables = build_tables(wikitext, job["caption"])
+    if not tables:
+        what = f"caption containing '{job['caption']}'" if job["caption"] else "tables"
+        raise LookupError(f"No {what} on {job['title']}")
+    output = {"title": job["title"], "revid": revid, "tables": tables}
+    return serialize_output(output), f"{len(tables)} table(s)"
+
+
+def load_state(cache_dir: str) -> Dict[str, Dict[str, object]]:
+    """Per-output record of what was last written: {output: {"revid", "content_sha1", "output_sha1"}}."""
+    try:
+        with open(os.path.join(cache_dir, STATE_NAME), "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_state(cache_dir: str, state: Dict[str, Dict[str, object]]) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, STATE_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _page_record(
+    title: str,
+    revid: object,
+    wikitext: str,
+    previous: Optional[Dict[str, object]],
+) -> Dict[str, object]:
+    content_sha1 = sha1_hex(wikitext.encode("utf-8"))
+    previous = previous or {}
+    return {
+        "title": title,
+        "revid": revid,
+        "content_sha1": content_sha1,
+        # Only still valid for export_auxiliary_forms_json.py's fast path
+        # when the text did not change
+        "output_sha1": previous.get("output_sha1") if previous.get("content_sha1") == content_sha1 else None,
+        "wikitext": wikitext,
+    }
+
+
+def read_dump_pages(
+    titles: List[str],
+    cached: Dict[str, Dict[str, object]],
+    args: argparse.Namespace,
+    recorder: Recorder = NULL_RECORDER,
+) -> Dict[str, Dict[str, object]]:
+    """Cache records for the titles found in --dump, in one streaming pass."""
+    from wiki_dump import find_pages
+
+    with recorder.stage("fetch", kind="dump", titles=len(titles)) as extra:
+        pages = find_pages(args.dump, titles)
+        extra["chars"] = sum(len(str(p["wikitext"])) for p in pages.values())
+    records: Dict[str, Dict[str, object]] = {}
+    for title, page in pages.items():
+        record = _page_record(title, page["revid"], str(page["wikitext"]), cached.get(title))
+        if record != cached.get(title):
+            save_cache(args.cache_dir, record)
+        records[title] = record
+    return records
+
+
+def refresh_pages(
+    titles: List[str],
+    args: argparse.Namespace,
+    recorder: Recorder = NULL_RECORDER,
+    session: Optional["requests.Session"] = None,
+) -> Dict[str, Dict[str, object]]:
+    """Current cache record for each title, fetching only pages whose revision moved.
+
+    Titles that are missing on the wiki (or, offline, from the cache; with --dump,
+    from the dump) are left out.
+    """
+    records: Dict[str, Dict[str, object]] = {}
+    for title in titles:
+        cached = load_cache(args.cache_dir, title)
+        if cached is not None:
+            records[title] = cached
+    if args.dump:
+        return read_dump_pages(titles, records, args, recorder)
+    if args.offline:
+        return records
+
+    stale = [t for t in titles if t not in records or args.force]
+    probe = [t for t in titles if t in records and not args.force]
+    if probe:
+        with recorder.stage("fetch", kind="probe", titles=len(probe)):
+            latest = fetch_revisions(probe, args.api_url, session, content=False)
+        for title in probe:
+            if title not in latest:
+                records.pop(title)
+            elif latest[title]["revid"] != records[title].get("revid"):
+                stale.append(title)
+    if stale:
+        with recorder.stage("fetch", kind="content", titles=len(stale)) as extra:
+            fetched = fetch_revisions(stale, args.api_url, session)
+            extra["chars"] = sum(len(r["wikitext"]) for r in fetched.values())
+        for title in stale:
+            if title not in fetched:
+                records.pop(title, None)
+                continue
+            revision = fetched[title]
+            record = _page_record(title, revision["revid"], str(revision["wikitext"]), records.get(title))
+            save_cache(args.cache_dir, record)
+            records[title] = record
+    return records
+
+
+def export_pages(
+    jobs: List[Job],
+    args: argparse.Namespace,
+    recorder: Recorder = NULL_RECORDER,
+    session: Optional["requests.Session"] = None,
+) -> int:
+    """Run every job; returns 0, or the worst failure (1 fetch, 2 table not found, 3 other)."""
+    titles = list(dict.fromkeys(job["title"] for job in jobs))
+    try:
+        records = refresh_pages(titles, args, recorder, session)
+    except Exception as exc:
+        print(f"Error fetching pages: {exc}", file=sys.stderr)
+        return 1
+
+    rc = 0
+    state = load_state(args.cache_dir)
+    pending: List[Tuple[Job, Dict[str, object]]] = []
+    for job in jobs:
+        record = records.get(job["title"])
+        if record is None:
+            if args.dump:
+                where = f"in {args.dump}"
+            else:
+                where = f"in {args.cache_dir}" if args.offline else "on the wiki"
+            print(f"No page {job['title']} {where}", file=sys.stderr)
+            rc = max(rc, 1)
+            continue
+        previous = state.get(job["output"]) or {}
+        if (
+            not args.force
+            and previous.get("content_sha1") == record["content_sha1"]
+            and previous.get("schema") == job["schema"]
+            and previous.get("caption") == job["caption"]
+            and file_sha1(job["output"]) == previous.get("output_sha1")
+        ):
+            print(f"Up to date: {job['output']}")
+            continue
+        pending.append((job, record))
+
+    if not pending:
+        return rc
+
+    with recorder.stage("parse", jobs=len(pending)):
+        if args.workers <= 1 or len(pending) == 1:
+            results = [_run_job(job, record) for job, record in pending]
+        else:
+            with ProcessPoolExecutor(max_workers=min(args.workers, len(pending))) as pool:
+                results = list(pool.map(
+                    _run_job, [job for job, _ in pending], [record for _, record in pending]
+                ))
+
+    with recorder.stage("write", target="pages") as extra:
+        written = 0
+        for (job, record), (code, result) in zip(pending, results):
+            if code:
+                print(f"{job['title']}: {result}", file=sys.stderr)
+                rc = max(rc, code)
+                continue
+            payload, summary = result
+            os.makedirs(os.path.dirname(os.path.abspath(job["output"])), exist_ok=True)
+            if write_output_if_changed(job["output"], payload):
+                written += 1
+                print(f"Wrote {job['output']} ({summary}, revision {record['revid']})")
+            else:
+                print(f"Output already current: {job['output']}")
+            state[job["output"]] = {
+                "title": job["title"],
+                "caption": job["caption"],
+                "schema": job["schema"],
+                "revid": record["revid"],
+                "content_sha1": record["content_sha1"],
+                "output_sha1": sha1_hex(payload),
+            }
+        extra["files"] = written
+    save_state(args.cache_dir, state)
+    return rc
+
+
+def _run_job(job: Job, record: Dict[str, object]) -> Tuple[int, object]:
+    # Errors come back as values so one bad page does not cancel the pool
+    try:
+        return 0, build_job(job, int(record.get("revid") or 0), str(record["wikitext"]))
+    except LookupError as exc:
+        return 2, str(exc)
+    except Exception as exc:
+        return 3, f"Error building output: {exc}"
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--jobs", metavar="PATH", help="JSON list of jobs to run")
+    parser.add_argument(
+        "--page",
+        action="append",
+        default=[],
+        metavar="TITLE[#CAPTION]",
+        help="export the tables of a page (repeatable); #CAPTION keeps only that table",
+    )
+    parser.add_argument(
+        "--pages-dir",
+        default=DEFAULT_PAGES_DIR,
+        help="where outputs of jobs without an explicit output go",
+    )
+    parser.add_argument(
+        "--api-url",
+        default=API_URL,
+        help="MediaWiki api.php endpoint (e.g. a wiki_cassette.py server)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="directory holding the revision-keyed wikitext cache",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="rebuild from the cached wikitext without touching the network",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="refetch and rewrite every job even if its page is unchanged",
+    )
+    parser.add_argument(
+        "--dump",
+        metavar="PATH",
+        help="read the pages from a pages-articles XML dump (.xml, .bz2, .gz) instead of the API",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="parser processes (default: CPU count)",
+    )
+    add_profile_arguments(parser)
+
+
+def jobs_from_args(args: argparse.Namespace) -> List[Job]:
+    jobs = load_jobs(args.jobs, args.pages_dir) if args.jobs else []
+    for spec in args.page:
+        title, _, caption = spec.partition("#")
+        jobs.append(make_job(title.strip(), caption.strip(), pages_dir=args.pages_dir))
+    return jobs or default_jobs()
+
+
+def run(args: argparse.Namespace, recorder: Recorder = NULL_RECORDER) -> int:
+    try:
+        jobs = jobs_from_args(args)
+    except (OSError, ValueError) as exc:
+        print(f"Invalid jobs: {exc}", file=sys.stderr)
+        return 1
+    return export_pages(jobs, args, recorder)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    with profiling(args, "export-pages") as recorder:
+        return run(args, recorder)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = []
+# ///
+"""
+Minify the Illustrator-exported SVGs in experiment/輔助字形 for serving.
+
+Run after download_auxiliary_svgs.py. Sources are left untouched (their SHA-1 must keep
+matching the wiki for the download manifest); optimized copies go to a sibling
+directory. Rendering is preserved: only editor metadata, dead styles and defaulted
+attributes are dropped, class rules are inlined as presentation attributes, and
+coordinates are rounded to a configurable number of decimals.
+
+Results are cached by source SHA-1 + settings, so unchanged files are not reprocessed,
+and files are processed in parallel on a process pool.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+WORKDIR = os.path.dirname(__file__)
+SOURCE_DIR = os.path.join(WORKDIR, "輔助字形")
+DEFAULT_OUTPUT_DIR = os.path.join(WORKDIR, "輔助字形.min")
+DEFAULT_CACHE_PATH = os.path.join(WORKDIR, ".cache", "optimize_svgs.json")
+DEFAULT_PRECISION = 2
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+
+# Attributes whose values are lists of coordinates/lengths safe to round
+NUMERIC_ATTRS = {
+    "d", "points", "x", "y", "x1", "y1", "x2", "y2", "cx", "cy", "r", "rx", "ry",
+    "width", "height", "transform", "stroke-width",
+}
+# CSS properties that are also SVG presentation attributes
+PRESENTATION_ATTRS = {
+    "fill", "fill-opacity", "fill-rule", "stroke", "stroke-width", "stroke-opacity",
+    "stroke-linecap", "stroke-linejoin", "stroke-miterlimit", "stroke-dasharray",
+    "opacity", "display", "visibility", "clip-rule", "color", "overflow",
+}
+# Root attributes that only restate defaults or carry editor metadata
+ROOT_DROP_ATTRS = {"version", f"{{{XML_NS}}}space"}
+ROOT_ZERO_ATTRS = {"x", "y"}
+
+NUMBER_RE = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+CSS_RULE_RE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+SIMPLE_CLASS_RE = re.compile(r"\.([A-Za-z_][\w-]*)")
+PATH_COMMAND_SPACE_RE = re.compile(r"\s*([A-Za-z])\s*")
+TEXT_ELEMENTS = {"text", "tspan", "textPath", "title", "desc", "style"}
+
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+
+def sha1_hex(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def format_number(value: float, precision: int) -> str:
+    text = f"{round(value, precision):.{precision}f}" if precision > 0 else str(int(round(value)))
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    if text in ("-0", ""):
+        text = "0"
+    if text.startswith("0."):
+        text = text[1:]
+    elif text.startswith("-0."):
+        text = "-" + text[2:]
+    return text
+
+
+def round_numbers(value: str, precision: int) -> str:
+    return NUMBER_RE.sub(lambda m: format_number(float(m.group(0)), precision), value)
+
+
+def parse_declarations(text: str) -> List[Tuple[str, str]]:
+    decls: List[Tuple[str, str]] = []
+    for part in text.split(";"):
+        if ":" not in part:
+            continue
+        name, value = part.split(":", 1)
+        name, value = name.strip(), " ".join(value.split())
+        # enable-background is an Illustrator leftover no browser implements
+        if name and value and name != "enable-background":
+            decls.append((name, value))
+    return decls
+
+
+def format_declarations(decls: List[Tuple[str, str]]) -> str:
+    return ";".join(f"{name}:{value}" for name, value in decls)
+
+
+def parse_class_rules(css: str) -> Optional[Dict[str, List[Tuple[str, str]]]]:
+    """Map class name -> declarations, or None if any selector is not a plain .class."""
+    rules: Dict[str, List[Tuple[str, str]]] = {}
+    for selector, body in CSS_RULE_RE.findall(css):
+        for sel in selector.split(","):
+            m = SIMPLE_CLASS_RE.fullmatch(sel.strip())
+            if not m:
+                return None
+            rules.setdefault(m.group(1), []).extend(parse_declarations(body))
+    # Anything left over (at-rules, comments we cannot read) disables inlining
+    if CSS_RULE_RE.sub("", css).strip():
+        return None
+    return rules
+
+
+def inline_class_rules(root: ET.Element, rules: Dict[str, List[Tuple[str, str]]]) -> None:
+    for el in root.iter():
+        classes = el.attrib.pop("class", "").split()
+        if not classes:
+            continue
+        style = parse_declarations(el.attrib.pop("style", ""))
+        styled = {name for name, _ in style}
+        for cls in classes:
+            for name, value in rules.get(cls, []):
+                # An inline style attribute outranks class rules; keep it
+                if name in styled:
+                    continue
+                if name in PRESENTATION_ATTRS:
+                    # Class rules outrank presentation attributes, so overwrite
+                    el.set(name, value)
+                else:
+                    style.append((name, value))
+                    styled.add(name)
+        if style:
+            el.set("style", format_declarations(style))
+
+
+def optimize_svg(source: bytes, precision: int = DEFAULT_PRECISION) -> bytes:
+    """Return a minified SVG that renders the same as source (up to rounding)."""
+    root = ET.fromstring(source)
+    text = source.decode("utf-8", errors="replace")
+
+    for attr in ROOT_DROP_ATTRS:
+        root.attrib.pop(attr, None)
+    for attr in ROOT_ZERO_ATTRS:
+        if root.get(attr) in ("0", "0px"):
+            del root.attrib[attr]
+    root_id = root.get("id")
+    if root_id is not None and f"#{root_id}" not in text:
+        del root.attrib["id"]
+
+    # Inline <style> class rules when they are all simple, then drop the element
+    for parent in list(root.iter()):
+        for child in list(parent):
+            if _local(child.tag) != "style":
+                continue
+            rules = parse_class_rules(child.text or "")
+            if rules is not None:
+                inline_class_rules(root, rules)
+                parent.remove(child)
+
+    for el in root.iter():
+        style = el.attrib.get("style")
+        if style is not None:
+            decls = parse_declarations(style)
+            if decls:
+                el.set("style", format_declarations(decls))
+            else:
+                del el.attrib["style"]
+        for name, value in list(el.attrib.items()):
+            if name in NUMERIC_ATTRS:
+                value = " ".join(round_numbers(value, precision).split())
+                if name == "d":
+                    value = PATH_COMMAND_SPACE_RE.sub(r"\1", value)
+                el.set(name, value)
+        if _local(el.tag) not in TEXT_ELEMENTS:
+            if el.text is not None and not el.text.strip():
+                el.text = None
+        if el.tail is not None and not el.tail.strip():
+            el.tail = None
+
+    # Unwrap attribute-less <g> wrappers left behind after inlining
+    for parent in list(root.iter()):
+        for child in list(parent):
+            if _local(child.tag) == "g" and not child.attrib and not (child.text or "").strip():
+                position = list(parent).index(child)
+                parent.remove(child)
+                for offset, grandchild in enumerate(list(child)):
+                    parent.insert(position + offset, grandchild)
+
+    markup = ET.tostring(root, encoding="unicode", short_empty_elements=True)
+    # ElementTree writes "<path ... />"; attribute values never contain a raw ">"
+    return markup.replace(" />", "/>").encode("utf-8")
+
+
+def settings_key(precision: int) -> str:
+    return f"precision={precision}"
+
+
+def _optimize_one(args: Tuple[str, str, int]) -> Tuple[str, str, int, int, Optional[str]]:
+    """Worker: returns (name, source sha1, source bytes, output bytes, error)."""
+    src_path, out_path, precision = args
+    name = os.path.basename(src_path)
+    try:
+        with open(src_path, "rb") as f:
+            source = f.read()
+        optimized = optimize_svg(source, precision)
+        tmp_path = out_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(optimized)
+        os.replace(tmp_path, out_path)
+        return name, sha1_hex(source), len(source), len(optimized), None
+    except (OSError, ET.ParseError, ValueError) as exc:
+        return name, "", 0, 0, str(exc)
+
+
+def load_cache(path: str) -> Dict[str, Dict[str, object]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_cache(path: str, cache: Dict[str, Dict[str, object]]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_cached(
+    cache: Dict[str, Dict[str, object]],
+    name: str,
+    source_sha1: str,
+    settings: str,
+    out_path: str,
+) -> bool:
+    entry = cache.get(name)
+    return bool(
+        entry
+        and entry.get("source_sha1") == source_sha1
+        and entry.get("settings") == settings
+        and os.path.exists(out_path)
+        and os.path.getsize(out_path) == entry.get("output_size")
+    )
+
+
+def optimize_directory(
+    source_dir: str = SOURCE_DIR,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    precision: int = DEFAULT_PRECISION,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, object]:
+    """Optimize every *.svg in source_dir into output_dir; returns a size/time report."""
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    cache = {} if force else load_cache(cache_path)
+    settings = settings_key(precision)
+
+    names = sorted(n for n in os.listdir(source_dir) if n.lower().endswith(".svg"))
+    todo: List[Tuple[str, str, int]] = []
+    before = after = 0
+    skipped = 0
+    for name in names:
+        src_path = os.path.join(source_dir, name)
+        out_path = os.path.join(output_dir, name)
+        with open(src_path, "rb") as f:
+            source_sha1 = sha1_hex(f.read())
+        if is_cached(cache, name, source_sha1, settings, out_path):
+            skipped += 1
+            before += int(cache[name]["source_size"])
+            after += int(cache[name]["output_size"])
+        else:
+            todo.append((src_path, out_path, precision))
+
+    errors: Dict[str, str] = {}
+    if todo:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+            for name, source_sha1, src_size, out_size, err in ex.map(
+                _optimize_one, todo, chunksize=16
+            ):
+                if err:
+                    errors[name] = err
+                    continue
+                before += src_size
+                after += out_size
+                cache[name] = {
+                    "source_sha1": source_sha1,
+                    "settings": settings,
+                    "source_size": src_size,
+                    "output_size": out_size,
+                }
+
+    # Forget sources that no longer exist
+    for name in [n for n in cache if n not in set(names)]:
+        del cache[name]
+    save_cache(cache_path, cache)
+
+    return {
+        "files": len(names),
+        "optimized": len(todo) - len(errors),
+        "cached": skipped,
+        "errors": errors,
+        "bytes_before": before,
+        "bytes_after": after,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def print_report(report: Dict[str, object]) -> None:
+    before = int(report["bytes_before"])
+    after = int(report["bytes_after"])
+    saved = before - after
+    pct = (100.0 * saved / before) if before else 0.0
+    print(
+        f"{report['files']} SVGs: {report['optimized']} optimized, "
+        f"{report['cached']} unchanged (cached), {len(report['errors'])} errors"
+    )
+    print(f"Size: {before:,} -> {after:,} bytes (saved {saved:,}, {pct:.1f}%)")
+    print(f"Time: {report['seconds']:.2f}s")
+    for name, err in sorted(report["errors"].items()):
+        print(f"Failed: {name}: {err}", file=sys.stderr)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source-dir", default=SOURCE_DIR)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument(
+        "--precision",
+        type=int,
+        default=DEFAULT_PRECISION,
+        help="decimal places kept in coordinates",
+    )
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="result cache file")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPUs)")
+    parser.add_argument("--force", action="store_true", help="ignore the cache")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    if not os.path.isdir(args.source_dir):
+        print(f"No such directory: {args.source_dir}", file=sys.stderr)
+        return 1
+    report = optimize_directory(
+        source_dir=args.source_dir,
+        output_dir=args.output_dir,
+        precision=max(0, args.precision),
+        cache_path=args.cache,
+        workers=args.workers,
+        force=args.force,
+    )
+    print_report(report)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = []
+# ///
+"""
+Publish the aux-mode data and SVGs under content-addressed filenames.
+
+Every asset the page fetches from experiment/ (auxiliary_forms.json, characters.json,
+the per-letter shards, the sprite sheets, each SVG in 輔助字形, its
+alias map and pre-rendered rasters) is copied to dist/ as <stem>.<sha1[:10]><ext>,
+and dist/manifest.json maps the logical URL the front end asks for
+("experiment/auxiliary_forms/A.json") to the published path relative to dist/
+("auxiliary_forms/A.1f3c9a0b2d.json"). Published files never change content, so
+they can be served with "Cache-Control: public, max-age=31536000, immutable";
+only manifest.json needs revalidation, and a wiki edit changes exactly the hashed
+names of the files it touched.
+
+JSON and SVG files also get precompressed .gz (stdlib) and .br (needs the optional
+brotli package) siblings for static hosts that serve them directly. Existing hashed
+files are left alone, so republishing only writes what changed.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # .br siblings are skipped without it
+    brotli = None
+
+WORKDIR = os.path.dirname(__file__)
+DEFAULT_DIST_DIR = os.path.join(WORKDIR, "dist")
+MANIFEST_NAME = "manifest.json"
+URL_PREFIX = "experiment/"
+HASH_LENGTH = 10
+
+JSON_PATH = os.path.join(WORKDIR, "auxiliary_forms.json")
+CHAR_DICT_PATH = os.path.join(WORKDIR, "characters.json")
+SHARD_DIR = os.path.join(WORKDIR, "auxiliary_forms")
+SPRITE_DIR = os.path.join(WORKDIR, "sprites")
+SVG_DIR = os.path.join(WORKDIR, "輔助字形")
+OPTIMIZED_SVG_DIR = os.path.join(WORKDIR, "輔助字形.min")
+RASTER_DIR = os.path.join(WORKDIR, "輔助字形.raster")
+ALIASES_PATH = os.path.join(WORKDIR, "輔助字形.aliases.json")
+
+COMPRESSIBLE_EXTS = {".json", ".svg"}
+COMPRESSED_EXTS = (".gz", ".br")
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha1(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def collect_assets(svg_dir: str) -> List[Tuple[str, str]]:
+    """(logical path relative to experiment/, source file) for every published asset.
+
+    SVGs keep their 輔助字形/ logical path even when read from the optimized copy.
+    """
+    assets: List[Tuple[str, str]] = []
+    for path in (JSON_PATH, CHAR_DICT_PATH, ALIASES_PATH):
+        if os.path.isfile(path):
+            assets.append((os.path.basename(path), path))
+    for logical_dir, source_dir, exts in (
+        ("auxiliary_forms", SHARD_DIR, (".json",)),
+        ("sprites", SPRITE_DIR, (".svg", ".json")),
+        ("輔助字形", svg_dir, (".svg",)),
+        ("輔助字形.raster", RASTER_DIR, (".png", ".webp", ".json")),
+    ):
+        if not os.path.isdir(source_dir):
+            continue
+        for name in sorted(os.listdir(source_dir)):
+            if name.lower().endswith(exts):
+                assets.append((f"{logical_dir}/{name}", os.path.join(source_dir, name)))
+    return assets
+
+
+def write_atomic(path: str, payload: bytes) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def compress_variants(data: bytes) -> Dict[str, bytes]:
+    """Precompressed siblings worth keeping (smaller than the original)."""
+    variants: Dict[str, bytes] = {}
+    # mtime=0 keeps the .gz bytes reproducible across runs
+    variants[".gz"] = gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return {ext: body for ext, body in variants.items() if len(body) < len(data)}
+
+
+def publish_file(data: bytes, target: str, compress: bool) -> Tuple[bool, Dict[str, int]]:
+    """Write target (and siblings) unless already present; returns (written, sizes)."""
+    written = False
+    if not os.path.exists(target):
+        write_atomic(target, data)
+        written = True
+    sizes: Dict[str, int] = {"raw": len(data)}
+    if compress:
+        for ext, body in compress_variants(data).items():
+            if not os.path.exists(target + ext):
+                write_atomic(target + ext, body)
+                written = True
+            sizes[ext.lstrip(".")] = len(body)
+    return written, sizes
+
+
+def load_manifest(path: str) -> Dict[str, object]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def prune_unreferenced(dist_dir: str, keep: set) -> List[str]:
+    """Remove published files (and siblings) no manifest entry points to."""
+    removed: List[str] = []
+    for root, _dirs, files in os.walk(dist_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, dist_dir).replace(os.sep, "/")
+            base = rel[:-3] if rel.endswith(COMPRESSED_EXTS) else rel
+            if rel == MANIFEST_NAME or base in keep:
+                continue
+            os.remove(path)
+            removed.append(rel)
+    return removed
+
+
+def publish(
+    dist_dir: str = DEFAULT_DIST_DIR,
+    svg_dir: Optional[str] = None,
+    compress: bool = True,
+    prune: bool = False,
+) -> Dict[str, object]:
+    """Publish all assets into dist_dir and rewrite its manifest; returns a summary."""
+    svg_dir = svg_dir or (OPTIMIZED_SVG_DIR if os.path.isdir(OPTIMIZED_SVG_DIR) else SVG_DIR)
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    previous = (load_manifest(manifest_path).get("assets") or {})
+
+    assets: Dict[str, str] = {}
+    written: List[str] = []
+    totals = {"raw": 0, "gz": 0, "br": 0}
+    for logical, source in collect_assets(svg_dir):
+        with open(source, "rb") as f:
+            data = f.read()
+        rel = hashed_name(logical, data)
+        target = os.path.join(dist_dir, *rel.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        is_compressible = compress and os.path.splitext(logical)[1].lower() in COMPRESSIBLE_EXTS
+        was_written, sizes = publish_file(data, target, is_compressible)
+        if was_written:
+            written.append(logical)
+        for key in totals:
+            totals[key] += sizes.get(key, sizes["raw"])
+        assets[URL_PREFIX + logical] = rel
+
+    changed = sorted(k for k in assets if previous.get(k) != assets[k])
+    removed = sorted(k for k in previous if k not in assets)
+    manifest = {"version": 1, "assets": assets}
+    write_atomic(
+        manifest_path,
+        json.dumps(manifest, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8"),
+    )
+
+    pruned: List[str] = []
+    if prune:
+        pruned = prune_unreferenced(dist_dir, set(assets.values()))
+
+    return {
+        "assets": len(assets),
+        "written": written,
+        "changed": changed,
+        "removed": removed,
+        "pruned": pruned,
+        "bytes": totals,
+        "brotli": brotli is not None,
+    }
+
+
+def print_report(summary: Dict[str, object], dist_dir: str) -> None:
+    totals = summary["bytes"]
+    print(
+        f"Published {summary['assets']} assets to {dist_dir}: "
+        f"{len(summary['written'])} written, {len(summary['changed'])} manifest entries changed, "
+        f"{len(summary['removed'])} removed"
+    )
+    if summary["pruned"]:
+        print(f"Pruned {len(summary['pruned'])} unreferenced files")
+    print(f"Bytes: raw {totals['raw']:,}  gzip {totals['gz']:,}" + (
+        f"  brotli {totals['br']:,}" if summary["brotli"] else ""
+    ))
+    if not summary["brotli"]:
+        print("Warning: brotli not installed; .br siblings skipped", file=sys.stderr)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dist-dir", default=DEFAULT_DIST_DIR, help="publish directory")
+    parser.add_argument(
+        "--svg-dir",
+        default=None,
+        help=f"SVGs to publish (default: {OPTIMIZED_SVG_DIR} if present, else {SVG_DIR})",
+    )
+    parser.add_argument("--no-compress", action="store_true", help="skip .gz/.br siblings")
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="delete published files the new manifest no longer references",
+    )
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    try:
+        summary = publish(
+            dist_dir=args.dist_dir,
+            svg_dir=args.svg_dir,
+            compress=not args.no_compress,
+            prune=args.prune,
+        )
+    except OSError as e:
+        print(f"Publish failed: {e}", file=sys.stderr)
+        return 1
+    print_report(summary, args.dist_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = ["cairosvg", "pillow"]
+# ///
+"""
+Pre-render the auxiliary SVGs to PNG/WebP at the sizes the page displays them.
+
+Low-end tablets spend noticeable time decoding and rasterizing the small
+Illustrator SVGs on every question. This stage renders each file in 輔助字形 once,
+at 1x and 2x of every CSS height the page uses for it:
+  strip    20px  fuzhu forms in the aux panel strip (1.25em at 16px)
+  zili     83px  the example character in the quest box (1.3em at 64px)
+  inline   NNpx  images in shuo_ming, from the [[File:...|NNpx]] parameter
+                 (14px, the panel's 1em, when the link gives none)
+Files the export does not reference are rendered at the strip height.
+
+Output goes to 輔助字形.raster/<stem>-<height>@<scale>x.<format>, with
+manifest.json for the front end:
+  {"version": 1, "scales": [1, 2], "formats": ["webp", "png"],
+   "files": {"cjrm-a0.svg": {"sha1": "...", "renders": {"20": "cjrm-a0-20"}}}}
+which auxImage.js turns into <img srcset="cjrm-a0-20@1x.webp 1x, cjrm-a0-20@2x.webp 2x">.
+Files whose source hash and render list are unchanged (and whose outputs exist) are
+skipped; the rest are rendered in a process pool.
+
+Rasterizing uses cairosvg when importable, otherwise the rsvg-convert command.
+WebP needs Pillow; without it only PNG is written.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from export_auxiliary_forms_json import INLINE_FILE_RE, INLINE_SIZE_RE, load_output
+from svg_store import load_aliases
+
+try:
+    from PIL import Image
+except ImportError:  # WebP output is skipped without it
+    Image = None
+
+WORKDIR = os.path.dirname(__file__)
+SOURCE_DIR = os.path.join(WORKDIR, "輔助字形")
+JSON_PATH = os.path.join(WORKDIR, "auxiliary_forms.json")
+DEFAULT_OUTPUT_DIR = os.path.join(WORKDIR, "輔助字形.raster")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# Names render_name/output_names produce: <stem>-<height>@<scale>x.<format>;
+# only these are pruned, so other files in --output-dir are left alone
+RASTER_NAME_RE = re.compile(r"^.+-\d+@\d+x\.(?:png|webp)$")
+
+# CSS pixel heights; keep in sync with AUX_RASTER_HEIGHTS in src/js/constants.js
+STRIP_HEIGHT = 20
+ZILI_HEIGHT = 83
+INLINE_DEFAULT_HEIGHT = 14
+SCALES = (1, 2)
+WEBP_QUALITY = 90
+
+RenderJob = Tuple[str, str, List[int], Tuple[int, ...], Tuple[str, ...]]
+
+
+def collect_heights(
+    data: Dict[str, Dict[str, object]],
+    aliases: Optional[Dict[str, str]] = None,
+) -> Dict[str, Set[int]]:
+    """SVG filename -> CSS heights the page displays it at.
+
+    Names collapsed by svg_store.py --dedup count towards their canonical file.
+    """
+    aliases = aliases or {}
+    heights: Dict[str, Set[int]] = {}
+
+    def add(name: str, height: int) -> None:
+        heights.setdefault(aliases.get(name, name), set()).add(height)
+
+    for bucket in data.values():
+        for row in bucket.get("rows") or []:
+            for group in row.get("fuzhu_zixing") or []:
+                add(group["file"], STRIP_HEIGHT)
+                for zili in group.get("zili") or []:
+                    add(zili["file"], ZILI_HEIGHT)
+            for m in INLINE_FILE_RE.finditer(row.get("shuo_ming") or ""):
+                size = INLINE_SIZE_RE.search(m.group(2) or "")
+                add(m.group(1).strip(), int(size.group(1)) if size else INLINE_DEFAULT_HEIGHT)
+    return heights
+
+
+def render_name(filename: str, height: int) -> str:
+    return f"{os.path.splitext(filename)[0]}-{height}"
+
+
+def output_names(base: str, scales: Tuple[int, ...], formats: Tuple[str, ...]) -> List[str]:
+    return [f"{base}@{scale}x.{fmt}" for scale in scales for fmt in formats]
+
+
+def rasterize(svg: bytes, height: int) -> bytes:
+    """PNG bytes of svg scaled to height device pixels (width follows the aspect ratio)."""
+    try:
+        import cairosvg
+    except (ImportError, OSError):  # OSError: the cairo library itself is missing
+        cairosvg = None
+    if cairosvg is not None:
+        return cairosvg.svg2png(bytestring=svg, output_height=height)
+    if shutil.which("rsvg-convert") is None:
+        raise RuntimeError("needs cairosvg (pip install cairosvg) or rsvg-convert")
+    proc = subprocess.run(
+        ["rsvg-convert", "--format", "png", "--height", str(height), "--keep-aspect-ratio"],
+        input=svg,
+        capture_output=True,
+        check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", errors="replace").strip() or "rsvg-convert failed")
+    return proc.stdout
+
+
+def to_webp(png: bytes) -> bytes:
+    out = io.BytesIO()
+    with Image.open(io.BytesIO(png)) as im:
+        im.save(out, format="WEBP", quality=WEBP_QUALITY, method=6)
+    return out.getvalue()
+
+
+def write_atomic(path: str, payload: bytes) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _render_one(job: RenderJob) -> Tuple[str, str, int, Optional[str]]:
+    """Worker: returns (name, source sha1, bytes written, error)."""
+    src_path, output_dir, heights, scales, formats = job
+    name = os.path.basename(src_path)
+    try:
+        with open(src_path, "rb") as f:
+            source = f.read()
+        written = 0
+        for height in heights:
+            base = render_name(name, height)
+            for scale in scales:
+                png = rasterize(source, height * scale)
+                for fmt in formats:
+                    payload = png if fmt == "png" else to_webp(png)
+                    write_atomic(os.path.join(output_dir, f"{base}@{scale}x.{fmt}"), payload)
+                    written += len(payload)
+        return name, hashlib.sha1(source).hexdigest(), written, None
+    except Exception as exc:  # renderer errors vary by backend
+        return name, "", 0, str(exc)
+
+
+def load_manifest(path: str) -> Dict[str, object]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def is_current(
+    entry: Optional[Dict[str, object]],
+    source_sha1: str,
+    renders: Dict[str, str],
+    output_dir: str,
+    scales: Tuple[int, ...],
+    formats: Tuple[str, ...],
+) -> bool:
+    if not entry or entry.get("sha1") != source_sha1 or entry.get("renders") != renders:
+        return False
+    return all(
+        os.path.exists(os.path.join(output_dir, out))
+        for base in renders.values()
+        for out in output_names(base, scales, formats)
+    )
+
+
+def render_directory(
+    heights: Dict[str, Set[int]],
+    source_dir: str = SOURCE_DIR,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    scales: Tuple[int, ...] = SCALES,
+    formats: Optional[Tuple[str, ...]] = None,
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, object]:
+    """Render every *.svg in source_dir and rewrite the manifest; returns a report."""
+    started = time.perf_counter()
+    if formats is None:
+        formats = ("webp", "png") if Image is not None else ("png",)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    previous = {} if force else load_manifest(manifest_path)
+    settings_changed = previous.get("scales") != list(scales) or previous.get("formats") != list(formats)
+    old_files = {} if settings_changed else previous.get("files") or {}
+
+    names = sorted(n for n in os.listdir(source_dir) if n.lower().endswith(".svg"))
+    files: Dict[str, Dict[str, object]] = {}
+    todo: List[RenderJob] = []
+    for name in names:
+        src_path = os.path.join(source_dir, name)
+        wanted = sorted(heights.get(name) or {STRIP_HEIGHT})
+        renders = {str(h): render_name(name, h) for h in wanted}
+        with open(src_path, "rb") as f:
+            source_sha1 = hashlib.sha1(f.read()).hexdigest()
+        if is_current(old_files.get(name), source_sha1, renders, output_dir, scales, formats):
+            files[name] = old_files[name]
+        else:
+            todo.append((src_path, output_dir, wanted, scales, formats))
+            files[name] = {"sha1": source_sha1, "renders": renders}
+
+    errors: Dict[str, str] = {}
+    written = 0
+    if todo:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+            for name, source_sha1, size, err in ex.map(_render_one, todo, chunksize=8):
+                if err:
+                    errors[name] = err
+                    del files[name]
+                    continue
+                files[name]["sha1"] = source_sha1
+                written += size
+
+    # Remove renders no manifest entry points to any more
+    keep = {MANIFEST_NAME}
+    for entry in files.values():
+        for base in entry["renders"].values():
+            keep.update(output_names(base, scales, formats))
+    removed = [
+        n
+        for n in sorted(os.listdir(output_dir))
+        if RASTER_NAME_RE.match(n) and n not in keep and os.path.isfile(os.path.join(output_dir, n))
+    ]
+    for name in removed:
+        os.remove(os.path.join(output_dir, name))
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "scales": list(scales),
+        "formats": list(formats),
+        "files": files,
+    }
+    write_atomic(
+        manifest_path,
+        json.dumps(manifest, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8"),
+    )
+    return {
+        "files": len(names),
+        "rendered": len(todo) - len(errors),
+        "cached": len(names) - len(todo),
+        "removed": len(removed),
+        "errors": errors,
+        "bytes_written": written,
+        "formats": list(formats),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def print_report(report: Dict[str, object]) -> None:
+    print(
+        f"{report['files']} SVGs: {report['rendered']} rendered, "
+        f"{report['cached']} unchanged (cached), {len(report['errors'])} errors, "
+        f"{report['removed']} stale raster(s) removed"
+    )
+    print(f"Formats: {', '.join(report['formats'])}; wrote {report['bytes_written']:,} bytes")
+    print(f"Time: {report['seconds']:.2f}s")
+    for name, err in sorted(report["errors"].items()):
+        print(f"Failed: {name}: {err}", file=sys.stderr)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", default=JSON_PATH, help="auxiliary_forms.json giving the display sizes")
+    parser.add_argument("--source-dir", default=SOURCE_DIR)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument(
+        "--formats",
+        help="comma-separated output formats (png, webp; default: webp,png when Pillow is installed)",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPUs)")
+    parser.add_argument("--force", action="store_true", help="re-render every file")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    if not os.path.isdir(args.source_dir):
+        print(f"No such directory: {args.source_dir}", file=sys.stderr)
+        return 1
+    if os.path.realpath(args.output_dir) == os.path.realpath(args.source_dir):
+        print("--output-dir must not be the source directory", file=sys.stderr)
+        return 2
+    data = load_output(args.json)
+    if data is None:
+        print(f"Failed to load {args.json}", file=sys.stderr)
+        return 1
+    formats = None
+    if args.formats:
+        formats = tuple(f.strip().lower() for f in args.formats.split(",") if f.strip())
+        unknown = [f for f in formats if f not in ("png", "webp")]
+        if unknown:
+            print(f"Unknown format(s): {', '.join(unknown)}", file=sys.stderr)
+            return 2
+        if "webp" in formats and Image is None:
+            print("WebP output needs Pillow: pip install pillow", file=sys.stderr)
+            return 2
+    report = render_directory(
+        collect_heights(data, load_aliases(args.source_dir)),
+        source_dir=args.source_dir,
+        output_dir=args.output_dir,
+        formats=formats,
+        workers=args.workers,
+        force=args.force,
+    )
+    print_report(report)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
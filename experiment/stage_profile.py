@@ -0,0 +1,144 @@
+"""
+Per-stage timing and memory records for the experiment scripts, written as JSON lines.
+
+Each line is one object with a "type":
+  stage  a timed section: {"name", "seconds", "peak_kib" | "maxrss_kib", ...fields}
+  event  a point measurement, e.g. one API batch or one file download
+  run    the final summary line with total wall time
+
+peak_kib is the tracemalloc peak inside the stage and is only present with
+--tracemalloc (which slows allocation-heavy code down noticeably); otherwise stages carry
+the process RSS high-water mark, which only ever grows but is free to read.
+
+Recording is off unless --profile is given; a disabled Recorder costs one attribute
+check per stage.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, Iterator, Optional, TextIO
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def _maxrss_kib() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class Recorder:
+    """Thread-safe JSON-lines sink for stage and event records."""
+
+    def __init__(self, stream: Optional[TextIO] = None, script: str = ""):
+        self.stream = stream
+        self.script = script
+        self.enabled = stream is not None
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    def emit(self, record: Dict[str, object]) -> None:
+        if not self.enabled:
+            return
+        record = {"script": self.script, "t": round(time.perf_counter() - self._t0, 6), **record}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def event(self, name: str, **fields: object) -> None:
+        if self.enabled:
+            self.emit({"type": "event", "name": name, **fields})
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **fields: object) -> Iterator[Dict[str, object]]:
+        """Time the body; callers may add fields (bytes, counts) to the yielded dict."""
+        extra: Dict[str, object] = {}
+        if not self.enabled:
+            yield extra
+            return
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            record: Dict[str, object] = {
+                "type": "stage",
+                "name": name,
+                "seconds": round(time.perf_counter() - start, 6),
+            }
+            if tracing:
+                record["peak_kib"] = tracemalloc.get_traced_memory()[1] // 1024
+            else:
+                record["maxrss_kib"] = _maxrss_kib()
+            record.update(fields)
+            record.update(extra)
+            self.emit(record)
+
+
+NULL_RECORDER = Recorder()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="append per-stage timings as JSON lines to PATH ('-' for stderr)",
+    )
+    parser.add_argument("--cprofile", metavar="PATH", help="dump cProfile stats (pstats format) to PATH")
+    parser.add_argument(
+        "--tracemalloc",
+        metavar="PATH",
+        help="trace allocations: per-stage peaks in --profile, snapshot dumped to PATH",
+    )
+
+
+@contextlib.contextmanager
+def profiling(args: argparse.Namespace, script: str) -> Iterator[Recorder]:
+    """Set up the recorder and optional cProfile/tracemalloc for one script run."""
+    stream: Optional[TextIO] = None
+    if getattr(args, "profile", None):
+        if args.profile == "-":
+            stream = sys.stderr
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(args.profile)), exist_ok=True)
+            stream = open(args.profile, "a", encoding="utf-8")
+    recorder = Recorder(stream, script)
+    profiler = None
+    if getattr(args, "cprofile", None):
+        import cProfile
+
+        profiler = cProfile.Profile()
+    if getattr(args, "tracemalloc", None):
+        tracemalloc.start()
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield recorder
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        run: Dict[str, object] = {"type": "run", "seconds": round(time.perf_counter() - start, 6)}
+        if tracemalloc.is_tracing():
+            run["peak_kib"] = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.take_snapshot().dump(args.tracemalloc)
+            tracemalloc.stop()
+        run["maxrss_kib"] = _maxrss_kib()
+        recorder.emit(run)
+        if stream is not None and stream is not sys.stderr:
+            stream.close()
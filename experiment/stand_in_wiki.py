@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = []
+# ///
+"""
+Synthetic MediaWiki stand-in for benchmarks and offline runs of the experiment scripts.
+
+Serves the two API calls the scripts make (prop=revisions for pages, prop=imageinfo for
+files) plus the file bodies, from in-memory data, with optional injected latency per
+request. Pages can be edited while the server runs (set_page bumps the revid), so
+change detection can be exercised as well.
+
+table_wikitext() regenerates the 輔助字形 table from an auxiliary_forms.json export,
+optionally scaled: each letter's rows are repeated with renamed files, so the table
+and every link count grow by the same factor. table_matrix() returns the same table
+as parsed cells without going through wikitextparser.
+
+Run directly to serve the current export and SVG directory:
+  python3 stand_in_wiki.py --latency 0.05
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+WORKDIR = os.path.dirname(__file__)
+JSON_PATH = os.path.join(WORKDIR, "auxiliary_forms.json")
+SVG_DIR = os.path.join(WORKDIR, "輔助字形")
+TITLE = "倉頡輸入法/輔助字形"
+TARGET_TABLE_CAPTION = "輔助字形列表"
+TABLE_HEADER = ["按鍵", "輔助字形", "字例", "說明"]
+API_PATH = "/w/api.php"
+FILE_PATH_PREFIX = "/files/"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+FILE_TIMESTAMP = "2020-01-01T00:00:00Z"
+
+SVG_NAME_RE = re.compile(r"(cj[re]m-[^|\]\s]+?)\.svg", re.IGNORECASE)
+
+
+def scaled_name(name: str, copy_index: int) -> str:
+    """cjem-a0-1.svg -> cjem-a0-1-x3.svg; copy 0 keeps the original name."""
+    if copy_index == 0:
+        return name
+    stem, ext = os.path.splitext(name)
+    return f"{stem}-x{copy_index}{ext}"
+
+
+def _rename_links(text: str, copy_index: int) -> str:
+    if copy_index == 0:
+        return text
+    return SVG_NAME_RE.sub(lambda m: f"{m.group(1)}-x{copy_index}.svg", text)
+
+
+def iter_table_rows(data: Dict[str, object], scale: int = 1) -> Iterator[Tuple[str, int, List[str]]]:
+    """Yield (letter, rows in letter, [key, fuzhu, zili, shuo_ming] cells) per table row."""
+    for letter, bucket in data.items():
+        rows = bucket.get("rows") or []
+        key_cell = f"{letter} {bucket.get('cangjie_char', '')}"
+        for copy_index in range(scale):
+            for row in rows:
+                groups = row.get("fuzhu_zixing") or []
+                fuzhu = " ".join(
+                    f"[[Image:{scaled_name(g['file'], copy_index)}|30px]]" for g in groups
+                )
+                zili = " ".join(
+                    f"[[File:{scaled_name(z['file'], copy_index)}|30px|{z['label']}]]"
+                    for g in groups
+                    for z in g.get("zili") or []
+                )
+                shuo_ming = _rename_links(row.get("shuo_ming") or "", copy_index)
+                yield letter, len(rows) * scale, [key_cell, fuzhu, zili, shuo_ming]
+
+
+def table_wikitext(data: Dict[str, object], scale: int = 1) -> str:
+    """Rebuild the page wikitext for an export, with every letter's rows repeated `scale` times."""
+    lines = [
+        "intro text",
+        '{| class="wikitable"',
+        f"|+ {TARGET_TABLE_CAPTION}",
+        "! " + " !! ".join(TABLE_HEADER),
+    ]
+    previous = None
+    for letter, total, cells in iter_table_rows(data, scale):
+        lines.append("|-")
+        if letter != previous:
+            lines.append(f'| rowspan="{total}" | {cells[0]}')
+            previous = letter
+        lines.extend("| " + cell for cell in cells[1:])
+    lines.append("|}")
+    return "\n".join(lines)
+
+
+def table_matrix(data: Dict[str, object], scale: int = 1) -> List[List[str]]:
+    """What extract_table(table_wikitext(...)).data(span=True) returns, built directly.
+
+    wikitextparser's span expansion is superlinear in the row count, so large synthetic
+    tables are built this way instead.
+    """
+    return [list(TABLE_HEADER)] + [
+        [cell.strip() for cell in cells] for _letter, _total, cells in iter_table_rows(data, scale)
+    ]
+
+
+def synthetic_svg(name: str, size: int = 1200) -> bytes:
+    """Deterministic SVG body of roughly `size` bytes."""
+    seed = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    head = f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><!-- {name} -->'
+    path = '<path d="M{0} {1}L{1} {0}"/>'
+    body = head
+    i = 0
+    while len(body) < size - 6:
+        body += path.format(int(seed[i % 40], 16), int(seed[(i + 7) % 40], 16))
+        i += 1
+    return (body + "</svg>").encode("utf-8")
+
+
+class StandInWiki:
+    """In-memory pages and files behind a threaded HTTP server."""
+
+    def __init__(
+        self,
+        pages: Optional[Dict[str, str]] = None,
+        files: Optional[Dict[str, bytes]] = None,
+        latency: float = 0.0,
+    ):
+        self.pages: Dict[str, Tuple[int, str]] = {}
+        self.files: Dict[str, bytes] = {}
+        self.latency = latency
+        self.hits: Dict[str, int] = {"api": 0, "files": 0}
+        self._lock = threading.Lock()
+        self._next_revid = 1000
+        self.server: Optional[ThreadingHTTPServer] = None
+        for title, text in (pages or {}).items():
+            self.set_page(title, text)
+        for name, body in (files or {}).items():
+            self.set_file(name, body)
+
+    def set_page(self, title: str, wikitext: str) -> int:
+        with self._lock:
+            self._next_revid += 1
+            self.pages[title] = (self._next_revid, wikitext)
+            return self._next_revid
+
+    def set_file(self, name: str, body: bytes) -> None:
+        with self._lock:
+            self.files[name.lower()] = body
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.hits[kind] += 1
+
+    # --- API responses ---
+
+    def revisions(self, titles: List[str], rvprop: str) -> Dict[str, object]:
+        pages = {}
+        for i, title in enumerate(titles):
+            if title not in self.pages:
+                pages[str(-1 - i)] = {"title": title, "missing": ""}
+                continue
+            revid, text = self.pages[title]
+            revision: Dict[str, object] = {"revid": revid}
+            if "sha1" in rvprop:
+                revision["sha1"] = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            if "content" in rvprop:
+                revision["slots"] = {"main": {"*": text}}
+            pages[str(i + 1)] = {"title": title, "revisions": [revision]}
+        return {"query": {"pages": pages}}
+
+    def imageinfo(self, titles: List[str]) -> Dict[str, object]:
+        pages = {}
+        for i, title in enumerate(titles):
+            name = title.split(":", 1)[-1]
+            body = self.files.get(name.lower())
+            if body is None:
+                pages[str(-1 - i)] = {"title": title, "missing": ""}
+                continue
+            canonical = name[:1].upper() + name[1:]
+            pages[str(i + 1)] = {
+                "title": "File:" + canonical,
+                "imageinfo": [{
+                    "url": self.media_base + FILE_PATH_PREFIX + urllib.parse.quote(canonical),
+                    "sha1": hashlib.sha1(body).hexdigest(),
+                    "size": len(body),
+                    "timestamp": FILE_TIMESTAMP,
+                }],
+            }
+        return {"query": {"pages": pages}}
+
+    # --- server ---
+
+    @property
+    def media_base(self) -> str:
+        if self.server is None:
+            raise RuntimeError("server not started")
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        return self.media_base + API_PATH
+
+    def start(self, host: str = DEFAULT_HOST, port: int = 0) -> "StandInWiki":
+        wiki = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Keep-alive responses go out in one segment; otherwise Nagle plus delayed
+            # ACKs add ~40ms to every request
+            disable_nagle_algorithm = True
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str, extra: Dict[str, str]) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in extra.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                if wiki.latency:
+                    time.sleep(wiki.latency)
+                parsed = urllib.parse.urlsplit(self.path)
+                if parsed.path == API_PATH:
+                    wiki._count("api")
+                    q = dict(urllib.parse.parse_qsl(parsed.query, keep_blank_values=True))
+                    titles = [t for t in q.get("titles", "").split("|") if t]
+                    if q.get("prop") == "revisions":
+                        payload = wiki.revisions(titles, q.get("rvprop", ""))
+                    elif q.get("prop") == "imageinfo":
+                        payload = wiki.imageinfo(titles)
+                    else:
+                        payload = {"error": {"code": "unsupported", "info": parsed.query}}
+                    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                    self._send(200, body, "application/json; charset=utf-8", {})
+                elif parsed.path.startswith(FILE_PATH_PREFIX):
+                    wiki._count("files")
+                    name = urllib.parse.unquote(parsed.path[len(FILE_PATH_PREFIX):])
+                    data = wiki.files.get(name.lower())
+                    if data is None:
+                        self._send(404, b"", "text/plain", {})
+                        return
+                    rng = self.headers.get("Range") or ""
+                    if rng.startswith("bytes=") and rng[6:].split("-")[0].isdigit():
+                        start = int(rng[6:].split("-")[0])
+                        if start >= len(data):
+                            self._send(416, b"", "text/plain", {"Content-Range": f"bytes */{len(data)}"})
+                            return
+                        self._send(206, data[start:], "image/svg+xml", {
+                            "Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}",
+                        })
+                        return
+                    self._send(200, data, "image/svg+xml", {})
+                else:
+                    self._send(404, b"", "text/plain", {})
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="stand-in-wiki", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def load_svg_dir(svg_dir: str) -> Dict[str, bytes]:
+    files: Dict[str, bytes] = {}
+    if os.path.isdir(svg_dir):
+        for name in os.listdir(svg_dir):
+            if name.lower().endswith(".svg"):
+                with open(os.path.join(svg_dir, name), "rb") as f:
+                    files[name] = f.read()
+    return files
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", default=JSON_PATH, help="export to rebuild the page from")
+    parser.add_argument("--svg-dir", default=SVG_DIR, help="SVGs to serve as files")
+    parser.add_argument("--scale", type=int, default=1, help="repeat each letter's rows N times")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    try:
+        with open(args.json, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Failed to load JSON: {e}", file=sys.stderr)
+        return 1
+    files = load_svg_dir(args.svg_dir)
+    if args.scale > 1:
+        files = {
+            scaled_name(name, i): body for name, body in files.items() for i in range(args.scale)
+        }
+    wiki = StandInWiki({TITLE: table_wikitext(data, max(1, args.scale))}, files, args.latency)
+    try:
+        wiki.start(args.host, args.port)
+    except OSError as e:
+        print(f"Failed to start server: {e}", file=sys.stderr)
+        return 1
+    print(f"Serving {TITLE} and {len(files)} files")
+    print(f"  --api-url {wiki.api_url} --media-base {wiki.media_base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        wiki.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = ["fonttools", "brotli"]
+# ///
+"""
+Subset a CJK font to exactly the glyphs the trainer displays, as WOFF2.
+
+Code points are collected from everything the page can put on screen:
+  characters   the char-mode practice set (characters.json)
+  radicals     CANGJIE_KEY_TO_CHAR and the CJK literals in src/js (RADICAL_POOLS, UI text)
+  zili         zili labels in auxiliary_forms.json
+  shuo_ming    the text of each row's explanation
+  page         text in keyExercise.html
+Only CJK code points (ideographs, radicals, CJK and full-width punctuation) are kept.
+
+The subset is not committed and keyExercise.css does not reference it. To serve a
+built subset, declare it with the unicode_range from the report so Latin text stays
+with the system fonts, and add it to the font-family of the CJK elements only
+(#questAlphabet span, #keyboardMap span, #auxPanel), after the system CJK fonts:
+
+  @font-face {
+    font-family: "Cangjie Subset";
+    src: url("experiment/fonts/cjk-subset.woff2") format("woff2");
+    font-display: swap;
+    unicode-range: <unicode_range from fonts/cjk-subset.json>;
+  }
+
+Writes fonts/cjk-subset.woff2 and a usage report, fonts/cjk-subset.json, with the
+count per source, characters the font has no glyph for and the byte sizes. The report
+also stores a digest of the code point set and the source font; when neither changed
+the subset is not rebuilt.
+
+Needs fontTools and brotli (for WOFF2): pip install fonttools brotli
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Set
+
+from export_auxiliary_forms_json import CANGJIE_KEY_TO_CHAR, INLINE_FILE_RE, REF_BLOCK_RE, REF_EMPTY_RE
+
+WORKDIR = os.path.dirname(__file__)
+ROOT = os.path.dirname(WORKDIR)
+JSON_PATH = os.path.join(WORKDIR, "auxiliary_forms.json")
+CHAR_DICT_PATH = os.path.join(WORKDIR, "characters.json")
+HTML_PATH = os.path.join(ROOT, "keyExercise.html")
+JS_DIR = os.path.join(ROOT, "src", "js")
+DEFAULT_OUTPUT = os.path.join(WORKDIR, "fonts", "cjk-subset.woff2")
+
+CJK_RANGES = (
+    (0x2E80, 0x2FDF),  # CJK and Kangxi radicals
+    (0x3000, 0x303F),  # CJK symbols and punctuation
+    (0x3400, 0x4DBF),  # Extension A
+    (0x4E00, 0x9FFF),  # Unified ideographs
+    (0xF900, 0xFAFF),  # Compatibility ideographs
+    (0xFE30, 0xFE4F),  # Compatibility forms
+    (0xFF00, 0xFFEF),  # Half-width and full-width forms
+    (0x20000, 0x3FFFF),  # Extensions B and later
+)
+HTML_TAG_RE = re.compile(r"<[^>]*>")
+
+
+def is_cjk(char: str) -> bool:
+    cp = ord(char)
+    return any(lo <= cp <= hi for lo, hi in CJK_RANGES)
+
+
+def cjk_chars(text: str) -> Set[str]:
+    return {c for c in text if is_cjk(c)}
+
+
+def _read_text(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def _load_json(path: str) -> Optional[object]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def collect_sources() -> Dict[str, Set[str]]:
+    """Source name -> CJK characters it can put on screen."""
+    sources: Dict[str, Set[str]] = {}
+
+    char_dict = _load_json(CHAR_DICT_PATH)
+    sources["characters"] = cjk_chars(char_dict.get("chars", "")) if isinstance(char_dict, dict) else set()
+
+    radicals = cjk_chars("".join(CANGJIE_KEY_TO_CHAR.values()))
+    for path in glob.glob(os.path.join(JS_DIR, "**", "*.js"), recursive=True):
+        radicals |= cjk_chars(_read_text(path))
+    sources["radicals"] = radicals
+
+    zili: Set[str] = set()
+    shuo_ming: Set[str] = set()
+    data = _load_json(JSON_PATH)
+    if not isinstance(data, dict):
+        data = {}
+    for bucket in data.values():
+        zili |= cjk_chars(bucket.get("cangjie_char") or "")
+        for row in bucket.get("rows") or []:
+            for group in row.get("fuzhu_zixing") or []:
+                for z in group.get("zili") or []:
+                    zili |= cjk_chars(z.get("label") or "")
+            text = REF_EMPTY_RE.sub("", REF_BLOCK_RE.sub("", row.get("shuo_ming") or ""))
+            shuo_ming |= cjk_chars(INLINE_FILE_RE.sub("", text))
+    sources["zili"] = zili
+    sources["shuo_ming"] = shuo_ming
+
+    sources["page"] = cjk_chars(HTML_TAG_RE.sub(" ", _read_text(HTML_PATH)))
+    return sources
+
+
+def codepoints_digest(chars: Set[str]) -> str:
+    return hashlib.sha1("".join(sorted(chars)).encode("utf-8")).hexdigest()
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def unicode_range(chars: Set[str]) -> str:
+    """CSS unicode-range for chars, merging consecutive code points."""
+    cps = sorted(ord(c) for c in chars)
+    parts: List[str] = []
+    i = 0
+    while i < len(cps):
+        j = i
+        while j + 1 < len(cps) and cps[j + 1] == cps[j] + 1:
+            j += 1
+        parts.append(f"U+{cps[i]:X}" if i == j else f"U+{cps[i]:X}-{cps[j]:X}")
+        i = j + 1
+    return ", ".join(parts)
+
+
+def subset_font(font_path: str, chars: Set[str], output: str, font_number: int = 0) -> Set[str]:
+    """Write the WOFF2 subset; returns the characters the font has no glyph for."""
+    from fontTools import subset
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.desubroutinize = True
+    options.font_number = font_number
+    font = subset.load_font(font_path, options)
+    try:
+        cmap = font.getBestCmap() or {}
+        missing = {c for c in chars if ord(c) not in cmap}
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=[ord(c) for c in chars if c not in missing])
+        subsetter.subset(font)
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        tmp_path = output + ".tmp"
+        subset.save_font(font, tmp_path, options)
+        os.replace(tmp_path, output)
+    finally:
+        font.close()
+    return missing
+
+
+def report_path_for(output: str) -> str:
+    return os.path.splitext(output)[0] + ".json"
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--font", help="source font (.ttf/.otf/.ttc), e.g. Noto Sans TC")
+    parser.add_argument("--font-number", type=int, default=0, help="face index inside a .ttc collection")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="WOFF2 file to write")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the code points are unchanged")
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="only print the collected code points per source (no font needed)",
+    )
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    sources = collect_sources()
+    chars: Set[str] = set().union(*sources.values())
+    digest = codepoints_digest(chars)
+
+    if args.list:
+        for name, found in sources.items():
+            print(f"{name}: {len(found)}")
+        print(f"total: {len(chars)} code points (sha1 {digest[:12]})")
+        print(unicode_range(chars))
+        return 0
+    if not args.font:
+        print("--font is required to build the subset", file=sys.stderr)
+        return 2
+    try:
+        font_sha1 = file_sha1(args.font)
+    except OSError as e:
+        print(f"Failed to read font: {e}", file=sys.stderr)
+        return 1
+
+    report_path = report_path_for(args.output)
+    previous = _load_json(report_path)
+    if (
+        not args.force
+        and isinstance(previous, dict)
+        and previous.get("codepoints_sha1") == digest
+        and previous.get("font_sha1") == font_sha1
+        and os.path.isfile(args.output)
+    ):
+        print(f"Up to date: {args.output} ({len(chars)} code points unchanged)")
+        return 0
+
+    try:
+        missing = subset_font(args.font, chars, args.output, args.font_number)
+    except ImportError as e:
+        print(f"fontTools with brotli is required: {e}", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"Subsetting failed: {e}", file=sys.stderr)
+        return 1
+
+    report = {
+        "font": os.path.basename(args.font),
+        "font_sha1": font_sha1,
+        "codepoints_sha1": digest,
+        "count": len(chars),
+        "sources": {name: len(found) for name, found in sources.items()},
+        "missing": "".join(sorted(missing)),
+        "bytes": {"font": os.path.getsize(args.font), "woff2": os.path.getsize(args.output)},
+        "unicode_range": unicode_range(chars),
+    }
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    sizes = report["bytes"]
+    print(
+        f"Wrote {args.output}: {len(chars) - len(missing)} of {len(chars)} code points, "
+        f"{sizes['woff2']:,} bytes (font {sizes['font']:,} bytes)"
+    )
+    for name, count in report["sources"].items():
+        print(f"  {name}: {count}")
+    if missing:
+        preview = "".join(sorted(missing)[:20])
+        print(f"Warning: {len(missing)} characters have no glyph in {args.font}: {preview}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
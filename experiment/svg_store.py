@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = []
+# ///
+"""
+Reconcile the SVG directory (輔助字形) with auxiliary_forms.json.
+
+Without options this is a read-only pre-publish check, and reports:
+  missing     files the export references that are not on disk
+  orphans     SVGs on disk that nothing references any more
+  duplicates  byte-identical referenced SVGs stored under different names
+The content hashes are computed on a thread pool (hashlib releases the GIL), so a
+full check of the ~700 files takes a small fraction of a second.
+
+--prune deletes the orphans. --dedup keeps one canonical file per duplicate group,
+deletes the rest and records them in the alias map 輔助字形.aliases.json
+({"alias.svg": "canonical.svg"}, next to the directory like the download manifest).
+Every reader of the directory resolves names through it: the downloader does not
+fetch an alias again while the wiki's copy still matches, and drops the alias once
+the file is stored under its own name again.
+
+Exits 1 when referenced files are missing (or, with --strict, when orphans or
+duplicates remain).
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from download_auxiliary_svgs import (
+    JSON_PATH,
+    OUTPUT_DIR,
+    Manifest,
+    extract_filenames_from_json,
+    file_digest,
+    manifest_path_for,
+    unique_preserving_order,
+)
+from stage_profile import NULL_RECORDER, Recorder, add_profile_arguments, profiling
+
+DEFAULT_HASH_WORKERS = 8
+
+
+def aliases_path_for(svg_dir: str) -> str:
+    return os.path.normpath(svg_dir) + ".aliases.json"
+
+
+def load_aliases(svg_dir: str) -> Dict[str, str]:
+    """alias filename -> canonical filename; {} when no duplicates were collapsed."""
+    try:
+        with open(aliases_path_for(svg_dir), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_aliases(svg_dir: str, aliases: Dict[str, str]) -> None:
+    path = aliases_path_for(svg_dir)
+    if not aliases:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def list_store(svg_dir: str) -> List[str]:
+    try:
+        return sorted(n for n in os.listdir(svg_dir) if n.lower().endswith(".svg"))
+    except OSError:
+        return []
+
+
+def hash_files(svg_dir: str, names: List[str], workers: int = DEFAULT_HASH_WORKERS) -> Dict[str, str]:
+    """name -> sha1 of its content, hashed on a thread pool."""
+    paths = [os.path.join(svg_dir, n) for n in names]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        digests = pool.map(lambda path: file_digest(path)[0], paths)
+        return dict(zip(names, digests))
+
+
+def check_store(
+    references: List[str],
+    svg_dir: str,
+    aliases: Optional[Dict[str, str]] = None,
+    workers: int = DEFAULT_HASH_WORKERS,
+) -> Dict[str, object]:
+    """Compare referenced names with the directory.
+
+    Returns {"missing": [...], "orphans": [...], "duplicates": {canonical: [names]},
+    "hashes": {name: sha1}}. Aliased names count as present when their canonical file
+    is; duplicate groups only cover referenced files, with the first referenced name
+    of each group as canonical.
+    """
+    aliases = aliases or {}
+    on_disk = set(list_store(svg_dir))
+    referenced = set(references)
+    missing = [n for n in references if n not in on_disk and aliases.get(n) not in on_disk]
+    orphans = sorted(on_disk - referenced - set(aliases.values()))
+
+    present = [n for n in references if n in on_disk]
+    hashes = hash_files(svg_dir, present, workers)
+    groups: Dict[str, List[str]] = {}
+    for name in present:
+        groups.setdefault(hashes[name], []).append(name)
+    duplicates = {names[0]: names[1:] for names in groups.values() if len(names) > 1}
+    return {"missing": missing, "orphans": orphans, "duplicates": duplicates, "hashes": hashes}
+
+
+def prune_orphans(svg_dir: str, orphans: List[str], manifest: Manifest) -> int:
+    removed = 0
+    for name in orphans:
+        try:
+            os.remove(os.path.join(svg_dir, name))
+        except OSError:
+            continue
+        manifest.entries.pop(name, None)
+        removed += 1
+    return removed
+
+
+def collapse_duplicates(
+    svg_dir: str,
+    duplicates: Dict[str, List[str]],
+    hashes: Dict[str, str],
+    aliases: Dict[str, str],
+    manifest: Manifest,
+) -> int:
+    """Delete every non-canonical copy and point it at its canonical file."""
+    collapsed = 0
+    for canonical, others in duplicates.items():
+        for name in others:
+            path = os.path.join(svg_dir, name)
+            size = os.path.getsize(path)
+            os.remove(path)
+            aliases[name] = canonical
+            entry = manifest.entries.setdefault(name, {"sha1": hashes[name], "size": size})
+            entry["alias_of"] = canonical
+            collapsed += 1
+    return collapsed
+
+
+def drop_restored_aliases(svg_dir: str) -> List[str]:
+    """Forget aliases whose file has been stored under its own name again."""
+    aliases = load_aliases(svg_dir)
+    restored = [n for n in aliases if os.path.exists(os.path.join(svg_dir, n))]
+    if restored:
+        for name in restored:
+            del aliases[name]
+        save_aliases(svg_dir, aliases)
+    return restored
+
+
+def _preview(names: List[str]) -> str:
+    suffix = "..." if len(names) > 5 else ""
+    return ", ".join(names[:5]) + suffix
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    return parser.parse_args(argv[1:])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--json", default=JSON_PATH, help="auxiliary_forms.json to read")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="directory holding the SVGs")
+    parser.add_argument("--prune", action="store_true", help="delete SVGs nothing references")
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="keep one file per identical-content group and record the rest as aliases",
+    )
+    parser.add_argument("--strict", action="store_true", help="also fail on orphans and duplicates")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_HASH_WORKERS,
+        help="threads used to hash files",
+    )
+    add_profile_arguments(parser)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    with profiling(args, "gc") as recorder:
+        return run(args, recorder)
+
+
+def run(args: argparse.Namespace, recorder: Recorder = NULL_RECORDER) -> int:
+    started = time.perf_counter()
+    try:
+        with recorder.stage("load_json"):
+            with open(args.json, "r", encoding="utf-8") as f:
+                data = json.load(f)
+    except Exception as e:
+        print(f"Failed to load JSON: {e}", file=sys.stderr)
+        return 1
+    references = unique_preserving_order(extract_filenames_from_json(data))
+    aliases = load_aliases(args.output_dir)
+    with recorder.stage("check") as extra:
+        report = check_store(references, args.output_dir, aliases, args.workers)
+        extra.update(
+            files=len(references),
+            missing=len(report["missing"]),
+            orphans=len(report["orphans"]),
+            duplicates=sum(len(v) for v in report["duplicates"].values()),
+        )
+
+    missing: List[str] = report["missing"]
+    orphans: List[str] = report["orphans"]
+    duplicates: Dict[str, List[str]] = report["duplicates"]
+    print(
+        f"Checked {len(references)} references against {args.output_dir} "
+        f"({len(aliases)} alias(es)) in {time.perf_counter() - started:.3f}s"
+    )
+    if missing:
+        print(f"  missing: {len(missing)} ({_preview(missing)})", file=sys.stderr)
+    if orphans:
+        print(f"  orphans: {len(orphans)} ({_preview(orphans)})")
+    for canonical, others in duplicates.items():
+        print(f"  duplicate of {canonical}: {', '.join(others)}")
+
+    if args.prune or args.dedup:
+        manifest = Manifest.load(manifest_path_for(args.output_dir))
+        with recorder.stage("gc") as extra:
+            pruned = prune_orphans(args.output_dir, orphans, manifest) if args.prune else 0
+            collapsed = 0
+            if args.dedup:
+                collapsed = collapse_duplicates(
+                    args.output_dir, duplicates, report["hashes"], aliases, manifest
+                )
+                save_aliases(args.output_dir, aliases)
+            manifest.save()
+            extra.update(pruned=pruned, collapsed=collapsed)
+        print(f"Removed {pruned} orphan(s); collapsed {collapsed} duplicate(s) into aliases")
+        if args.prune:
+            orphans = []
+        if args.dedup:
+            duplicates = {}
+
+    if missing or (args.strict and (orphans or duplicates)):
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = [
+#   "aiohttp",
+#   "requests",
+#   "wikitextparser",
+# ]
+# ///
+"""
+Keep the export and the SVG directory in step with the wiki as a long-running process.
+
+Instead of re-running export and download from cron, one process holds a keep-alive
+connection pool and polls:
+  page   every --interval seconds, the latest revision id of 倉頡輸入法/輔助字形
+         (prop=revisions, rvprop=ids|sha1: one small request). A new revision runs
+         what `cli.py sync` does: export, then download only the files of the rows the
+         change feed lists, then shards.
+  files  every --file-interval seconds, prop=imageinfo sha1s of every SVG the export
+         references, 50 per request, compared with the download manifest. Only the
+         files whose sha1 moved are downloaded again. Most of the files live on
+         Commons, whose uploads never appear in the local wiki's recentchanges, so
+         imageinfo is polled rather than the change list.
+A failed poll backs off exponentially, up to --max-interval, and the next success
+resets the delay. All writes go through the exporter's and downloader's temp-file
+and rename paths, so readers never see a partial file.
+
+GET /status on --status-port returns JSON with the state, last poll and last sync
+times, the current revision, the latest error and the per-stage durations of the last
+sync. Point --api-url/--media-base at stand_in_wiki.py to try it locally:
+
+  python3 stand_in_wiki.py --port 8766 &
+  python3 watch_wiki.py --api-url http://127.0.0.1:8766/w/api.php \\
+      --media-base http://127.0.0.1:8766 --interval 5
+  curl http://127.0.0.1:8767/status
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from stage_profile import NULL_RECORDER, Recorder, profiling
+
+if TYPE_CHECKING:
+    from requests.adapters import HTTPAdapter
+
+DEFAULT_INTERVAL = 60.0
+DEFAULT_FILE_INTERVAL = 1800.0
+DEFAULT_MAX_INTERVAL = 1800.0
+DEFAULT_STATUS_HOST = "127.0.0.1"
+DEFAULT_STATUS_PORT = 8767
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+class StatusRecorder(Recorder):
+    """Recorder that keeps the stage records of the current sync for /status and
+    forwards every record to `inner` (the --profile recorder)."""
+
+    def __init__(self, inner: Recorder = NULL_RECORDER) -> None:
+        super().__init__(None, "watch")
+        self.enabled = True
+        self.inner = inner
+        self.stages: List[Dict[str, object]] = []
+
+    def emit(self, record: Dict[str, object]) -> None:
+        if record.get("type") == "stage":
+            kept = {k: v for k, v in record.items() if k not in ("maxrss_kib", "peak_kib")}
+            with self._lock:
+                self.stages.append(kept)
+        self.inner.emit(record)
+
+    def take_stages(self) -> List[Dict[str, object]]:
+        with self._lock:
+            stages, self.stages = self.stages, []
+        return stages
+
+
+class Watcher:
+    """Poll loop state; tick() runs one round, status() is safe from other threads."""
+
+    def __init__(
+        self,
+        args: argparse.Namespace,
+        recorder: StatusRecorder,
+        pool: "HTTPAdapter",
+    ) -> None:
+        from wiki_common import new_session
+
+        self.args = args
+        self.recorder = recorder
+        self.pool = pool
+        # Polls run on the watch thread; syncs give their workers Sessions of their own
+        self.session = new_session(pool=pool)
+        self.revid: Optional[int] = None
+        self.next_page_poll = 0.0
+        self.next_file_poll = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._status: Dict[str, object] = {
+            "state": "starting",
+            "started": time.time(),
+            "polls": 0,
+            "syncs": 0,
+            "failures": 0,
+            "revid": None,
+            "files": None,
+            "last_poll": None,
+            "last_page_poll": None,
+            "last_file_poll": None,
+            "poll_seconds": {},
+            "last_sync": None,
+            "last_error": None,
+            "next_poll": None,
+        }
+
+    def _set(self, **fields: object) -> None:
+        with self._lock:
+            self._status.update(fields)
+
+    def status(self) -> Dict[str, object]:
+        with self._lock:
+            status = dict(self._status)
+        for key in ("started", "last_poll", "last_page_poll", "last_file_poll", "next_poll"):
+            status[key] = _iso(status[key])
+        if status["last_error"]:
+            status["last_error"] = {**status["last_error"], "at": _iso(status["last_error"]["at"])}
+        if status["last_sync"]:
+            status["last_sync"] = {**status["last_sync"], "at": _iso(status["last_sync"]["at"])}
+        status["now"] = _iso(time.time())
+        status["interval"] = self.args.interval
+        status["file_interval"] = self.args.file_interval
+        return status
+
+    # --- polling ---
+
+    def poll_page(self) -> Optional[int]:
+        """Latest revision id when it differs from the one exported, else None."""
+        from export_auxiliary_forms_json import TITLE, fetch_latest_revision_id
+
+        with self.recorder.stage("poll", target="page"):
+            revid, _ = fetch_latest_revision_id(TITLE, self.args.api_url, self.session)
+        self._set(last_page_poll=time.time())
+        if revid == self.revid and os.path.isfile(self.args.output):
+            return None
+        return revid
+
+    def poll_files(self) -> List[str]:
+        """Referenced SVGs whose wiki sha1 no longer matches the download manifest."""
+        from download_auxiliary_svgs import (
+            HEADERS,
+            Manifest,
+            RetryPolicy,
+            extract_filenames_from_json,
+            get_with_retries,
+            imageinfo_params,
+            iter_batches,
+            manifest_path_for,
+            parse_imageinfo_pages,
+            unique_preserving_order,
+        )
+        from export_auxiliary_forms_json import load_output
+
+        data = load_output(self.args.output)
+        if data is None:
+            return []
+        names = unique_preserving_order(extract_filenames_from_json(data))
+        manifest = Manifest.load(manifest_path_for(self.args.svg_dir))
+        policy = RetryPolicy(max_attempts=max(1, self.args.retries), base_delay=self.args.backoff)
+        changed: List[str] = []
+        with self.recorder.stage("poll", target="files") as extra:
+            for batch in iter_batches(names, max(1, self.args.batch_size)):
+                with get_with_retries(
+                    self.session,
+                    self.args.api_url,
+                    policy,
+                    params=imageinfo_params(batch),
+                    headers=HEADERS,
+                    timeout=30,
+                ) as resp:
+                    infos = parse_imageinfo_pages(batch, resp.json())
+                for name, info in infos.items():
+                    if info is None:
+                        continue  # no URL: the next full sync reports it as missing
+                    entry = manifest.get(name)
+                    present = os.path.exists(os.path.join(self.args.svg_dir, name)) or bool(
+                        entry and entry.get("alias_of")
+                    )
+                    if not entry or entry.get("sha1") != info.get("sha1") or not present:
+                        changed.append(name)
+            extra.update(files=len(names), changed=len(changed))
+        self._set(last_file_poll=time.time(), files=len(names))
+        return changed
+
+    # --- syncing ---
+
+    def sync_page(self) -> int:
+        from cli import cmd_sync
+        from export_auxiliary_forms_json import TITLE, load_cache
+
+        rc = cmd_sync(self.args, self.recorder, self.pool)
+        cached = load_cache(self.args.cache_dir, TITLE)
+        if rc == 0 and cached is not None:
+            self.revid = int(cached.get("revid") or 0)
+            self._set(revid=self.revid)
+        return rc
+
+    def sync_changed_files(self, names: List[str]) -> int:
+        import download_auxiliary_svgs as downloader
+        import export_auxiliary_forms_json as exporter
+
+        data = exporter.load_output(self.args.output)
+        if data is None:
+            return 1
+        download_args = argparse.Namespace(**{**vars(self.args), "output_dir": self.args.svg_dir})
+        rc = downloader.sync_files(data, download_args, self.recorder, self.pool, names=names)
+        if rc == 0 and self.args.shard_dir:
+            # Intrinsic SVG sizes in the shards may have changed with the files
+            with self.recorder.stage("write", target="shards") as extra:
+                extra["files"] = exporter.write_shards(data, self.args.shard_dir, self.args.svg_dir)
+        return rc
+
+    def _run_sync(self, reason: str, action) -> int:
+        self._set(state="syncing")
+        self.recorder.take_stages()
+        started = time.perf_counter()
+        rc = action()
+        stages = self.recorder.take_stages()
+        now = time.time()
+        with self._lock:
+            self._status["syncs"] += 1
+            self._status["last_sync"] = {
+                "at": now,
+                "reason": reason,
+                "rc": rc,
+                "seconds": round(time.perf_counter() - started, 3),
+                "stages": stages,
+            }
+        print(f"[watch] {reason}: sync finished with {rc} in {time.perf_counter() - started:.2f}s")
+        return rc
+
+    def tick(self) -> None:
+        """Run the polls that are due and sync what changed; raises on poll errors."""
+        now = time.monotonic()
+        if now >= self.next_page_poll:
+            revid = self.poll_page()
+            if revid is not None:
+                reason = "startup" if self.revid is None else f"revision {self.revid} -> {revid}"
+                if self._run_sync(reason, self.sync_page) != 0:
+                    raise RuntimeError(f"sync after {reason} failed")
+            self.next_page_poll = now + self.args.interval
+        if now >= self.next_file_poll:
+            changed = self.poll_files()
+            if changed:
+                reason = f"{len(changed)} file(s) changed"
+                if self._run_sync(reason, lambda: self.sync_changed_files(changed)) != 0:
+                    raise RuntimeError(f"sync of {reason} failed")
+            self.next_file_poll = now + self.args.file_interval
+
+    def next_delay(self) -> float:
+        """Seconds until the next due poll, or the backoff delay after failures."""
+        if self.failures:
+            delay = min(self.args.max_interval, self.args.interval * 2 ** self.failures)
+            return delay * random.uniform(0.8, 1.0)
+        due = min(self.next_page_poll, self.next_file_poll)
+        return max(0.0, due - time.monotonic())
+
+    def run(self, stop: threading.Event, max_polls: Optional[int] = None) -> None:
+        polls = 0
+        while not stop.is_set():
+            try:
+                self.tick()
+                self.failures = 0
+                self._set(state="idle", failures=0)
+            except Exception as exc:  # network and API errors vary by transport
+                self.failures += 1
+                self.recorder.take_stages()
+                self._set(
+                    state="backoff",
+                    failures=self.failures,
+                    last_error={"at": time.time(), "message": str(exc)},
+                )
+                print(f"[watch] poll failed ({self.failures} in a row): {exc}", file=sys.stderr)
+            polls += 1
+            # Whatever is left are this round's poll stages; keep only their times
+            poll_seconds = {
+                str(stage.get("target")): stage["seconds"]
+                for stage in self.recorder.take_stages()
+                if stage.get("name") == "poll"
+            }
+            delay = self.next_delay()
+            with self._lock:
+                if poll_seconds:
+                    self._status["poll_seconds"] = {**self._status["poll_seconds"], **poll_seconds}
+                self._status["polls"] += 1
+                self._status["last_poll"] = time.time()
+                self._status["next_poll"] = time.time() + delay
+            if max_polls is not None and polls >= max_polls:
+                break
+            stop.wait(delay)
+
+
+def start_status_server(watcher: Watcher, host: str, port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] not in ("/", "/status"):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = json.dumps(watcher.status(), ensure_ascii=False, indent=2).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="watch-status", daemon=True).start()
+    return server
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    import download_auxiliary_svgs as downloader
+    import export_auxiliary_forms_json as exporter
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    exporter.add_arguments(parser)
+    downloader.add_transfer_arguments(parser)
+    add_arguments(parser)
+    return parser.parse_args(argv[1:])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Polling options; the export and transfer options come from the other scripts."""
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="seconds between page revision checks",
+    )
+    parser.add_argument(
+        "--file-interval",
+        type=float,
+        default=DEFAULT_FILE_INTERVAL,
+        help="seconds between imageinfo checks of every referenced SVG",
+    )
+    parser.add_argument(
+        "--max-interval",
+        type=float,
+        default=DEFAULT_MAX_INTERVAL,
+        help="cap on the backoff delay after failed polls",
+    )
+    parser.add_argument("--status-host", default=DEFAULT_STATUS_HOST)
+    parser.add_argument(
+        "--status-port",
+        type=int,
+        default=DEFAULT_STATUS_PORT,
+        help="port for GET /status (0 picks a free one, -1 disables it)",
+    )
+    parser.add_argument(
+        "--max-polls",
+        type=int,
+        default=None,
+        help="exit after this many poll rounds (for tests and one-off runs)",
+    )
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    with profiling(args, "watch") as recorder:
+        return run(args, recorder)
+
+
+def run(args: argparse.Namespace, recorder: Recorder = NULL_RECORDER) -> int:
+    from wiki_common import new_pool
+
+    unsupported = [
+        flag
+        for flag, value in (
+            ("--offline", args.offline),
+            ("--dump", args.dump),
+            ("--from-json", args.from_json),
+            ("--compare-parse", args.compare_parse),
+            ("--async", args.use_async),
+        )
+        if value
+    ]
+    if unsupported:
+        print(f"watch polls the live API; {', '.join(unsupported)} cannot be used", file=sys.stderr)
+        return 2
+    if args.interval <= 0 or args.file_interval <= 0:
+        print("--interval and --file-interval must be positive", file=sys.stderr)
+        return 2
+
+    pool = new_pool(max(args.workers, args.api_workers) + 1)
+    watcher = Watcher(args, StatusRecorder(recorder), pool)
+    server = None
+    if args.status_port >= 0:
+        try:
+            server = start_status_server(watcher, args.status_host, args.status_port)
+        except OSError as e:
+            print(f"Failed to start status server: {e}", file=sys.stderr)
+            pool.close()
+            return 1
+        host, port = server.server_address[:2]
+        print(f"[watch] status on http://{host}:{port}/status")
+
+    stop = threading.Event()
+
+    def request_stop(signum: int, frame: object) -> None:
+        stop.set()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, request_stop)
+    try:
+        watcher.run(stop, args.max_polls)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        pool.close()
+    return 0 if watcher.failures == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = ["requests"]
+# ///
+"""
+Record wiki API responses and media files into a cassette directory and replay them.
+
+Both modes run a local stand-in HTTP server. Point the experiment scripts at it with
+--api-url http://127.0.0.1:PORT/w/api.php and (downloader) --media-base
+http://127.0.0.1:PORT:
+
+  record  proxies each request to the real wiki (paths under /w/) or the media host
+          (everything else), stores the response, and serves it; requests already in
+          the cassette are answered from it without touching the network.
+  replay  serves only from the cassette; unknown requests get a 404, so the
+          export+download pipeline runs hermetically.
+
+A request is keyed by method, path and its decoded, sorted query parameters.
+Each entry is <sha1>.json (status, headers, request) plus <sha1>.body. Range
+requests are answered from the stored full body, so resume paths can be exercised
+offline too.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from wiki_common import HEADERS
+
+WORKDIR = os.path.dirname(__file__)
+DEFAULT_CASSETTE_DIR = os.path.join(WORKDIR, ".cache", "cassette")
+DEFAULT_API_UPSTREAM = "https://zh.wikibooks.org"
+DEFAULT_MEDIA_UPSTREAM = "https://upload.wikimedia.org"
+API_PATH_PREFIX = "/w/"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Response headers worth replaying; hop-by-hop and length headers are recomputed
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+# Transient upstream failures are passed through but never recorded
+UNRECORDED_STATUSES = {429, 500, 502, 503, 504}
+
+Entry = Dict[str, object]
+
+
+def request_key(method: str, path: str, query: str) -> str:
+    pairs = sorted(urllib.parse.parse_qsl(query, keep_blank_values=True))
+    canonical = f"{method.upper()} {urllib.parse.unquote(path)}?{urllib.parse.urlencode(pairs)}"
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return an inclusive (start, end) for a single "bytes=" range, or None for all.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[6:].partition("-")
+    if not start_text:
+        # Suffix range: the last N bytes
+        length = int(end_text)
+        return max(0, size - length), size - 1
+    start = int(start_text)
+    end = int(end_text) if end_text else size - 1
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class Cassette:
+    """Directory of recorded responses; safe to share between handler threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        return os.path.join(self.path, key + ".json"), os.path.join(self.path, key + ".body")
+
+    def load(self, key: str) -> Optional[Tuple[Entry, bytes]]:
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+    def store(self, key: str, meta: Entry, body: bytes) -> None:
+        meta_path, body_path = self._paths(key)
+        with self._lock:
+            # Body first: an entry is only visible once its .json exists
+            for path, payload in (
+                (body_path, body),
+                (meta_path, json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8")),
+            ):
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return sum(1 for name in os.listdir(self.path) if name.endswith(".json"))
+
+
+def fetch_upstream(url: str) -> Tuple[int, Dict[str, str], bytes]:
+    import requests
+
+    resp = requests.get(url, headers=HEADERS, timeout=60)
+    headers = {k: resp.headers[k] for k in KEPT_HEADERS if k in resp.headers}
+    return resp.status_code, headers, resp.content
+
+
+def make_handler(
+    cassette: Cassette,
+    mode: str,
+    api_upstream: str = DEFAULT_API_UPSTREAM,
+    media_upstream: str = DEFAULT_MEDIA_UPSTREAM,
+    stats: Optional[Dict[str, int]] = None,
+) -> type:
+    stats = stats if stats is not None else {}
+    stats_lock = threading.Lock()
+
+    def count(name: str) -> None:
+        with stats_lock:
+            stats[name] = stats.get(name, 0) + 1
+
+    class CassetteHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Keep-alive responses go out in one segment; otherwise Nagle plus delayed
+        # ACKs add ~40ms to every request
+        disable_nagle_algorithm = True
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+        def _send(self, status: int, headers: Dict[str, str], body: bytes, head_only: bool) -> None:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not head_only:
+                self.wfile.write(body)
+
+        def _serve(self, head_only: bool) -> None:
+            parsed = urllib.parse.urlsplit(self.path)
+            key = request_key("GET", parsed.path, parsed.query)
+            entry = cassette.load(key)
+            if entry is None and mode == "record":
+                base = api_upstream if parsed.path.startswith(API_PATH_PREFIX) else media_upstream
+                url = base.rstrip("/") + self.path
+                try:
+                    status, headers, body = fetch_upstream(url)
+                except Exception as e:
+                    count("upstream_errors")
+                    self._send(502, {"Content-Type": "text/plain"}, str(e).encode("utf-8"), head_only)
+                    return
+                if status in UNRECORDED_STATUSES:
+                    count("passed_through")
+                    self._send(status, headers, body, head_only)
+                    return
+                meta: Entry = {
+                    "request": {"method": "GET", "path": parsed.path, "query": parsed.query},
+                    "status": status,
+                    "headers": headers,
+                }
+                cassette.store(key, meta, body)
+                count("recorded")
+                entry = (meta, body)
+            elif entry is not None:
+                count("replayed")
+            if entry is None:
+                count("misses")
+                print(f"Cassette miss: {self.path}", file=sys.stderr)
+                payload = json.dumps(
+                    {"error": {"code": "cassette-miss", "info": self.path}}
+                ).encode("utf-8")
+                self._send(404, {"Content-Type": "application/json"}, payload, head_only)
+                return
+
+            meta, body = entry
+            status = int(meta.get("status", 200))
+            headers = dict(meta.get("headers") or {})
+            if status == 200:
+                headers["Accept-Ranges"] = "bytes"
+                try:
+                    byte_range = parse_range(self.headers.get("Range"), len(body))
+                except ValueError:
+                    self._send(416, {"Content-Range": f"bytes */{len(body)}"}, b"", head_only)
+                    return
+                if byte_range is not None:
+                    start, end = byte_range
+                    headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+                    self._send(206, headers, body[start:end + 1], head_only)
+                    return
+            self._send(status, headers, body, head_only)
+
+        def do_GET(self) -> None:
+            self._serve(head_only=False)
+
+        def do_HEAD(self) -> None:
+            self._serve(head_only=True)
+
+    return CassetteHandler
+
+
+def start_server(
+    cassette_dir: str = DEFAULT_CASSETTE_DIR,
+    mode: str = "replay",
+    host: str = DEFAULT_HOST,
+    port: int = 0,
+    api_upstream: str = DEFAULT_API_UPSTREAM,
+    media_upstream: str = DEFAULT_MEDIA_UPSTREAM,
+) -> Tuple[ThreadingHTTPServer, Dict[str, int]]:
+    """Start a cassette server on a background thread; port 0 picks a free one.
+
+    Returns (server, stats); call server.shutdown() when done.
+    """
+    stats: Dict[str, int] = {}
+    handler = make_handler(Cassette(cassette_dir), mode, api_upstream, media_upstream, stats)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="cassette-server", daemon=True).start()
+    return server, stats
+
+
+def server_urls(server: ThreadingHTTPServer) -> Tuple[str, str]:
+    """(api_url, media_base) to pass to the experiment scripts."""
+    host, port = server.server_address[:2]
+    base = f"http://{host}:{port}"
+    return base + API_PATH_PREFIX + "api.php", base
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE_DIR, help="cassette directory")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--api-upstream", default=DEFAULT_API_UPSTREAM, help="origin for /w/ paths")
+    parser.add_argument("--media-upstream", default=DEFAULT_MEDIA_UPSTREAM, help="origin for file paths")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    try:
+        server, stats = start_server(
+            args.cassette, args.mode, args.host, args.port, args.api_upstream, args.media_upstream
+        )
+    except OSError as e:
+        print(f"Failed to start server: {e}", file=sys.stderr)
+        return 1
+    api_url, media_base = server_urls(server)
+    print(f"{args.mode.capitalize()}ing {args.cassette} ({len(Cassette(args.cassette))} entries)")
+    print(f"  --api-url {api_url} --media-base {media_base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print(", ".join(f"{k}: {v}" for k, v in sorted(stats.items())) or "No requests served")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,50 @@
+"""
+Settings shared by the scripts that talk to the wiki: endpoint, User-Agent, file
+namespace aliases and HTTP session setup.
+
+Only the standard library is imported here; requests is loaded when a session is made.
+"""
+
+import re
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+API_URL = "https://zh.wikibooks.org/w/api.php"
+
+USER_AGENT = "cangjie-learner/0.1 (+https://github.com/; contact: local-script)"
+HEADERS = {"User-Agent": USER_AGENT}
+
+# Namespace prefixes zh.wikibooks accepts for file links: [[File:x.svg]], [[圖像:x.svg]], ...
+FILE_NAMESPACES = ("File", "Image", "檔案", "文件", "圖像", "圖片")
+FILE_NAMESPACE_PATTERN = "(?:" + "|".join(re.escape(ns) for ns in FILE_NAMESPACES) + ")"
+
+
+def new_pool(pool_size: int = 10) -> "HTTPAdapter":
+    """A connection pool with `pool_size` keep-alive connections per host.
+
+    The urllib3 pool behind it is thread-safe, so concurrent workers share one by
+    mounting it on Sessions of their own (see new_session). Close it when done.
+    """
+    from requests.adapters import HTTPAdapter
+
+    return HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+
+
+def new_session(pool_size: int = 10, pool: Optional["HTTPAdapter"] = None) -> "requests.Session":
+    """A requests.Session with the project User-Agent, mounted on `pool` or on a new
+    pool of `pool_size` connections per host.
+
+    A Session is not thread-safe: give each thread its own and share the pool.
+    Closing a Session closes its pool too.
+    """
+    import requests
+
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = pool if pool is not None else new_pool(pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.9"
+# dependencies = []
+# ///
+"""
+Pull pages out of a MediaWiki XML dump (pages-articles), plain, .bz2 or .gz.
+
+The dump is stream-parsed with ElementTree.iterparse: each <page> is read, handed
+over when its title is wanted and then cleared from the tree, so memory stays flat
+however large the dump is, and the scan stops as soon as every requested page has
+been seen. Used by the exporters' --dump mode for air-gapped builds; run directly to
+print a page's wikitext:
+
+  python3 wiki_dump.py zhwikibooks-latest-pages-articles.xml.bz2 "倉頡輸入法/輔助字形"
+"""
+
+import argparse
+import bz2
+import gzip
+import sys
+import xml.etree.ElementTree as ET
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+
+Page = Dict[str, object]
+
+
+def open_dump(path: str) -> IO[bytes]:
+    """Binary stream over the dump, decompressing .bz2 (multistream too) and .gz on the fly."""
+    lowered = path.lower()
+    if lowered.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if lowered.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def normalize_title(title: str) -> str:
+    """Title as MediaWiki stores it: underscores as spaces, first letter upper-cased."""
+    title = " ".join(title.replace("_", " ").split())
+    return title[:1].upper() + title[1:]
+
+
+def _local(tag: str) -> str:
+    # Dump elements live in the export-0.x namespace: "{http://...}page" -> "page"
+    return tag.rpartition("}")[2]
+
+
+def _read_page(elem: ET.Element) -> Page:
+    page: Page = {"title": "", "ns": 0, "revid": 0, "sha1": None, "wikitext": ""}
+    for child in elem:
+        name = _local(child.tag)
+        if name == "title":
+            page["title"] = child.text or ""
+        elif name == "ns":
+            page["ns"] = int(child.text or 0)
+        elif name == "revision":
+            # Full-history dumps list revisions oldest first; keep the latest
+            for field in child:
+                field_name = _local(field.tag)
+                if field_name == "id":
+                    page["revid"] = int(field.text or 0)
+                elif field_name == "sha1":
+                    page["sha1"] = field.text
+                elif field_name == "text":
+                    page["wikitext"] = field.text or ""
+    return page
+
+
+def iter_pages(stream: IO[bytes], titles: Optional[Iterable[str]] = None) -> Iterator[Page]:
+    """Yield {"title", "ns", "revid", "sha1", "wikitext"} for each page (only the
+    given titles when set), in dump order."""
+    wanted = {normalize_title(t) for t in titles} if titles is not None else None
+    root: Optional[ET.Element] = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if root is None:
+            root = elem
+            continue
+        if event != "end" or _local(elem.tag) != "page":
+            continue
+        title = ""
+        for child in elem:
+            if _local(child.tag) == "title":
+                title = child.text or ""
+                break
+        page = _read_page(elem) if wanted is None or title in wanted else None
+        # Drop the finished page (and anything before it) so the tree never grows
+        root.clear()
+        if page is not None:
+            yield page
+
+
+def find_pages(path: str, titles: List[str]) -> Dict[str, Page]:
+    """{requested title: page} for the titles present in the dump; stops reading once
+    all of them were found."""
+    by_normalized = {normalize_title(t): t for t in titles}
+    found: Dict[str, Page] = {}
+    with open_dump(path) as stream:
+        for page in iter_pages(stream, by_normalized):
+            found[by_normalized[str(page["title"])]] = page
+            if len(found) == len(by_normalized):
+                break
+    return found
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("dump", help="pages-articles XML dump (.xml, .xml.bz2 or .xml.gz)")
+    parser.add_argument("title", help="page title to print")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    try:
+        page = find_pages(args.dump, [args.title]).get(args.title)
+    except (OSError, EOFError, ET.ParseError) as e:
+        print(f"Failed to read dump: {e}", file=sys.stderr)
+        return 1
+    if page is None:
+        print(f"No page {args.title} in {args.dump}", file=sys.stderr)
+        return 1
+    print(f"# revision {page['revid']}", file=sys.stderr)
+    sys.stdout.write(str(page["wikitext"]))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
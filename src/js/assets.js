@@ -0,0 +1,54 @@
+// Asset resolver: maps logical paths to content-addressed files written by
+// experiment/publish_assets.py. Without a published manifest every path
+// resolves to itself.
+
+import { ASSET_DIST_PATH, ASSET_MANIFEST } from "./constants.js";
+
+let assets = null;
+let loading = null;
+
+/**
+ * loadAssetManifest
+ * Fetch dist/manifest.json once; always revalidated since it is the only
+ * mutable file. Resolves to the asset map ({} when nothing is published).
+ * @returns {Promise<Object<string, string>>}
+ */
+export function loadAssetManifest() {
+  if (assets) return Promise.resolve(assets);
+  if (!loading) {
+    loading = fetch(ASSET_DIST_PATH + ASSET_MANIFEST, { cache: "no-cache" })
+      .then(function (res) {
+        return res.ok ? res.json() : {};
+      })
+      .catch(function () {
+        return {};
+      })
+      .then(function (manifest) {
+        assets = (manifest && manifest.assets) || {};
+        return assets;
+      });
+  }
+  return loading;
+}
+
+/**
+ * assetUrl
+ * @param {string} path - logical path, e.g. "experiment/auxiliary_forms/A.json"
+ * @returns {string} hashed URL when published, else path unchanged
+ */
+export function assetUrl(path) {
+  const hashed = assets && assets[path];
+  return hashed ? ASSET_DIST_PATH + hashed : path;
+}
+
+/**
+ * fetchAsset
+ * Hashed URLs never change content so the HTTP cache can be trusted outright;
+ * unpublished paths are revalidated so edits show up.
+ * @param {string} path
+ * @returns {Promise<Response>}
+ */
+export function fetchAsset(path) {
+  const published = !!(assets && assets[path]);
+  return fetch(assetUrl(path), { cache: published ? "force-cache" : "no-cache" });
+}
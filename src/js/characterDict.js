@@ -0,0 +1,48 @@
+// Char-mode practice set written by experiment/build_char_dict.py. The file is
+// fetched once on startup instead of being inlined into the page.
+
+import { CHAR_DICT_PATH } from "./constants.js";
+import { fetchAsset } from "./assets.js";
+
+/**
+ * decodeCharacterDict
+ * Unpack {chars, codes, prefixes}: codes are concatenated with each first
+ * letter upper-cased, in the same order as chars.
+ * @param {Object} data - parsed characters.json
+ * @returns {{entries: string[], prefixes: Object<string, number[]>}}
+ *   entries are "字code" strings (e.g. "日a"), sorted by code
+ */
+export function decodeCharacterDict(data) {
+  const chars = Array.from((data && data.chars) || "");
+  const codes = (data && data.codes) || "";
+  const entries = [];
+  let start = 0;
+  for (let i = 1; i <= codes.length; i++) {
+    // Upper-case letters (char code < 97) start the next code
+    if (i === codes.length || codes.charCodeAt(i) < 97) {
+      const code = codes.slice(start, i).toLowerCase();
+      entries.push(chars[entries.length] + code);
+      start = i;
+    }
+  }
+  return {
+    entries: entries.slice(0, chars.length),
+    prefixes: (data && data.prefixes) || {},
+  };
+}
+
+/**
+ * loadCharacterDict
+ * @returns {Promise<{entries: string[], prefixes: Object}|null>} null when
+ *   the file is missing or unreadable
+ */
+export async function loadCharacterDict() {
+  try {
+    const res = await fetchAsset(CHAR_DICT_PATH);
+    if (!res.ok) return null;
+    const dict = decodeCharacterDict(await res.json());
+    return dict.entries.length ? dict : null;
+  } catch (e) {
+    return null;
+  }
+}
@@ -19,7 +19,6 @@ export const SELECTORS = {
   questAlphabet: "#questAlphabet",
   auxPanel: "#auxPanel",
   inputBar: "#inputBar",
-  characterList: "#character",
   modeSelect: "#modeSelect",
   categorySelect: "#categorySelect",
   toggleLayout: "#toggleLayout",
@@ -37,7 +36,28 @@ export const TIMINGS = {
 
 // Aux data locations
 export const AUX_BASE_PATH = "experiment/輔助字形/";
-export const AUX_JSON_PATH = "experiment/auxiliary_forms.json";
+// Duplicate SVGs collapsed by experiment/svg_store.py: {alias: canonical}
+export const AUX_ALIAS_PATH = "experiment/輔助字形.aliases.json";
+// Per-letter shards + index written by export_auxiliary_forms_json.py --shard-dir
+export const AUX_SHARD_BASE_PATH = "experiment/auxiliary_forms/";
+export const AUX_SHARD_INDEX = "index.json";
+// Per-letter <symbol> sheets written by experiment/build_svg_sprites.py
+export const AUX_SPRITE_BASE_PATH = "experiment/sprites/";
+export const AUX_SPRITE_MAP = "sprites.json";
+// PNG/WebP renders + manifest written by experiment/render_rasters.py
+export const AUX_RASTER_BASE_PATH = "experiment/輔助字形.raster/";
+export const AUX_RASTER_MANIFEST = "manifest.json";
+// CSS heights the rasters are rendered at (keep in sync with render_rasters.py)
+export const AUX_RASTER_HEIGHTS = {
+  strip: 20,
+  zili: 83,
+  inline: 14,
+};
+// Char-mode practice set written by experiment/build_char_dict.py
+export const CHAR_DICT_PATH = "experiment/characters.json";
+// Content-addressed copies + manifest written by experiment/publish_assets.py
+export const ASSET_DIST_PATH = "experiment/dist/";
+export const ASSET_MANIFEST = "manifest.json";
 
 // Radical pools (kept identical to original logic)
 export const RADICAL_POOLS = {
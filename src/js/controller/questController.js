@@ -5,8 +5,14 @@ import {
   INVALID_KEY_REGEX,
   TIMINGS,
   RADICAL_POOLS,
-  AUX_JSON_PATH,
   AUX_BASE_PATH,
+  AUX_SHARD_BASE_PATH,
+  AUX_SHARD_INDEX,
+  AUX_SPRITE_BASE_PATH,
+  AUX_SPRITE_MAP,
+  AUX_RASTER_BASE_PATH,
+  AUX_RASTER_MANIFEST,
+  AUX_ALIAS_PATH,
 } from "../constants.js";
 import {
   initializeState,
@@ -30,6 +36,19 @@ import {
   applyAuxDetails,
   setAuxPanelVisible,
 } from "../view/auxiliaryView.js";
+import { setAuxSprites, setAuxRasters, setAuxAliases } from "../view/auxImage.js";
+import { loadAssetManifest, fetchAsset } from "../assets.js";
+import { loadCharacterDict } from "../characterDict.js";
+import {
+  setTelemetryEnabled,
+  isTelemetryEnabled,
+  inputTimestamp,
+  beginKeystroke,
+  endRender,
+  exportTelemetry,
+  downloadTelemetry,
+  telemetryStats,
+} from "../telemetry.js";
 
 const constants = {
   CLASSES: CLASSES,
@@ -59,29 +78,35 @@ const questBarView = {
   applyQuestIndicators: applyQuestIndicators,
 };
 
-// Build initial state from DOM source list
-function readDefaultCharacters() {
-  const el = document.querySelector(constants.SELECTORS.characterList);
-  const lines = el ? el.textContent.split("\n") : [];
-  return lines;
+// Build initial state from the generated practice set; the radical pool
+// stands in when it cannot be loaded. Sentinels at both ends as before.
+async function loadDefaultCharacters() {
+  await loadAssetManifest();
+  const dict = await loadCharacterDict();
+  const entries = dict ? dict.entries : constants.RADICAL_POOLS.all;
+  return [""].concat(entries).concat([""]);
 }
 
 const app = {
   state: null,
   originalLabels: null,
+  questChar: "", // character (or radical) shown in the quest box
   isEnglishLayout: false,
   aux: {
-    data: null, // loaded JSON
-    letterToRows: null,
+    index: null, // shard index: { letters: { A: {cangjie_char, file, rows, zili} } }
+    letters: {}, // lowercase letter -> loaded shard {cangjie_char, rows, questions}
     current: null, // selection detail
+    sprites: null, // sprites.json map, {} when unavailable
+    rasters: null, // raster manifest.json, {} when unavailable
+    aliases: null, // duplicate SVG alias map, {} when unavailable
   },
 };
 
 let debugEnabled = false;
 const rafState = { scheduled: false, lastInput: "" };
 
-export function init() {
-  const defaults = readDefaultCharacters();
+export async function init() {
+  const defaults = await loadDefaultCharacters();
   app.state = stateApi.initializeState({
     defaultCharacterArray: defaults,
     radicalPools: constants.RADICAL_POOLS,
@@ -105,6 +130,7 @@ export function init() {
   app.state.nowCharacter = characterString.slice(1);
 
   const radical = characterString.charAt(0);
+  app.questChar = radical;
   const mapped = mapLabels(app.state.nowCharacter, app.originalLabels);
   questBarView.renderQuestCharacter({
     radical: radical,
@@ -135,24 +161,24 @@ function updateIndicators(input) {
     };
   raf(function () {
     rafState.scheduled = false;
-    const t0 =
-      debugEnabled && typeof performance !== "undefined"
-        ? performance.now()
-        : 0;
+    const timed =
+      (debugEnabled || isTelemetryEnabled()) &&
+      typeof performance !== "undefined";
+    const t0 = timed ? performance.now() : 0;
     const data = stateApi.computeIndicators(app.state, rafState.lastInput);
-    const t1 =
-      debugEnabled && typeof performance !== "undefined"
-        ? performance.now()
-        : 0;
+    const t1 = timed ? performance.now() : 0;
     questBarView.applyQuestIndicators(data);
     if (app.state.mode === "aux") {
       const current = app.aux.current;
       if (current) {
         applyAuxDetails({
           show: !!data.radicalWrong,
+          letter: current.letter,
           fuzhuFiles: current.fuzhuFiles || [],
           currentFuzhuIndex: current.fuzhuIndex,
           shuoMingHtml: current.shuoMingHtml || "",
+          shuoMingRuns: current.shuoMingRuns,
+          svgSizes: current.svgSizes,
         });
       }
     }
@@ -160,6 +186,7 @@ function updateIndicators(input) {
       hintKey: data.hintKey,
       disabledKeys: computeDisabledKeys(app.state),
     });
+    endRender(t1 - t0);
     if (debugEnabled && typeof performance !== "undefined") {
       const t2 = performance.now();
       try {
@@ -192,9 +219,26 @@ function computeDisabledKeys(state) {
 
 // Public API mirroring old questCheck
 export const controller = {
-  check: function (input) {
+  /**
+   * check
+   * @param {string} input - current contents of the input bar
+   * @param {number} [inputAt] - performance.now() time of the input event
+   * @returns {boolean} whether the code was completed
+   */
+  check: function (input, inputAt) {
     const index = stateApi.compareInput(app.state, input);
     const completed = index >= app.state.nowCharacter.length;
+    if (isTelemetryEnabled()) {
+      beginKeystroke({
+        mode: app.state.mode,
+        code: app.state.nowCharacter,
+        char: app.questChar,
+        input: input,
+        index: index,
+        completed: completed,
+        inputAt: typeof inputAt === "number" ? inputAt : inputTimestamp(),
+      });
+    }
     if (completed) {
       if (app.state.mode === "aux") {
         // Immediately pick a new aux zili
@@ -206,6 +250,7 @@ export const controller = {
         const characterString = pick.character;
         app.state.nowCharacter = characterString.slice(1);
         const radical = characterString.charAt(0);
+        app.questChar = radical;
         questBarView.renderQuestCharacter({
           radical: radical,
           mappedLabels: mapLabels(app.state.nowCharacter, app.originalLabels),
@@ -230,6 +275,7 @@ export const controller = {
     app.state = pick.state;
     const characterString = pick.character;
     app.state.nowCharacter = characterString.slice(1);
+    app.questChar = characterString.charAt(0);
     questBarView.renderQuestCharacter({
       radical: characterString.charAt(0),
       mappedLabels: mapLabels(app.state.nowCharacter, app.originalLabels),
@@ -243,7 +289,7 @@ export const controller = {
     } catch (e) {}
   },
   setAuxMode: async function (categoryKey) {
-    await ensureAuxDataLoaded();
+    await ensureAuxDataLoaded(categoryKey);
     // In aux mode, set unified mode to 'aux'
     const res = stateApi.setMode(app.state, {
       mode: "aux",
@@ -257,9 +303,12 @@ export const controller = {
     try {
       applyAuxDetails({
         show: false,
+        letter: app.aux.current ? app.aux.current.letter : "",
         fuzhuFiles: app.aux.current ? app.aux.current.fuzhuFiles : [],
         currentFuzhuIndex: app.aux.current ? app.aux.current.fuzhuIndex : -1,
         shuoMingHtml: app.aux.current ? app.aux.current.shuoMingHtml : "",
+        shuoMingRuns: app.aux.current ? app.aux.current.shuoMingRuns : null,
+        svgSizes: app.aux.current ? app.aux.current.svgSizes : null,
       });
       setAuxPanelVisible(true);
     } catch (e) {}
@@ -280,6 +329,20 @@ export const controller = {
   },
   setDebug: function (enabled) {
     debugEnabled = !!enabled;
+    setTelemetryEnabled(debugEnabled);
+  },
+  setTelemetry: function (enabled) {
+    setTelemetryEnabled(enabled);
+  },
+  // Keystroke records as JSON lines, for experiment/analyze_keystrokes.py
+  exportTelemetry: function (opts) {
+    return exportTelemetry(opts);
+  },
+  downloadTelemetry: function () {
+    return downloadTelemetry();
+  },
+  telemetryStats: function () {
+    return telemetryStats();
   },
 };
 
@@ -295,14 +358,15 @@ export function wireEvents() {
   const keyboardEl = document.querySelector(SEL.keyboardMap);
 
   if (inputEl) {
-    inputEl.addEventListener("input", function () {
+    inputEl.addEventListener("input", function (event) {
+      const inputAt = isTelemetryEnabled() ? inputTimestamp(event) : 0;
       let string = this.value || "";
       const INVALID = constants.INVALID_KEY_REGEX || /[^a-y]/;
       if (INVALID.test(string)) {
         this.value = "";
         string = "";
       }
-      const completed = controller.check(string);
+      const completed = controller.check(string, inputAt);
       if (app.state.mode === "aux" || app.state.mode !== "char" || completed)
         this.value = "";
     });
@@ -412,37 +476,91 @@ export function wireEvents() {
 
 // ===== Aux helpers =====
 
-async function ensureAuxDataLoaded() {
-  if (app.aux.data) return app.aux.data;
-  const res = await fetch(AUX_JSON_PATH, { cache: "force-cache" });
-  const json = await res.json();
-  app.aux.data = json || {};
-  app.aux.letterToRows = buildLetterToRows(json);
-  return app.aux.data;
+async function fetchAuxJson(name) {
+  const res = await fetchAsset(AUX_SHARD_BASE_PATH + name);
+  return res.json();
 }
 
-function buildLetterToRows(data) {
-  const map = {};
-  for (const upper in data) {
-    if (!Object.hasOwn(data, upper)) continue;
-    const key = String(upper).toUpperCase();
-    const letter = key.toLowerCase();
-    const def = data[upper] || {};
-    const rows = def.rows || [];
-    map[letter] = { cangjieChar: def.cangjie_char || "", rows: rows };
+function categoryLetters(categoryKey) {
+  const pool = constants.RADICAL_POOLS[categoryKey] || [];
+  const letters = [];
+  for (let i = 0; i < pool.length; i++) {
+    const entry = pool[i];
+    letters.push(entry.charAt(entry.length - 1));
+  }
+  return letters;
+}
+
+// Sprite map is optional: without it every aux image is a separate <img>
+async function ensureAuxSpritesLoaded() {
+  if (app.aux.sprites) return;
+  try {
+    const res = await fetchAsset(AUX_SPRITE_BASE_PATH + AUX_SPRITE_MAP);
+    app.aux.sprites = res.ok ? await res.json() : {};
+  } catch (e) {
+    app.aux.sprites = {};
   }
-  return map;
+  setAuxSprites(app.aux.sprites);
+}
+
+// Raster manifest is optional: without it images fall back to the SVGs
+async function ensureAuxRastersLoaded() {
+  if (app.aux.rasters) return;
+  try {
+    const res = await fetchAsset(AUX_RASTER_BASE_PATH + AUX_RASTER_MANIFEST);
+    app.aux.rasters = res.ok ? await res.json() : {};
+  } catch (e) {
+    app.aux.rasters = {};
+  }
+  setAuxRasters(app.aux.rasters);
+}
+
+// Alias map is optional: it only exists once duplicate SVGs were collapsed
+async function ensureAuxAliasesLoaded() {
+  if (app.aux.aliases) return;
+  try {
+    const res = await fetchAsset(AUX_ALIAS_PATH);
+    app.aux.aliases = res.ok ? await res.json() : {};
+  } catch (e) {
+    app.aux.aliases = {};
+  }
+  setAuxAliases(app.aux.aliases);
+}
+
+// Load the shard index, then only the shards needed by the category
+async function ensureAuxDataLoaded(categoryKey) {
+  if (!app.aux.index) {
+    await loadAssetManifest();
+    const results = await Promise.all([
+      fetchAuxJson(AUX_SHARD_INDEX),
+      ensureAuxSpritesLoaded(),
+      ensureAuxRastersLoaded(),
+      ensureAuxAliasesLoaded(),
+    ]);
+    app.aux.index = results[0] || {};
+  }
+  const indexLetters = app.aux.index.letters || {};
+  const pending = [];
+  const letters = categoryLetters(categoryKey || "philosophy");
+  for (let i = 0; i < letters.length; i++) {
+    const letter = letters[i];
+    const entry = indexLetters[letter.toUpperCase()];
+    if (!entry || !entry.zili || app.aux.letters[letter]) continue;
+    pending.push(
+      fetchAuxJson(entry.file).then(function (shard) {
+        app.aux.letters[letter] = shard || {};
+      })
+    );
+  }
+  await Promise.all(pending);
+  return app.aux.letters;
 }
 
 function selectAuxLetterFromCategory(categoryKey) {
-  const pool = constants.RADICAL_POOLS[categoryKey] || [];
+  const letters = categoryLetters(categoryKey);
   const allowedLetters = [];
-  for (let i = 0; i < pool.length; i++) {
-    const entry = pool[i];
-    const letter = entry.charAt(entry.length - 1);
-    if (app.aux.letterToRows && app.aux.letterToRows[letter]) {
-      allowedLetters.push(letter);
-    }
+  for (let i = 0; i < letters.length; i++) {
+    if (app.aux.letters[letters[i]]) allowedLetters.push(letters[i]);
   }
   if (allowedLetters.length === 0) return null;
   // Avoid immediate same letter repeat if possible
@@ -461,47 +579,33 @@ function selectAuxLetterFromCategory(categoryKey) {
 }
 
 function selectAuxQuestionForLetter(letter) {
-  const def = app.aux.letterToRows && app.aux.letterToRows[letter];
+  const def = app.aux.letters[letter];
   if (!def) return null;
-  const rows = def.rows || [];
-  const candidates = [];
-  for (let i = 0; i < rows.length; i++) {
-    const row = rows[i];
-    const fuzhus = row && row.fuzhu_zixing ? row.fuzhu_zixing : [];
-    let totalZili = 0;
-    for (let j = 0; j < fuzhus.length; j++) {
-      const z = (fuzhus[j] && fuzhus[j].zili) || [];
-      totalZili += z.length;
-    }
-    if (totalZili > 0) candidates.push(i);
-  }
-  if (candidates.length === 0) return null;
-  const rowIndex = candidates[Math.floor(Math.random() * candidates.length)];
-  const row = rows[rowIndex];
+  const questions = def.questions || [];
+  if (questions.length === 0) return null;
+  // Precomputed [rowIndex, fuzhuIndex, ziliIndex] tuples
+  const q = questions[Math.floor(Math.random() * questions.length)];
+  const rowIndex = q[0];
+  const fuzhuIndex = q[1];
+  const ziliIndex = q[2];
+  const row = def.rows[rowIndex];
   const fuzhus = row.fuzhu_zixing || [];
-  const fuzhuChoices = [];
-  for (let j = 0; j < fuzhus.length; j++) {
-    const z = (fuzhus[j] && fuzhus[j].zili) || [];
-    if (z.length > 0) fuzhuChoices.push(j);
-  }
-  const fuzhuIndex =
-    fuzhuChoices[Math.floor(Math.random() * fuzhuChoices.length)];
-  const ziliArr = (fuzhus[fuzhuIndex] && fuzhus[fuzhuIndex].zili) || [];
-  const ziliIndex = Math.floor(Math.random() * ziliArr.length);
-  const ziliFile = ziliArr[ziliIndex].file;
+  const ziliFile = fuzhus[fuzhuIndex].zili[ziliIndex].file;
   const fuzhuFiles = fuzhus.map(function (f) {
     return f.file;
   });
   const shuoMingHtml = row.shuo_ming || "";
   return {
     letter: letter,
-    radicalChar: def.cangjieChar,
+    radicalChar: def.cangjie_char || "",
     rowIndex: rowIndex,
     fuzhuIndex: fuzhuIndex,
     ziliIndex: ziliIndex,
     ziliFile: ziliFile,
     fuzhuFiles: fuzhuFiles,
     shuoMingHtml: shuoMingHtml,
+    shuoMingRuns: row.shuo_ming_runs,
+    svgSizes: def.svg_sizes || {},
   };
 }
 
@@ -513,6 +617,8 @@ function selectAndRenderNextAux() {
   const detail = selectAuxQuestionForLetter(letter);
   if (!detail) return;
   app.aux.current = detail;
+  // SVG-only zili are identified by their file name
+  app.questChar = detail.ziliFile || "";
   // For indicator logic, set code to the single letter
   app.state.nowCharacter = letter;
   // Render zili SVG only in the quest box (no radical text)
@@ -523,15 +629,19 @@ function selectAndRenderNextAux() {
     isRadicalMode: true,
     isAuxMode: true,
     auxZiliFile: detail.ziliFile,
+    auxLetter: detail.letter,
     auxBasePath: AUX_BASE_PATH,
   });
   // Hide aux panel by default on fresh pick
   try {
     applyAuxDetails({
       show: false,
+      letter: detail.letter,
       fuzhuFiles: detail.fuzhuFiles || [],
       currentFuzhuIndex: detail.fuzhuIndex,
       shuoMingHtml: detail.shuoMingHtml || "",
+      shuoMingRuns: detail.shuoMingRuns,
+      svgSizes: detail.svgSizes,
     });
   } catch (e) {}
 }
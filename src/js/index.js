@@ -3,12 +3,10 @@ import { init, wireEvents, controller } from "./controller/questController.js";
 
 if (document.readyState === "loading") {
   document.addEventListener("DOMContentLoaded", function () {
-    init();
-    wireEvents();
+    init().then(wireEvents);
   });
 } else {
-  init();
-  wireEvents();
+  init().then(wireEvents);
 }
 
 // Optional: expose minimal debug toggle via URL hash
@@ -16,4 +14,16 @@ try {
   if (window && window.location && /debug/.test(window.location.hash)) {
     controller.setDebug && controller.setDebug(true);
   }
+  // #telemetry records keystrokes without the console logging; export with
+  // controller.downloadTelemetry() (exposed as window.cjlTelemetry)
+  if (window && window.location && /telemetry/.test(window.location.hash)) {
+    controller.setTelemetry && controller.setTelemetry(true);
+  }
+  if (window && window.location && /debug|telemetry/.test(window.location.hash)) {
+    window.cjlTelemetry = {
+      download: controller.downloadTelemetry,
+      export: controller.exportTelemetry,
+      stats: controller.telemetryStats,
+    };
+  }
 } catch (e) {}
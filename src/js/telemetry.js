@@ -0,0 +1,169 @@
+// Per-keystroke telemetry: one record per input event, kept in a bounded
+// ring buffer and exported as JSON lines for experiment/analyze_keystrokes.py.
+// Off unless enabled (setDebug(true) or #telemetry in the URL).
+
+const MAX_RECORDS = 20000;
+
+let enabled = false;
+let records = [];
+let start = 0; // ring start once the buffer is full
+let dropped = 0;
+let pending = [];
+
+function now() {
+  return typeof performance !== "undefined" ? performance.now() : Date.now();
+}
+
+/**
+ * setTelemetryEnabled
+ * @param {boolean} value
+ */
+export function setTelemetryEnabled(value) {
+  enabled = !!value;
+  if (!enabled) pending = [];
+}
+
+/**
+ * isTelemetryEnabled
+ * @returns {boolean}
+ */
+export function isTelemetryEnabled() {
+  return enabled;
+}
+
+/**
+ * inputTimestamp
+ * Event time on the performance.now() clock; event.timeStamp already is one
+ * in current browsers, so queueing before the handler ran is counted too.
+ * @param {Event} [event]
+ * @returns {number}
+ */
+export function inputTimestamp(event) {
+  const t = now();
+  const ts = event && event.timeStamp;
+  // Older engines report epoch milliseconds here; fall back to now()
+  return typeof ts === "number" && ts > 0 && ts <= t ? ts : t;
+}
+
+/**
+ * beginKeystroke
+ * Start a record for one input; it is completed by endRender() once the
+ * indicators for it have been applied.
+ * @param {{mode:string, code:string, char:string, input:string, index:number, completed:boolean, inputAt:number}} args
+ */
+export function beginKeystroke(args) {
+  if (!enabled) return;
+  pending.push(args);
+}
+
+/**
+ * endRender
+ * Complete every pending record: several inputs coalesced into one frame
+ * share its render time.
+ * @param {number} computeMs - time spent in computeIndicators
+ */
+export function endRender(computeMs) {
+  if (!enabled || !pending.length) return;
+  const renderedAt = now();
+  const epoch = Date.now();
+  for (let i = 0; i < pending.length; i++) {
+    const p = pending[i];
+    const input = p.input || "";
+    const key = input.charAt(input.length - 1);
+    const expected = input.length ? p.code.charAt(input.length - 1) : "";
+    push({
+      t: epoch,
+      mode: p.mode,
+      code: p.code,
+      char: p.char || "",
+      input: input,
+      index: p.index,
+      // The key just typed and the one the code has at that position: ok is
+      // per key, while index (compareInput) covers the whole input so far
+      key: key,
+      expected: expected,
+      ok: key !== "" && key === expected,
+      completed: !!p.completed,
+      latency_ms: round2(renderedAt - p.inputAt),
+      compute_ms: round2(computeMs),
+      coalesced: pending.length,
+    });
+  }
+  pending = [];
+}
+
+function round2(x) {
+  return Math.round(x * 100) / 100;
+}
+
+function push(record) {
+  if (records.length < MAX_RECORDS) {
+    records.push(record);
+    return;
+  }
+  records[start] = record;
+  start = (start + 1) % MAX_RECORDS;
+  dropped++;
+}
+
+/**
+ * telemetryRecords
+ * @returns {Object[]} buffered records, oldest first
+ */
+export function telemetryRecords() {
+  return records.slice(start).concat(records.slice(0, start));
+}
+
+/**
+ * exportTelemetry
+ * @param {{clear?: boolean}} [opts]
+ * @returns {string} JSON lines, one record per keystroke
+ */
+export function exportTelemetry(opts) {
+  const lines = telemetryRecords().map(function (r) {
+    return JSON.stringify(r);
+  });
+  if (opts && opts.clear) clearTelemetry();
+  return lines.length ? lines.join("\n") + "\n" : "";
+}
+
+/**
+ * downloadTelemetry
+ * Save the buffer as keystrokes-<time>.jsonl and clear it.
+ * @returns {number} records written
+ */
+export function downloadTelemetry() {
+  const count = records.length;
+  if (!count) return 0;
+  const blob = new Blob([exportTelemetry({ clear: true })], {
+    type: "application/x-ndjson",
+  });
+  const a = document.createElement("a");
+  a.href = URL.createObjectURL(blob);
+  a.download =
+    "keystrokes-" + new Date().toISOString().replace(/[:.]/g, "-") + ".jsonl";
+  document.body.appendChild(a);
+  a.click();
+  a.remove();
+  setTimeout(function () {
+    URL.revokeObjectURL(a.href);
+  }, 0);
+  return count;
+}
+
+/**
+ * clearTelemetry
+ */
+export function clearTelemetry() {
+  records = [];
+  start = 0;
+  dropped = 0;
+}
+
+/**
+ * telemetryStats
+ * @returns {{records:number, dropped:number, max:number}}
+ */
+export function telemetryStats() {
+  return { records: records.length, dropped: dropped, max: MAX_RECORDS };
+}
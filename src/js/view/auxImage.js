@@ -0,0 +1,129 @@
+// Aux image factory: a pre-rendered raster (<img srcset>) when one exists at
+// the display height, else <svg><use> into a per-letter sprite sheet when one
+// is available, otherwise a plain <img> per SVG file.
+
+import {
+  AUX_BASE_PATH,
+  AUX_SPRITE_BASE_PATH,
+  AUX_RASTER_BASE_PATH,
+} from "../constants.js";
+import { assetUrl } from "../assets.js";
+
+const SVG_NS = "http://www.w3.org/2000/svg";
+
+let spriteLetters = null;
+let rasters = null;
+let aliases = {};
+
+/**
+ * setAuxAliases
+ * @param {Object<string, string>|null} map - alias file -> canonical file,
+ *   written by experiment/svg_store.py --dedup
+ */
+export function setAuxAliases(map) {
+  aliases = map || {};
+}
+
+/**
+ * resolveAuxFile
+ * @param {string} file - name as referenced by the aux data
+ * @returns {string} the file actually stored (itself unless collapsed)
+ */
+export function resolveAuxFile(file) {
+  return Object.prototype.hasOwnProperty.call(aliases, file) ? aliases[file] : file;
+}
+
+/**
+ * setAuxSprites
+ * @param {{letters:Object<string, {sprite:string, files:Object<string, {id:string, viewBox:string}>}>}|null} map
+ *   sprites.json written by experiment/build_svg_sprites.py
+ */
+export function setAuxSprites(map) {
+  spriteLetters = (map && map.letters) || null;
+}
+
+/**
+ * setAuxRasters
+ * @param {{scales:number[], formats:string[], files:Object<string, {sha1:string, renders:Object<string, string>}>}|null} manifest
+ *   manifest.json written by experiment/render_rasters.py
+ */
+export function setAuxRasters(manifest) {
+  const ok =
+    manifest && manifest.files && (manifest.scales || []).length && (manifest.formats || []).length;
+  rasters = ok ? manifest : null;
+}
+
+// srcset for file rendered at height CSS px, in the first listed format
+function rasterSrcset(file, height) {
+  if (!rasters || !height) return null;
+  const entry = rasters.files[file];
+  const base = entry && entry.renders && entry.renders[String(Math.round(height))];
+  if (!base) return null;
+  const format = rasters.formats[0];
+  const candidates = rasters.scales.map(function (scale) {
+    return assetUrl(AUX_RASTER_BASE_PATH + base + "@" + scale + "x." + format) + " " + scale + "x";
+  });
+  return { src: candidates[0].split(" ")[0], srcset: candidates.join(", ") };
+}
+
+function spriteEntry(file, letter) {
+  if (!spriteLetters || !letter) return null;
+  const sheet = spriteLetters[String(letter).toUpperCase()];
+  const entry = sheet && sheet.files && sheet.files[file];
+  return entry ? { sprite: sheet.sprite, id: entry.id, viewBox: entry.viewBox } : null;
+}
+
+/**
+ * createAuxImage
+ * @param {{file:string, letter?:string, className?:string, size?:number[], height?:number}} args
+ *   size is the intrinsic [width, height]; used to reserve layout space.
+ *   height is the CSS height the image is shown at (AUX_RASTER_HEIGHTS)
+ * @returns {Element}
+ */
+export function createAuxImage(args) {
+  const file = (args && args.file) || "";
+  const raster = rasterSrcset(resolveAuxFile(file), args && args.height);
+  const entry = raster ? null : spriteEntry(file, args && args.letter);
+  if (raster) {
+    const img = document.createElement("img");
+    if (args.className) img.className = args.className;
+    img.alt = file;
+    img.decoding = "async";
+    const size = args.size;
+    if (size && size.length === 2 && size[1] > 0) {
+      img.height = Math.round(args.height);
+      img.width = Math.round((args.height * size[0]) / size[1]);
+    }
+    img.srcset = raster.srcset;
+    img.src = raster.src;
+    return img;
+  }
+  if (entry) {
+    const svg = document.createElementNS(SVG_NS, "svg");
+    const box = String(entry.viewBox || "").split(/[\s,]+/);
+    svg.setAttribute("viewBox", entry.viewBox);
+    if (box.length === 4) {
+      svg.setAttribute("width", box[2]);
+      svg.setAttribute("height", box[3]);
+    }
+    svg.setAttribute("role", "img");
+    svg.setAttribute("aria-label", file);
+    if (args.className) svg.setAttribute("class", args.className);
+    const use = document.createElementNS(SVG_NS, "use");
+    use.setAttribute("href", assetUrl(AUX_SPRITE_BASE_PATH + entry.sprite) + "#" + entry.id);
+    svg.appendChild(use);
+    return svg;
+  }
+  const img = document.createElement("img");
+  if (args && args.className) img.className = args.className;
+  img.alt = file;
+  img.decoding = "async";
+  img.referrerPolicy = "no-referrer";
+  const size = args && args.size;
+  if (size && size.length === 2) {
+    img.width = Math.round(size[0]);
+    img.height = Math.round(size[1]);
+  }
+  img.src = assetUrl(AUX_BASE_PATH + resolveAuxFile(file));
+  return img;
+}
@@ -1,6 +1,8 @@
 // Auxiliary view: renders panel with fuzhu strip and explanation
 
-import { SELECTORS, AUX_BASE_PATH } from "../constants.js";
+import { SELECTORS, AUX_BASE_PATH, AUX_RASTER_HEIGHTS } from "../constants.js";
+import { createAuxImage, resolveAuxFile } from "./auxImage.js";
+import { assetUrl } from "../assets.js";
 
 let dom = null;
 
@@ -33,7 +35,7 @@ export function setAuxPanelVisible(show) {
 
 /**
  * Convert a subset of MediaWiki wikitext embedded in shuo_ming into DOM nodes.
- * - Replaces [[Image:*.svg|22px]] (and localized File namespaces) with inline <img>
+ * - Replaces [[Image:*.svg|22px]] (and localized File namespaces) with inline images
  * - Strips <ref>...</ref> blocks (and self-closing variants)
  *
  * @param {HTMLElement} container
@@ -68,19 +70,23 @@ function renderShuoMingWikitext(container, wikitext, basePath) {
     const fileName = (match[1] || "").trim();
     const options = (match[2] || "").trim();
 
-    const img = document.createElement("img");
-    img.className = "inline-svg";
-    img.alt = fileName || "svg";
-    img.decoding = "async";
-    img.referrerPolicy = "no-referrer";
-    img.src = (basePath || "") + fileName;
-
     // Try to read a size like 22px from options; default to 1em height
     let heightPx = null;
     const sizeMatch = /([0-9]{1,3})\s*px/i.exec(options);
     if (sizeMatch) {
       heightPx = parseInt(sizeMatch[1], 10);
     }
+
+    const img = createAuxImage({
+      file: fileName,
+      className: "inline-svg",
+      height: heightPx || AUX_RASTER_HEIGHTS.inline,
+    });
+    // Plain <img> fallback honours the caller's base path
+    if (img.tagName === "IMG" && !img.srcset) {
+      img.alt = fileName || "svg";
+      img.src = assetUrl((basePath || "") + resolveAuxFile(fileName));
+    }
     if (heightPx && Number.isFinite(heightPx))
       img.style.height = heightPx + "px";
 
@@ -95,9 +101,43 @@ function renderShuoMingWikitext(container, wikitext, basePath) {
   container.appendChild(frag);
 }
 
+/**
+ * Render shuo_ming runs pre-tokenized by export_auxiliary_forms_json.py:
+ * strings are text, objects are {file, height?, width?} inline images.
+ *
+ * @param {HTMLElement} container
+ * @param {Array<string|{file:string, height?:number, width?:number}>} runs
+ * @param {string} letter - sprite sheet to draw from, when one is loaded
+ * @param {Object<string, number[]>} svgSizes
+ */
+function renderShuoMingRuns(container, runs, letter, svgSizes) {
+  if (!container) return;
+  const frag = document.createDocumentFragment();
+  for (let i = 0; i < runs.length; i++) {
+    const run = runs[i];
+    if (typeof run === "string") {
+      frag.appendChild(document.createTextNode(run));
+      continue;
+    }
+    if (!run || !run.file) continue;
+    const img = createAuxImage({
+      file: run.file,
+      letter: letter,
+      className: "inline-svg",
+      size: svgSizes && svgSizes[run.file],
+      height: run.height || AUX_RASTER_HEIGHTS.inline,
+    });
+    if (run.height) img.style.height = run.height + "px";
+    if (run.width) img.style.width = run.width + "px";
+    frag.appendChild(img);
+  }
+  container.textContent = "";
+  container.appendChild(frag);
+}
+
 /**
  * applyAuxDetails
- * @param {{show:boolean, fuzhuFiles:string[], currentFuzhuIndex:number, shuoMingHtml:string}} args
+ * @param {{show:boolean, letter?:string, fuzhuFiles:string[], currentFuzhuIndex:number, shuoMingHtml:string, shuoMingRuns?:Array, svgSizes?:Object<string, number[]>}} args
  */
 export function applyAuxDetails(args) {
   ensureDom();
@@ -107,6 +147,9 @@ export function applyAuxDetails(args) {
   const currentIndex =
     typeof args.currentFuzhuIndex === "number" ? args.currentFuzhuIndex : -1;
   const html = (args && args.shuoMingHtml) || "";
+  const runs = args && args.shuoMingRuns;
+  const svgSizes = (args && args.svgSizes) || {};
+  const letter = (args && args.letter) || "";
 
   if (dom.strip) {
     // Rebuild strip
@@ -114,18 +157,25 @@ export function applyAuxDetails(args) {
     for (let i = 0; i < files.length; i++) {
       const wrapper = document.createElement("span");
       wrapper.className = "fuzhu-item" + (i === currentIndex ? " current" : "");
-      const img = document.createElement("img");
-      img.alt = files[i];
-      img.decoding = "async";
-      img.referrerPolicy = "no-referrer";
-      img.src = AUX_BASE_PATH + files[i];
-      wrapper.appendChild(img);
+      wrapper.appendChild(
+        createAuxImage({
+          file: files[i],
+          letter: letter,
+          size: svgSizes[files[i]],
+          height: AUX_RASTER_HEIGHTS.strip,
+        })
+      );
       dom.strip.appendChild(wrapper);
     }
   }
 
   if (dom.explanation) {
-    renderShuoMingWikitext(dom.explanation, html, AUX_BASE_PATH);
+    if (Array.isArray(runs)) {
+      renderShuoMingRuns(dom.explanation, runs, letter, svgSizes);
+    } else {
+      // Fallback for data exported without shuo_ming_runs
+      renderShuoMingWikitext(dom.explanation, html, AUX_BASE_PATH);
+    }
   }
 
   // Toggle visibility cues without layout shift
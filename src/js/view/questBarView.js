@@ -1,6 +1,8 @@
 // Quest bar view: renders radical + mapped labels and applies indicators
 
-import { CLASSES, SELECTORS } from "../constants.js";
+import { CLASSES, SELECTORS, AUX_RASTER_HEIGHTS } from "../constants.js";
+import { createAuxImage, resolveAuxFile } from "./auxImage.js";
+import { assetUrl } from "../assets.js";
 
 let dom = null;
 const prevState = {
@@ -19,7 +21,7 @@ function ensureDomCache() {
 
 /**
  * renderQuestCharacter
- * @param {{radical:string, mappedLabels:string[], isRadicalMode:boolean, isAuxMode?:boolean, auxZiliFile?:string, auxBasePath?:string}} args
+ * @param {{radical:string, mappedLabels:string[], isRadicalMode:boolean, isAuxMode?:boolean, auxZiliFile?:string, auxLetter?:string, auxBasePath?:string}} args
  */
 export function renderQuestCharacter(args) {
   ensureDomCache();
@@ -28,6 +30,7 @@ export function renderQuestCharacter(args) {
   const isRadicalMode = !!(args && args.isRadicalMode);
   const isAuxMode = !!(args && args.isAuxMode);
   const auxZiliFile = args && args.auxZiliFile;
+  const auxLetter = (args && args.auxLetter) || "";
   const auxBasePath = (args && args.auxBasePath) || "";
 
   if (!dom.container || !dom.slots || dom.slots.length === 0) return;
@@ -36,10 +39,13 @@ export function renderQuestCharacter(args) {
     // Clear existing content
     while (slot.firstChild) slot.removeChild(slot.firstChild);
     if (isAuxMode && typeof auxZiliFile === "string" && auxZiliFile) {
-      const img = document.createElement("img");
-      img.alt = auxZiliFile;
-      img.decoding = "async";
-      img.src = auxBasePath + auxZiliFile;
+      const img = createAuxImage({
+        file: auxZiliFile,
+        letter: auxLetter,
+        height: AUX_RASTER_HEIGHTS.zili,
+      });
+      // Plain <img> fallback honours the caller's base path
+      if (img.tagName === "IMG" && !img.srcset && auxBasePath) img.src = assetUrl(auxBasePath + resolveAuxFile(auxZiliFile));
       slot.appendChild(img);
     } else {
       // Non-aux: render radical text glyph